@@ -0,0 +1,263 @@
+"""
+热点路径基准测试
+同一份代码既可在主机上运行(python -m bench.run，使用 sim 替身模块)，
+也可在Pico上运行(mpremote run bench/benchmarks.py，需先把固件文件复制到Pico)
+结果以一行 "BENCH_JSON {...}" 输出，供 bench/run.py 解析
+
+指标命名约定：
+    *_us       每次操作耗时(微秒)，越小越好
+    *_per_s    吞吐量，越大越好
+    *_bytes    传输字节数，越小越好(确定值)
+    *_alloc    单次操作的堆分配量(字节)，越小越好
+"""
+
+import gc
+import json
+import time
+
+try:
+    # 主机：gc.mem_alloc 只反映存活对象(引用计数立即回收)，改用 tracemalloc 峰值统计
+    from sim import alloc_begin, alloc_end
+except ImportError:
+    def alloc_begin():
+        return gc.mem_alloc()
+
+    def alloc_end(begin):
+        return gc.mem_alloc() - begin
+
+from data.log import Logger, DEBUG, WARN, OFF
+from data.singleton_data import get_data_manager, CHANGE_ALL
+from data.telemetry import get_telemetry
+from display.ssd1306 import SSD1306_I2C
+from task.display import DisplaySession, draw_device
+from task.uart_handler import uart_data_handler
+from uart.line_framer import LineFramer
+
+
+def measure_alloc(func, *args):
+    """单次调用的堆分配量(字节)，测量期间关闭垃圾回收"""
+    gc.collect()
+    gc.disable()
+    try:
+        begin = alloc_begin()
+        func(*args)
+        return alloc_end(begin)
+    finally:
+        gc.enable()
+
+
+def measure_time(func, count, *args):
+    """
+    重复调用 count 次
+
+    Returns:
+        float: 每次调用的平均耗时(微秒)
+    """
+    gc.collect()
+    start = time.ticks_us()
+    for _ in range(count):
+        func(*args)
+    return time.ticks_diff(time.ticks_us(), start) / count
+
+
+class CountingI2C:
+    """只统计写入字节数的I2C总线，测量显示驱动本身的CPU开销"""
+
+    def __init__(self):
+        self.bytes_written = 0
+
+    def writeto(self, addr, buf):
+        self.bytes_written += len(buf)
+
+    def writevto(self, addr, vector):
+        for buf in vector:
+            self.bytes_written += len(buf)
+
+
+class BurstStream:
+    """从内存数据读取的串口替身，每次最多读 chunk 字节(模拟突发输入)"""
+
+    def __init__(self, data, chunk):
+        self.mv = memoryview(data)
+        self.chunk = chunk
+        self.pos = 0
+
+    def readinto(self, buf):
+        n = min(len(buf), self.chunk, len(self.mv) - self.pos)
+        if n <= 0:
+            return None
+        buf[:n] = self.mv[self.pos:self.pos + n]
+        self.pos += n
+        return n
+
+
+def bench_uart_handler(count=200):
+    """uart_data_handler 处理设备更新行的速度"""
+    lines = (
+        memoryview(b'{"device": "device1", "temp": 20.5, "heat": 1, "pump": 0}'),
+        memoryview(b'{"device": "device2", "temp": 18.25, "cool": 1, "warn": 0}'),
+    )
+
+    def handle_pair():
+        uart_data_handler(lines[0])
+        uart_data_handler(lines[1])
+
+    us = measure_time(handle_pair, count // 2) / 2
+    return {
+        'line_us': round(us, 2),
+        'lines_per_s': round(1000000 / us, 1),
+        'line_alloc': measure_alloc(uart_data_handler, lines[0]),
+    }
+
+
+def bench_framing(lines=400, chunk=64):
+    """uart_receive_task 的分帧吞吐量：突发输入按 chunk 字节分块读入，逐行交给处理函数"""
+    line = b'{"device": "device1", "temp": 20.5, "heat": 1}\n'
+    data = line * lines
+    counted = [0]
+
+    def handler(mv):
+        counted[0] += 1
+
+    def frame_all():
+        framer = LineFramer(256)
+        stream = BurstStream(data, chunk)
+        while framer.readfrom(stream):
+            framer.process(handler)
+
+    gc.collect()
+    start = time.ticks_us()
+    frame_all()
+    us = time.ticks_diff(time.ticks_us(), start)
+    assert counted[0] == lines
+    return {
+        'burst_us': us,
+        'bytes_per_s': round(len(data) * 1000000 / us, 1),
+        'lines_per_s': round(lines * 1000000 / us, 1),
+    }
+
+
+def bench_serial_output(count=50):
+    """遥测输出：设备状态字典逐个 json.dumps(与查询应答同一路径) 与预分配缓冲区编码的对比"""
+    dm = get_data_manager()
+    telemetry = get_telemetry()
+
+    def dumps_all():
+        return [json.dumps(dm.get_device_dict(index)) for index in range(dm.device_count)]
+
+    return {
+        'json_dumps_us': round(measure_time(dumps_all, count), 2),
+        'json_dumps_alloc': measure_alloc(dumps_all),
+        'encode_json_us': round(measure_time(telemetry.encode_json, count, -1, 0, CHANGE_ALL), 2),
+        'encode_json_alloc': measure_alloc(telemetry.encode_json, -1, 0, CHANGE_ALL),
+        'encode_state_us': round(measure_time(telemetry.codec.encode_state, count, 0, 2050, 0x05, 350, 1234), 2),
+        'encode_state_alloc': measure_alloc(telemetry.codec.encode_state, 0, 2050, 0x05, 350, 1234),
+    }
+
+
+def bench_ssd1306_show(count=10):
+    """SSD1306.show：整屏刷新与脏页增量刷新的耗时和传输字节数"""
+    i2c = CountingI2C()
+    full = SSD1306_I2C(128, 64, i2c)
+    full.text('Temp: 20.5C', 0, 15)
+    full_us = measure_time(full.show, count)
+    full_bytes = full.last_show_bytes
+
+    dirty = SSD1306_I2C(128, 64, i2c, dirty_tracking=True)
+    dirty.text('Temp: 20.5C', 0, 15)
+    dirty.show()
+
+    flip = [0]
+
+    def change_and_show():
+        # 每帧改变一个字符
+        flip[0] ^= 1
+        dirty.fill_rect(72, 15, 8, 8, 0)
+        dirty.text('5' if flip[0] else '6', 72, 15)
+        dirty.show()
+
+    dirty_us = measure_time(change_and_show, count)
+    return {
+        'full_us': round(full_us, 2),
+        'full_bytes': full_bytes,
+        'dirty_us': round(dirty_us, 2),
+        'dirty_bytes': dirty.last_show_bytes,
+    }
+
+
+def bench_display_render(count=5):
+    """设备1画面完整重绘一次(清屏、绘制、刷新)，与 display_task 走同一路径"""
+    session = DisplaySession(0, 0, 0)
+    session.oled = SSD1306_I2C(128, 64, CountingI2C(), dirty_tracking=True)
+    session.render(draw_device, None, 0)
+
+    def render_frame():
+        # 画面内容不变时脏区刷新不传输任何数据，每次先作废影子缓冲区，测量整帧推送
+        session.oled.invalidate()
+        session.render(draw_device, None, 0)
+
+    return {
+        'render_us': round(measure_time(render_frame, count), 2),
+        'render_alloc': measure_alloc(render_frame),
+        'render_bytes': session.oled.last_show_bytes,
+    }
+
+
+def bench_logging(count=200):
+    """日志调用点：低于记录级别时被丢弃、写入环形缓冲区、限速省略三种情况的开销"""
+    logger = Logger(WARN, OFF, 64)
+    site = logger.site(DEBUG, '设备{}温度已更新: {:.2f}°C', 0, 2)
+    limited = logger.site(WARN, '设备{}水位异常', 60000, 2)
+    temp = 20.5
+    limited(1)
+
+    def write_ring():
+        site(1, temp)
+
+    filtered_us = measure_time(site, count, 1, temp)
+    filtered_alloc = measure_alloc(site, 1, temp)
+    logger.level = DEBUG
+    return {
+        'filtered_us': round(filtered_us, 2),
+        'filtered_alloc': filtered_alloc,
+        'ring_us': round(measure_time(write_ring, count), 2),
+        'ring_alloc': measure_alloc(write_ring),
+        'limited_us': round(measure_time(limited, count, 1), 2),
+        'limited_alloc': measure_alloc(limited, 1),
+    }
+
+
+BENCHMARKS = (
+    ('uart_handler', bench_uart_handler),
+    ('framing', bench_framing),
+    ('serial_output', bench_serial_output),
+    ('ssd1306_show', bench_ssd1306_show),
+    ('display_render', bench_display_render),
+    ('logging', bench_logging),
+)
+
+
+def run_all(names=None):
+    """
+    运行基准测试
+
+    Args:
+        names: 要运行的基准名称列表，None表示全部
+
+    Returns:
+        dict: 基准名称 -> 指标字典
+    """
+    results = {}
+    for name, func in BENCHMARKS:
+        if names is None or name in names:
+            results[name] = func()
+    return results
+
+
+def main():
+    results = run_all()
+    print('BENCH_JSON ' + json.dumps(results))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,154 @@
+"""
+基准测试运行器
+在主机(sim 替身模块)或Pico(通过 mpremote)上运行 bench/benchmarks.py，
+结果保存为JSON，并可与基线结果比较，指标退化超过容差时以非零状态退出
+
+用法:
+    python -m bench.run --output bench/results-v1.2.json
+    python -m bench.run --compare bench/results-v1.2.json
+    python -m bench.run --device /dev/ttyACM0 --output bench/results-pico.json
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+
+MARKER = 'BENCH_JSON '
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def run_host(repeat, names=None):
+    """
+    在主机上运行基准测试，耗时和吞吐量取多次运行中最好的一次
+
+    Returns:
+        dict: 基准名称 -> 指标字典
+    """
+    import sim
+    sim.install()
+    from bench import benchmarks
+
+    best = {}
+    for _ in range(repeat):
+        # 屏蔽固件的打印输出(打印到终端的耗时会淹没被测代码本身)
+        with contextlib.redirect_stdout(io.StringIO()):
+            results = benchmarks.run_all(names)
+        for name, metrics in results.items():
+            merged = best.setdefault(name, {})
+            for key, value in metrics.items():
+                if key not in merged:
+                    merged[key] = value
+                elif key.endswith('_per_s'):
+                    merged[key] = max(merged[key], value)
+                elif key.endswith('_us'):
+                    merged[key] = min(merged[key], value)
+                else:
+                    merged[key] = value
+    return best
+
+
+def run_device(port):
+    """
+    通过 mpremote 在Pico上运行基准测试(固件文件需已复制到Pico)
+
+    Returns:
+        dict: 基准名称 -> 指标字典
+    """
+    script = os.path.join(BENCH_DIR, 'benchmarks.py')
+    output = subprocess.run(
+        ['mpremote', 'connect', port, 'run', script],
+        check=True, capture_output=True, text=True,
+    ).stdout
+    for line in output.splitlines():
+        if line.startswith(MARKER):
+            return json.loads(line[len(MARKER):])
+    raise RuntimeError('设备没有输出基准结果:\n' + output)
+
+
+def compare(baseline, current, time_tolerance, size_tolerance):
+    """
+    与基线比较
+
+    Args:
+        baseline (dict): 基线结果
+        current (dict): 本次结果
+        time_tolerance (float): 耗时/吞吐量允许的相对退化
+        size_tolerance (float): 字节数/分配量允许的相对增加
+
+    Returns:
+        list: 退化描述列表
+    """
+    regressions = []
+    for name, metrics in current.items():
+        old_metrics = baseline.get(name)
+        if old_metrics is None:
+            continue
+        for key, value in metrics.items():
+            old = old_metrics.get(key)
+            if old is None:
+                continue
+            if key.endswith('_per_s'):
+                limit = old * (1 - time_tolerance)
+                worse = value < limit
+            elif key.endswith('_us'):
+                limit = old * (1 + time_tolerance)
+                worse = value > limit
+            else:
+                # 字节数和分配量：主机上tracemalloc有少量抖动，另留16字节余量
+                limit = old * (1 + size_tolerance) + (16 if key.endswith('_alloc') else 0)
+                worse = value > limit
+            if worse:
+                regressions.append('{}.{}: {} -> {} (限值 {:.1f})'.format(name, key, old, value, limit))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='热点路径基准测试')
+    parser.add_argument('--device', help='Pico串口(通过mpremote运行)，不指定时在主机上运行')
+    parser.add_argument('--repeat', type=int, default=3, help='主机上重复运行次数')
+    parser.add_argument('--only', nargs='*', help='只运行指定的基准')
+    parser.add_argument('--output', help='结果写入JSON文件')
+    parser.add_argument('--compare', help='基线结果JSON文件，有指标退化时以状态1退出')
+    parser.add_argument('--time-tolerance', type=float, default=0.25, help='耗时允许的相对退化')
+    parser.add_argument('--size-tolerance', type=float, default=0.0, help='字节数/分配量允许的相对增加')
+    args = parser.parse_args()
+
+    if args.device:
+        results = run_device(args.device)
+        target = 'device'
+    else:
+        results = run_host(args.repeat, args.only)
+        target = 'host'
+
+    report = {
+        'target': target,
+        'python': sys.implementation.name + ' ' + platform.python_version(),
+        'results': results,
+    }
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    print(text)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if baseline.get('target') != target:
+            print('⚠️  基线来自 {}，本次运行在 {}，耗时指标不可直接比较'.format(baseline.get('target'), target))
+        regressions = compare(baseline['results'], results, args.time_tolerance, args.size_tolerance)
+        if regressions:
+            print('❌ 性能退化:')
+            for line in regressions:
+                print('   ' + line)
+            sys.exit(1)
+        print('✅ 没有超出容差的性能退化')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""
+系统配置
+设备数量及各设备的引脚分配，引脚元组按设备顺序排列(第1项对应device1)
+"""
+
+# 设备(发酵罐)数量
+DEVICE_COUNT = 2
+
+# DS18B20温度传感器引脚
+DS_PINS = (9, 7)
+
+# DS18B20分辨率(9-12位)：转换时间 9位94ms / 10位188ms / 11位375ms / 12位750ms
+DS_RESOLUTION = 12
+# 读完一轮温度到下一次启动转换的间隔(毫秒)
+DS_INTERVAL_MS = 2000
+# 读数无效(CRC错误、85°C上电值、超出量程)时的重试次数
+DS_READ_RETRIES = 2
+# 超过此时间没有有效读数时置设备故障标志(fault)，温度保持最后一个有效值(毫秒)
+DS_STALE_MS = 10000
+# 没有有效读数的总线在后台重新搜索的最小间隔(毫秒)，重新插入的探头由此重新识别
+DS_RESCAN_MS = 5000
+
+# 水位检测引脚 (高电平表示水位异常)
+WATER_PINS = (24, 8)
+
+# 警告灯 / 报警灯引脚
+WARN_LED_PINS = (2, 29)
+ALARM_LED_PINS = (3, 28)
+
+# 继电器引脚: 制冷(通电0.5s断电循环) / 制热 / 水泵
+COOL_RELAY_PINS = (14, 15)
+HEAT_RELAY_PINS = (17, 18)
+PUMP_RELAY_PINS = (19, 20)
+
+# OLED显示屏: (I2C编号, SCL引脚, SDA引脚)
+DISPLAYS = (
+    (1, 27, 26),
+    (0, 1, 0),
+)
+
+# 流量计: (脉冲输入引脚, 所属设备索引, 每升脉冲数)，每升脉冲数按实测校准(ZJS201规格为450)；
+# 第i个流量计使用第i个PIO状态机。没有流量计的设备流速为0(可由主机下发)
+FLOW_METERS = (
+    (11, 0, 450),
+)
+
+# UART接收单行最大长度(字节)，超长行整行丢弃
+UART_RX_MAX_LINE = 256
+
+# 串口协议: 'json' (按行JSON) 或 'binary' (COBS + CRC16 二进制帧)
+# 主机也可在运行时发送 {"cmd": "proto", "mode": "binary"} 切换
+UART_PROTOCOL = 'json'
+
+# 遥测增量模式：只发送变化的字段，帧带序号；关键帧周期(毫秒)
+TELEMETRY_DELTA = False
+TELEMETRY_KEYFRAME_MS = 30000
+
+# 串口发送队列大小(字节)，主机过慢时遥测数据被丢弃而不阻塞控制任务
+UART_TX_QUEUE = 512
+
+# 遥测数据流输出周期(毫秒)，0表示关闭；主机可在运行时调整或临时加速
+# device: 设备状态  flow: 流速  diag: 诊断统计
+TELEMETRY_RATES = {'device': 1000, 'flow': 0, 'diag': 0}
+# 设备数据变化时立即输出的最小间隔(毫秒)
+TELEMETRY_MIN_GAP_MS = 100
+
+# 运行轨迹记录文件(如 'trace.bin')，None表示不记录；用 sim/replay.py 在主机上重放
+TRACE_FILE = None
+# 轨迹中是否记录串口发送数据(用于比对遥测输出，数据量较大)
+TRACE_TX = False
+
+# 日志级别: 'DEBUG' / 'INFO' / 'WARN' / 'ERROR' / 'OFF'
+# LOG_LEVEL 以上的日志写入内存环形缓冲区(主机可用 {"cmd": "log"} 读取)，
+# LOG_CONSOLE_LEVEL 以上的日志同时打印到控制台；生产环境两者都设为 'WARN'
+LOG_LEVEL = 'INFO'
+LOG_CONSOLE_LEVEL = 'INFO'
+# 环形缓冲区条数
+LOG_RING_SIZE = 64
+
+# 看门狗超时(毫秒)，RP2040最长8388；关键任务全部按时运行才喂狗。None表示不启用(调试时)
+WDT_TIMEOUT_MS = 8000
+# 任务监控检查周期(毫秒)
+SUPERVISOR_CHECK_MS = 1000
+
+# 流量脉冲计数后端: 'pio' (RP2040 PIO状态机硬件计数，不可用时自动改用中断) 或 'irq' (每个脉冲一次中断)
+FLOW_BACKEND = 'pio'
+
+# 流速测量方式: 'count' (按刷新间隔内的脉冲数计算) 或 'period' (按平均脉冲周期计算，低流速下分辨率更高，使用中断时间戳)
+FLOW_MODE = 'count'
+# 流速刷新间隔(毫秒)
+FLOW_UPDATE_MS = 1000
+# 周期测量的滑动窗口(毫秒)
+FLOW_WINDOW_MS = 2000
+# 周期测量时超过此时间没有脉冲判定为零流量(毫秒)
+FLOW_ZERO_TIMEOUT_MS = 3000
@@ -0,0 +1,170 @@
+"""
+分级日志
+日志调用点(LogSite)预先创建，记录时只把时刻、调用点和最多3个参数写入固定大小的内存环形缓冲区，
+不格式化字符串；查看环形缓冲区或打印到控制台时才格式化。
+每个调用点按键(如设备索引)限速，间隔内重复的日志只计数，下一条日志附带省略的条数。
+低于 level 的日志直接丢弃，生产环境设为 WARN 时日志几乎没有开销
+
+用法:
+    log_temp = logger.site(INFO, 'DS{}温度: {:.2f}°C', 10000, config.DEVICE_COUNT)
+    log_temp(pin, temp, key=index)
+"""
+
+import time
+from array import array
+from micropython import const
+
+import config
+
+# 日志级别
+DEBUG = const(10)
+INFO = const(20)
+WARN = const(30)
+ERROR = const(40)
+OFF = const(100)
+
+LEVEL_NAMES = {'DEBUG': DEBUG, 'INFO': INFO, 'WARN': WARN, 'ERROR': ERROR, 'OFF': OFF}
+# 环形缓冲区查看时的级别标记
+LEVEL_MARKS = {DEBUG: 'D', INFO: 'I', WARN: 'W', ERROR: 'E'}
+
+
+def parse_level(value):
+    """
+    级别名或级别值转级别值
+
+    Returns:
+        int: 级别值，无效时返回-1
+    """
+    if isinstance(value, str):
+        return LEVEL_NAMES.get(value.upper(), -1)
+    if isinstance(value, int) and value >= 0:
+        return value
+    return -1
+
+
+class LogSite:
+    """日志调用点 - 级别、格式串和按键限速状态"""
+
+    def __init__(self, logger, level, fmt, interval_ms=0, keys=1):
+        """
+        Args:
+            logger (Logger): 所属日志器
+            level (int): 日志级别
+            fmt (str): str.format 格式串，最多3个参数
+            interval_ms (int): 同一键两条日志的最小间隔(毫秒)，0表示不限速
+            keys (int): 独立限速的键数(如设备数量)
+        """
+        self.logger = logger
+        self.level = level
+        self.fmt = fmt
+        self.interval_ms = interval_ms
+        self.last = array('i', [0] * keys)          # 各键上次记录的时刻(ticks_ms)
+        self.armed = bytearray(keys)                # 各键是否记录过
+        self.suppressed = array('H', [0] * keys)    # 各键被限速省略的条数
+
+    def enabled(self):
+        """是否会被记录；参数需要额外准备(如复制接收缓冲区)时先检查"""
+        return self.level >= self.logger.level
+
+    def __call__(self, a=None, b=None, c=None, key=0):
+        """记录一条日志，参数不在此处格式化"""
+        logger = self.logger
+        if self.level < logger.level:
+            return
+        suppressed = 0
+        if self.interval_ms:
+            now = time.ticks_ms()
+            if self.armed[key] and time.ticks_diff(now, self.last[key]) < self.interval_ms:
+                if self.suppressed[key] < 0xFFFF:
+                    self.suppressed[key] += 1
+                logger.suppressed += 1
+                return
+            self.armed[key] = 1
+            self.last[key] = now
+            suppressed = self.suppressed[key]
+            self.suppressed[key] = 0
+        logger.write(self, a, b, c, suppressed)
+
+
+class Logger:
+    """日志器 - 固定大小的环形缓冲区，可选同时打印到控制台"""
+
+    def __init__(self, level=INFO, console_level=INFO, size=64):
+        """
+        Args:
+            level (int): 记录级别，低于此级别的日志直接丢弃
+            console_level (int): 打印级别，达到此级别的日志同时格式化打印到控制台
+            size (int): 环形缓冲区条数
+        """
+        self.level = level
+        self.console_level = console_level
+        self.size = size
+        self.times = array('I', [0] * size)        # 记录时刻(ticks_ms)
+        self.sites = [None] * size                  # 调用点
+        self.args_a = [None] * size
+        self.args_b = [None] * size
+        self.args_c = [None] * size
+        self.skips = array('H', [0] * size)         # 记录前被限速省略的条数
+        self.written = 0                            # 已写入的总条数(即下一条的序号)
+        self.suppressed = 0                         # 被限速省略的总条数
+
+    def site(self, level, fmt, interval_ms=0, keys=1):
+        """创建日志调用点，参数见 LogSite"""
+        return LogSite(self, level, fmt, interval_ms, keys)
+
+    def write(self, site, a, b, c, suppressed=0):
+        """写入一条记录，达到打印级别时同时打印"""
+        i = self.written % self.size
+        self.times[i] = time.ticks_ms()
+        self.sites[i] = site
+        self.args_a[i] = a
+        self.args_b[i] = b
+        self.args_c[i] = c
+        self.skips[i] = suppressed
+        self.written += 1
+        if site.level >= self.console_level:
+            print(self.format(self.written - 1))
+
+    def oldest(self):
+        """环形缓冲区中最早一条记录的序号"""
+        return max(self.written - self.size, 0)
+
+    def format(self, seq):
+        """
+        格式化一条记录
+
+        Args:
+            seq (int): 记录序号，须在 oldest() 到 written 之间
+
+        Returns:
+            str: 日志行
+        """
+        i = seq % self.size
+        site = self.sites[i]
+        try:
+            text = site.fmt.format(self.args_a[i], self.args_b[i], self.args_c[i])
+        except (ValueError, TypeError, IndexError) as e:
+            text = '{} {}'.format(site.fmt, e)
+        skips = self.skips[i]
+        if skips:
+            text = '{} (省略{}条)'.format(text, skips)
+        t = self.times[i]
+        return '{}.{:03d} {} {}'.format(t // 1000, t % 1000, LEVEL_MARKS.get(site.level, '?'), text)
+
+    def dump(self):
+        """把环形缓冲区中的全部记录打印到控制台"""
+        for seq in range(self.oldest(), self.written):
+            print(self.format(seq))
+
+
+# 全局日志器
+logger = Logger(
+    parse_level(config.LOG_LEVEL),
+    parse_level(config.LOG_CONSOLE_LEVEL),
+    config.LOG_RING_SIZE,
+)
+
+
+def get_logger():
+    """获取全局日志器"""
+    return logger
@@ -1,10 +1,152 @@
 """
 全局单例数据管理器
-负责管理两个设备的数据，并提供显示更新和串口通信接口
+负责管理所有设备的数据，并提供显示更新和串口通信接口
 """
 
 import uasyncio as asyncio
-import json
+import time
+from array import array
+from micropython import const
+
+import config
+
+# 设备状态标志位(每个设备一个字节)
+FLAG_WATER = const(0x01)          # 水位状态
+FLAG_HEAT = const(0x02)           # 加热开关
+FLAG_PUMP = const(0x04)           # 水泵开关
+FLAG_COOL = const(0x08)           # 制冷开关
+FLAG_WARN = const(0x10)           # 警告状态
+FLAG_ALARM = const(0x20)          # 报警状态
+FLAG_FAULT = const(0x40)          # 温度传感器故障(读数过期或无效，由温度采集设置)
+
+# 非标志位字段的变化位，与标志位一起组成变化掩码
+CHANGE_TEMP = const(0x100)        # 温度变化
+CHANGE_FLOW = const(0x200)        # 流速变化
+CHANGE_VOLUME = const(0x400)      # 累计流量变化
+CHANGE_ALL = const(0x7FF)
+
+# 标志位字段名与位的对应关系(按串口协议字段顺序)
+FLAG_FIELDS = (
+    ('water', FLAG_WATER),
+    ('heat', FLAG_HEAT),
+    ('pump', FLAG_PUMP),
+    ('cool', FLAG_COOL),
+    ('warn', FLAG_WARN),
+    ('alarm', FLAG_ALARM),
+    ('fault', FLAG_FAULT),
+)
+
+# 主机可写的标志位；故障位只由温度采集维护，主机发送的 fault 字段被忽略
+HOST_FLAGS = const(0x3F)
+HOST_FLAG_FIELDS = tuple(item for item in FLAG_FIELDS if item[1] & HOST_FLAGS)
+
+
+# 主机可写数值的范围：存储为0.01单位的整数，二进制遥测中温度为 int16、流速为 uint16
+TEMP_MIN = -327.68
+TEMP_MAX = 327.67
+FLOW_MAX = 655.35
+
+
+def parse_temp(value):
+    """
+    串口温度字段转浮点数
+
+    Raises:
+        ValueError, TypeError: 无法转换或超出 TEMP_MIN..TEMP_MAX (含NaN)
+    """
+    temp = float(value)
+    if not TEMP_MIN <= temp <= TEMP_MAX:
+        raise ValueError('temp out of range: {}'.format(value))
+    return temp
+
+
+def parse_flow(value):
+    """
+    串口流速字段转浮点数
+
+    Raises:
+        ValueError, TypeError: 无法转换或超出 0..FLOW_MAX (含NaN)
+    """
+    flow = float(value)
+    if not 0 <= flow <= FLOW_MAX:
+        raise ValueError('flow out of range: {}'.format(value))
+    return flow
+
+
+def to_bool(value):
+    """串口字段转布尔值，兼容 "0"/"1" 字符串"""
+    return bool(int(value)) if isinstance(value, str) else bool(value)
+
+
+def parse_fields(data):
+    """
+    解析串口协议的设备字段，缺少的字段保持原值
+    
+    Args:
+        data (dict): 包含 temp/water/heat/pump/cool/warn/alarm 字段的字典
+        
+    Returns:
+        tuple: (温度或None, 置位标志, 清零标志)
+        
+    Raises:
+        ValueError, TypeError: 字段值无效或超出存储范围
+    """
+    temp = parse_temp(data['temp']) if 'temp' in data else None
+    set_bits = 0
+    clear_bits = 0
+    for field, flag in HOST_FLAG_FIELDS:
+        if field in data:
+            if to_bool(data[field]):
+                set_bits |= flag
+            else:
+                clear_bits |= flag
+    return temp, set_bits, clear_bits
+
+
+class Subscription:
+    """数据变化订阅 - 关注的设备/字段发生变化时唤醒等待的任务"""
+    
+    def __init__(self, devices=None, mask=CHANGE_ALL):
+        """
+        Args:
+            devices (tuple): 关注的设备索引，None表示所有设备
+            mask (int): 关注的变化掩码 (FLAG_* / CHANGE_*)
+        """
+        self.devices = devices
+        self.mask = mask
+        self.event = asyncio.Event()
+        self.notified_us = time.ticks_us()   # 最近一次通知的时刻(ticks_us)，用于统计唤醒延迟
+    
+    def matches(self, index, mask):
+        """判断一次数据变化是否属于本订阅"""
+        return (self.devices is None or index in self.devices) and (self.mask & mask) != 0
+    
+    def notify(self):
+        """唤醒等待的任务，记录第一次通知的时刻"""
+        if not self.event.is_set():
+            self.notified_us = time.ticks_us()
+            self.event.set()
+    
+    async def wait(self, timeout_ms=None):
+        """
+        等待数据变化
+        
+        Args:
+            timeout_ms (int): 超时时间(毫秒)，None表示一直等待
+            
+        Returns:
+            bool: True表示数据发生了变化，False表示等待超时
+        """
+        if not self.event.is_set():
+            if timeout_ms is None:
+                await self.event.wait()
+            else:
+                try:
+                    await asyncio.wait_for_ms(self.event.wait(), timeout_ms)
+                except asyncio.TimeoutError:
+                    return False
+        self.event.clear()
+        return True
 
 
 class SingletonData:
@@ -22,164 +164,276 @@ class SingletonData:
         # 防止重复初始化
         if self._initialized:
             return
-            
-        # 设备1数据
-        self.device1_temp = 25.0          # 温度
-        self.device1_water = False        # 水位状态
-        self.device1_heat = False         # 加热开关
-        self.device1_pump = False         # 水泵开关
-        self.device1_cool = False         # 制冷开关
-        self.device1_warn = False         # 警告状态
-        self.device1_alarm = False        # 报警状态
-        
-        # 设备2数据
-        self.device2_temp = 25.0          # 温度
-        self.device2_water = False        # 水位状态
-        self.device2_heat = False         # 加热开关
-        self.device2_pump = False         # 水泵开关
-        self.device2_cool = False         # 制冷开关
-        self.device2_warn = False         # 警告状态
-        self.device2_alarm = False        # 报警状态
-        
-        # 共享数据
-        self.shared_flow = 0.0            # 共享流速
+        
+        n = config.DEVICE_COUNT
+        self.device_count = n
+        
+        # 按设备索引存放的数据列
+        self.temps = array('i', [2500] * n)   # 温度 (0.01°C)
+        self.flags = bytearray(n)             # 状态标志位 (FLAG_*)
+        self.flows = array('i', [0] * n)      # 流速 (0.01 L/min)，没有流量计的设备为0
+        self.volumes = array('I', [0] * n)    # 启动以来的累计流量 (0.01 L)
+        
+        # 版本计数器：设备数据每变化一次加1，消费者据此跳过无变化的刷新
+        self.versions = array('I', [0] * n)
+        
+        # 批量更新：期间的变化先累积，结束时每个设备只递增一次版本并统一通知
+        self._batch_depth = 0
+        self._pending = array('H', [0] * n)
+        
+        # 数据变化订阅者
+        self._subscriptions = []
         
         # 标记已初始化
         self._initialized = True
     
-    def update_from_dict(self, data_dict):
+    def device_key(self, index):
+        """设备索引转设备ID ('device1', 'device2', ...)"""
+        return 'device%d' % (index + 1)
+    
+    def device_index(self, device_key):
         """
-        从字典更新数据
+        设备ID转设备索引
+        
+        Returns:
+            int: 设备索引，未知设备ID返回-1
+        """
+        if isinstance(device_key, str) and device_key.startswith('device'):
+            try:
+                index = int(device_key[6:]) - 1
+            except ValueError:
+                return -1
+            if 0 <= index < self.device_count:
+                return index
+        return -1
+    
+    def _commit(self, index, mask):
+        """设备数据发生变化：递增版本号并通知订阅者"""
+        if self._batch_depth:
+            self._pending[index] |= mask
+            return
+        self.versions[index] = (self.versions[index] + 1) & 0x3FFFFFFF
+        for sub in self._subscriptions:
+            if sub.matches(index, mask):
+                sub.notify()
+    
+    def begin_batch(self):
+        """开始批量更新，可嵌套"""
+        self._batch_depth += 1
+    
+    def abort_batch(self):
+        """放弃批量更新：丢弃累积的变化，不递增版本也不通知(数据由调用方恢复)"""
+        self._batch_depth -= 1
+        if self._batch_depth:
+            return
+        pending = self._pending
+        for index in range(self.device_count):
+            pending[index] = 0
+    
+    def end_batch(self):
+        """结束批量更新：提交累积的变化，每个设备只递增一次版本并通知一次"""
+        self._batch_depth -= 1
+        if self._batch_depth:
+            return
+        pending = self._pending
+        for index in range(self.device_count):
+            mask = pending[index]
+            if mask:
+                pending[index] = 0
+                self._commit(index, mask)
+    
+    def subscribe(self, devices=None, mask=CHANGE_ALL):
+        """
+        订阅数据变化
         
         Args:
-            data_dict (dict): 包含设备数据的字典
+            devices (tuple): 关注的设备索引，None表示所有设备
+            mask (int): 关注的变化掩码 (FLAG_* / CHANGE_*)
+            
+        Returns:
+            Subscription: 订阅对象，通过 await sub.wait() 等待变化
         """
-        try:
-            # 更新设备1数据
-            if 'device1' in data_dict:
-                dev1 = data_dict['device1']
-                self.device1_temp = float(dev1.get('temp', self.device1_temp))
-                self.device1_water = bool(dev1.get('water', self.device1_water))
-                self.device1_heat = bool(dev1.get('heat', self.device1_heat))
-                self.device1_pump = bool(dev1.get('pump', self.device1_pump))
-                self.device1_cool = bool(dev1.get('cool', self.device1_cool))
-                self.device1_warn = bool(dev1.get('warn', self.device1_warn))
-                self.device1_alarm = bool(dev1.get('alarm', self.device1_alarm))
+        sub = Subscription(devices, mask)
+        self._subscriptions.append(sub)
+        return sub
+    
+    def unsubscribe(self, sub):
+        """取消订阅"""
+        if sub in self._subscriptions:
+            self._subscriptions.remove(sub)
+    
+    def update_device(self, index, temp=None, set_bits=0, clear_bits=0):
+        """
+        更新指定设备的数据，所有变化只通知一次
+        
+        Args:
+            index (int): 设备索引
+            temp (float): 新温度，None表示不变
+            set_bits (int): 需要置位的标志位
+            clear_bits (int): 需要清零的标志位
             
-            # 更新设备2数据
-            if 'device2' in data_dict:
-                dev2 = data_dict['device2']
-                self.device2_temp = float(dev2.get('temp', self.device2_temp))
-                self.device2_water = bool(dev2.get('water', self.device2_water))
-                self.device2_heat = bool(dev2.get('heat', self.device2_heat))
-                self.device2_pump = bool(dev2.get('pump', self.device2_pump))
-                self.device2_cool = bool(dev2.get('cool', self.device2_cool))
-                self.device2_warn = bool(dev2.get('warn', self.device2_warn))
-                self.device2_alarm = bool(dev2.get('alarm', self.device2_alarm))
+        Returns:
+            int: 变化掩码，0表示数据没有变化
+        """
+        changed = 0
+        if temp is not None:
+            centi = round(temp * 100)
+            if centi != self.temps[index]:
+                self.temps[index] = centi
+                changed = CHANGE_TEMP
+        old = self.flags[index]
+        new = (old | set_bits) & ~clear_bits & 0xFF
+        if new != old:
+            self.flags[index] = new
+            changed |= old ^ new
+        if changed:
+            self._commit(index, changed)
+        return changed
+    
+    def set_temp(self, index, temp):
+        """更新指定设备的温度"""
+        return self.update_device(index, temp=temp)
+    
+    def set_flag(self, index, flag, value):
+        """更新指定设备的单个标志位"""
+        if value:
+            return self.update_device(index, set_bits=flag)
+        return self.update_device(index, clear_bits=flag)
+    
+    def update_flow(self, index, flow=None, volume=None):
+        """
+        更新指定设备的流速和累计流量，所有变化只通知一次
+        
+        Args:
+            index (int): 设备索引
+            flow (float): 流速 (L/min)，None表示不变
+            volume (float): 累计流量 (L)，None表示不变
             
-            # 更新共享流速
-            if 'flow' in data_dict:
-                self.shared_flow = float(data_dict['flow'])
-                
-        except (ValueError, TypeError) as e:
-            print(f"❌ 数据更新错误: {e}")
-    
-    def get_device1_dict(self):
-        """获取设备1数据字典"""
-        return {
-            'temp': self.device1_temp,
-            'water': self.device1_water,
-            'heat': self.device1_heat,
-            'pump': self.device1_pump,
-            'cool': self.device1_cool,
-            'warn': self.device1_warn,
-            'alarm': self.device1_alarm
-        }
-    
-    def get_device2_dict(self):
-        """获取设备2数据字典"""
-        return {
-            'temp': self.device2_temp,
-            'water': self.device2_water,
-            'heat': self.device2_heat,
-            'pump': self.device2_pump,
-            'cool': self.device2_cool,
-            'warn': self.device2_warn,
-            'alarm': self.device2_alarm
-        }
-    
-    def get_all_data_dict(self):
-        """获取所有数据字典"""
-        return {
-            'device1': self.get_device1_dict(),
-            'device2': self.get_device2_dict(),
-            'flow': self.shared_flow
-        }
-    
-
-    
-    def get_serial_output(self):
-        """
-        获取串口输出数据
+        Returns:
+            int: 变化掩码，0表示数据没有变化
+        """
+        changed = 0
+        if flow is not None:
+            centi = round(float(flow) * 100)
+            if centi != self.flows[index]:
+                self.flows[index] = centi
+                changed = CHANGE_FLOW
+        if volume is not None:
+            centi = round(float(volume) * 100)
+            if centi != self.volumes[index]:
+                self.volumes[index] = centi
+                changed |= CHANGE_VOLUME
+        if changed:
+            self._commit(index, changed)
+        return changed
+    
+    def set_flow(self, index, value):
+        """
+        更新流速
+        
+        Args:
+            index (int): 设备索引，None表示所有设备(主机下发不带设备的流速时)
+            value (float): 流速 (L/min)
+            
+        Returns:
+            bool: 值是否发生变化
+        """
+        if index is not None:
+            return self.update_flow(index, flow=value) != 0
+        changed = False
+        self.begin_batch()
+        try:
+            for index in range(self.device_count):
+                if self.update_flow(index, flow=value):
+                    changed = True
+        finally:
+            self.end_batch()
+        return changed
+    
+    def get_temp(self, index):
+        """获取指定设备的温度 (°C)"""
+        return self.temps[index] / 100
+    
+    def get_flag(self, index, flag):
+        """获取指定设备的标志位状态"""
+        return (self.flags[index] & flag) != 0
+    
+    def get_flow(self, index):
+        """获取指定设备的流速 (L/min)"""
+        return self.flows[index] / 100
+    
+    def get_volume(self, index):
+        """获取指定设备的累计流量 (L)"""
+        return self.volumes[index] / 100
+    
+    def get_version(self, index):
+        """
+        获取设备数据版本号
+        
+        Returns:
+            int: 版本号，数据每变化一次加1
+        """
+        return self.versions[index]
+    
+    def apply_fields(self, index, data):
+        """
+        按串口协议字段更新指定设备，缺少的字段保持原值
         
+        Args:
+            index (int): 设备索引
+            data (dict): 包含 temp/water/heat/pump/cool/warn/alarm 字段的字典
+            
         Returns:
-            tuple: (设备1JSON字符串, 设备2JSON字符串)
-        """
-        # 设备1数据
-        dev1_data = {
-            'device': 'device1',
-            'temp': round(self.device1_temp, 2),
-            'water': int(self.device1_water),
-            'heat': int(self.device1_heat),
-            'pump': int(self.device1_pump),
-            'cool': int(self.device1_cool),
-            'warn': int(self.device1_warn),
-            'alarm': int(self.device1_alarm),
-            'flow': round(self.shared_flow, 2)
-        }
-        
-        # 设备2数据
-        dev2_data = {
-            'device': 'device2',
-            'temp': round(self.device2_temp, 2),
-            'water': int(self.device2_water),
-            'heat': int(self.device2_heat),
-            'pump': int(self.device2_pump),
-            'cool': int(self.device2_cool),
-            'warn': int(self.device2_warn),
-            'alarm': int(self.device2_alarm),
-            'flow': round(self.shared_flow, 2)
-        }
-        
-        return json.dumps(dev1_data), json.dumps(dev2_data)
+            int: 变化掩码
+        """
+        temp, set_bits, clear_bits = parse_fields(data)
+        return self.update_device(index, temp, set_bits, clear_bits)
+    
+    def apply_batch(self, updates, flow=None):
+        """
+        原子地应用多个设备的更新，所有变化只通知一次
+        
+        Args:
+            updates (list): [(设备索引, 温度或None, 置位标志, 清零标志, 流速或None), ...]，
+                由 parse_fields / parse_flow 预先校验；记录中的流速优先于 flow
+            flow (float): 所有设备的流速(由 parse_flow 预先校验)，None表示不变
+        """
+        # 预先校验后不应失败；万一失败则恢复原值，整批不生效
+        temps = array('i', self.temps)
+        flags = bytes(self.flags)
+        flows = array('i', self.flows)
+        self.begin_batch()
+        try:
+            if flow is not None:
+                self.set_flow(None, flow)
+            for index, temp, set_bits, clear_bits, device_flow in updates:
+                self.update_device(index, temp, set_bits, clear_bits)
+                if device_flow is not None:
+                    self.set_flow(index, device_flow)
+        except Exception:
+            for index in range(self.device_count):
+                self.temps[index] = temps[index]
+                self.flags[index] = flags[index]
+                self.flows[index] = flows[index]
+            self.abort_batch()
+            raise
+        self.end_batch()
+    
+    def get_device_dict(self, index):
+        """获取指定设备的状态字典(字段和取值与JSON遥测帧一致，用于查询应答)"""
+        flags = self.flags[index]
+        data = {'device': self.device_key(index), 'temp': self.temps[index] / 100}
+        for field, flag in FLAG_FIELDS:
+            data[field] = 1 if flags & flag else 0
+        data['flow'] = self.flows[index] / 100
+        data['volume'] = self.volumes[index] / 100
+        return data
 
 
 # 全局单例实例
 data_manager = SingletonData()
 
 
-async def serial_output_task(uart_util):
-    """串口输出任务 - 每秒输出数据"""
-    print("🚀 串口输出任务开始运行...")
-    
-    while True:
-        try:
-            # 获取JSON数据
-            dev1_json, dev2_json = data_manager.get_serial_output()
-            
-            # 发送设备1数据
-            uart_util.send(dev1_json + '\n')
-            
-            # 发送设备2数据
-            uart_util.send(dev2_json + '\n')
-            
-            await asyncio.sleep(1)
-            
-        except Exception as e:
-            print(f"❌ 串口输出任务错误: {e}")
-            await asyncio.sleep(1)
-
-
 # 导出函数
 def get_data_manager():
     """获取全局数据管理器实例"""
@@ -0,0 +1,161 @@
+"""
+任务运行统计
+记录每个协程的运行次数、每次运行(从唤醒到再次挂起)的耗时，以及唤醒延迟：
+定时等待为实际唤醒时刻与预定时刻之差，数据变化唤醒为从通知到恢复运行的时间。
+用于确认显示屏I2C写入、DS18B20读取等阻塞操作是否推迟了继电器控制任务的响应
+
+统计值都是小整数(平均值为1/8权重的滑动平均)，记录时不分配堆内存；
+每次挂起时刷新的 progress_ms 供任务监控(task/supervisor.py)判断任务是否按时运行
+"""
+
+import uasyncio as asyncio
+import time
+from micropython import const
+
+# 统计字段(顺序即二进制帧中uint32的顺序)
+TASK_FIELDS = ('iter', 'run_avg_us', 'run_max_us', 'lag_avg_us', 'lag_max_us', 'restarts')
+
+# 预定唤醒时刻按 ticks_us 计算，ticks_add 的增量不能超过半个周期(约536秒)；
+# 更长的等待分段进行，只有最后一段记录唤醒延迟
+MAX_WAIT_MS = const(60000)
+
+
+class TaskStats:
+    """单个任务的运行统计"""
+
+    def __init__(self, name):
+        """
+        Args:
+            name (str): 任务名称
+        """
+        self.name = name
+        self.name_bytes = name.encode()
+        self.iterations = 0         # 运行次数
+        self.run_avg_us = 0         # 单次运行耗时滑动平均(微秒)
+        self.run_max_us = 0         # 单次运行最长耗时(微秒)
+        self.wakes = 0              # 唤醒延迟采样次数
+        self.lag_avg_us = 0         # 唤醒延迟滑动平均(微秒)
+        self.lag_max_us = 0         # 最大唤醒延迟(微秒)
+        self.restarts = 0           # 被任务监控重启的次数(不随统计清除)
+        self.started = time.ticks_us()
+        self.progress_ms = time.ticks_ms()   # 最近一次完成运行的时刻(ticks_ms)
+
+    def begin(self):
+        """任务恢复运行"""
+        self.started = time.ticks_us()
+
+    def end(self):
+        """任务即将挂起：记录本次运行耗时"""
+        run = time.ticks_diff(time.ticks_us(), self.started)
+        if self.iterations:
+            self.run_avg_us += (run - self.run_avg_us) >> 3
+        else:
+            self.run_avg_us = run
+        if run > self.run_max_us:
+            self.run_max_us = run
+        self.iterations = (self.iterations + 1) & 0x3FFFFFFF
+        self.progress_ms = time.ticks_ms()
+
+    def woke(self, since):
+        """
+        记录唤醒延迟
+
+        Args:
+            since (int): 预定唤醒时刻或收到通知的时刻(ticks_us)
+        """
+        lag = max(time.ticks_diff(time.ticks_us(), since), 0)
+        if self.wakes:
+            self.lag_avg_us += (lag - self.lag_avg_us) >> 3
+        else:
+            self.lag_avg_us = lag
+        if lag > self.lag_max_us:
+            self.lag_max_us = lag
+        self.wakes = (self.wakes + 1) & 0x3FFFFFFF
+
+    async def sleep_ms(self, ms):
+        """代替 asyncio.sleep_ms：挂起前记录运行耗时，唤醒后记录延迟"""
+        self.end()
+        while ms > MAX_WAIT_MS:
+            await asyncio.sleep_ms(MAX_WAIT_MS)
+            ms -= MAX_WAIT_MS
+        due = time.ticks_add(time.ticks_us(), ms * 1000)
+        await asyncio.sleep_ms(ms)
+        self.woke(due)
+        self.begin()
+
+    async def wait(self, sub, timeout_ms=None):
+        """
+        代替 sub.wait：挂起前记录运行耗时，唤醒后记录延迟
+
+        Args:
+            sub (Subscription): 数据变化订阅
+            timeout_ms (int): 超时时间(毫秒)，None表示一直等待
+
+        Returns:
+            bool: True表示数据发生了变化，False表示等待超时
+        """
+        self.end()
+        changed = False
+        while timeout_ms is not None and timeout_ms > MAX_WAIT_MS:
+            changed = await sub.wait(MAX_WAIT_MS)
+            if changed:
+                break
+            timeout_ms -= MAX_WAIT_MS
+        if not changed:
+            if timeout_ms is not None:
+                due = time.ticks_add(time.ticks_us(), timeout_ms * 1000)
+            changed = await sub.wait(timeout_ms)
+        self.woke(sub.notified_us if changed else due)
+        self.begin()
+        return changed
+
+    def snapshot(self):
+        """
+        Returns:
+            tuple: 与 TASK_FIELDS 顺序对应的统计值
+        """
+        return (self.iterations, self.run_avg_us, self.run_max_us, self.lag_avg_us, self.lag_max_us,
+                self.restarts)
+
+    def reset(self):
+        """清除统计"""
+        self.iterations = 0
+        self.run_avg_us = 0
+        self.run_max_us = 0
+        self.wakes = 0
+        self.lag_avg_us = 0
+        self.lag_max_us = 0
+
+
+# 已登记的任务(按登记顺序，二进制查询按此顺序编号)
+tasks = []
+
+
+def register_task(name):
+    """
+    登记任务统计，同名任务(如重启后的任务)沿用已有的统计
+
+    Args:
+        name (str): 任务名称
+
+    Returns:
+        TaskStats: 任务统计对象
+    """
+    for stats in tasks:
+        if stats.name == name:
+            stats.begin()
+            return stats
+    stats = TaskStats(name)
+    tasks.append(stats)
+    return stats
+
+
+def get_task_stats():
+    """获取所有已登记的任务统计"""
+    return tasks
+
+
+def reset_task_stats():
+    """清除所有任务的统计(最大值从此重新记录)"""
+    for stats in tasks:
+        stats.reset()
@@ -0,0 +1,530 @@
+"""
+串口遥测输出
+完整模式：每次发送所有设备的完整状态
+增量模式：只发送上次发送后变化的字段，定期或应主机请求发送关键帧，帧带序号供主机检测丢帧
+JSON帧用预编译的字节模板直接写入预分配缓冲区，稳态输出循环不分配堆内存
+设备状态、流速、诊断三路数据流各有独立的输出周期，可在运行时调整或临时加速(burst)
+诊断数据流包含运行统计和各任务的运行统计(data/task_stats.py)
+"""
+
+import gc
+import time
+from array import array
+
+import config
+from data.singleton_data import get_data_manager, FLAG_FIELDS, CHANGE_TEMP, CHANGE_FLOW, CHANGE_VOLUME, CHANGE_ALL
+from data.task_stats import register_task, get_task_stats, TASK_FIELDS
+from uart.binary_protocol import (
+    BinaryCodec, FRAME_FLOW, FRAME_DIAG, FRAME_TASK, FLOW_FORMAT, FLOW_SIZE, TASK_FORMAT, TASK_SIZE,
+)
+
+# JSON帧字节模板
+JSON_DEVICE = b'{"device": "device'
+JSON_SEQ = b'", "seq": '
+JSON_KEY = b', "key": 1'
+JSON_TEMP = b', "temp": '
+JSON_FLOW = b', "flow": '
+JSON_VOLUME = b', "volume": '
+JSON_END = b'}\n'
+# 流量数据流: {"flow": [各设备流速], "volume": [各设备累计流量]}
+JSON_FLOW_ONLY = b'{"flow": ['
+JSON_VOLUME_LIST = b'], "volume": ['
+JSON_LIST_SEP = b', '
+JSON_LIST_END = b']}\n'
+JSON_DIAG = b'{"diag": 1'
+JSON_TASK = b'{"task": "'
+# 紧跟设备ID时的温度键(完整帧没有序号)
+JSON_DEVICE_TEMP = b'", "temp": '
+# 标志位字段: (键模板, 标志位)
+JSON_FLAG_KEYS = tuple((b', "' + field.encode() + b'": ', flag) for field, flag in FLAG_FIELDS)
+
+# 数据流周期和加速时长的上限(毫秒)：时刻按 ticks_ms 计算，增量必须远小于半个周期(约6.2天)
+MAX_PERIOD_MS = 86400000
+
+
+# 运行统计字段(顺序即二进制应答中uint32的顺序)
+STATS_FIELDS = (
+    'rx_lines', 'rx_overflows', 'rx_wakeups', 'crc_errors', 'format_errors',
+    'tx_queued', 'tx_dropped', 'tx_flushed', 'tele_alloc', 'tele_alloc_max', 'mem_free', 'mem_alloc',
+)
+
+
+def collect_stats(uart_util):
+    """
+    采集运行统计
+
+    Returns:
+        tuple: 与 STATS_FIELDS 顺序对应的统计值
+    """
+    framer = uart_util.framer
+    codec = uart_util.rx_codec
+    return (
+        framer.lines, framer.overflows, uart_util.rx_wakeups, codec.crc_errors, codec.format_errors,
+        uart_util.tx_queued, uart_util.tx_dropped, uart_util.tx_flushed,
+        telemetry.last_alloc, telemetry.max_alloc, gc.mem_free(), gc.mem_alloc(),
+    )
+
+
+# 诊断统计字段的JSON键模板
+JSON_STATS_KEYS = tuple(b', "' + name.encode() + b'": ' for name in STATS_FIELDS)
+# 任务统计字段的JSON键模板(第一个键紧跟任务名)
+JSON_TASK_KEYS = (b'", "' + TASK_FIELDS[0].encode() + b'": ',) + tuple(
+    b', "' + name.encode() + b'": ' for name in TASK_FIELDS[1:])
+
+# 数据流名称
+STREAM_DEVICE = 'device'
+STREAM_FLOW = 'flow'
+STREAM_DIAG = 'diag'
+
+
+class TelemetryStream:
+    """遥测数据流 - 空闲周期和临时加速(burst)周期"""
+
+    def __init__(self, name, period_ms):
+        """
+        Args:
+            name (str): 数据流名称
+            period_ms (int): 空闲输出周期(毫秒)，0表示关闭
+        """
+        self.name = name
+        self.period_ms = period_ms
+        self.burst_period_ms = 0       # 加速周期，0表示未加速
+        self.burst_until = 0           # 加速结束时刻(ticks_ms)
+        self.next_due = time.ticks_ms()
+        self.last_sent = time.ticks_add(self.next_due, -period_ms)
+
+    def current_period(self, now):
+        """当前生效的输出周期，加速到期后自动回到空闲周期"""
+        if self.burst_period_ms:
+            if time.ticks_diff(self.burst_until, now) > 0:
+                return self.burst_period_ms
+            self.burst_period_ms = 0
+            self.next_due = time.ticks_add(self.last_sent, self.period_ms)
+        return self.period_ms
+
+    def set_rate(self, period_ms):
+        """调整空闲输出周期"""
+        self.period_ms = period_ms
+        self.next_due = time.ticks_ms()
+
+    def burst(self, period_ms, duration_ms):
+        """在 duration_ms 内以 period_ms 周期输出，然后回到空闲周期"""
+        now = time.ticks_ms()
+        self.burst_period_ms = period_ms
+        self.burst_until = time.ticks_add(now, duration_ms)
+        self.next_due = now
+
+
+class ByteWriter:
+    """预分配缓冲区写入器 - 模板字节串和整数直接写入缓冲区，不产生新对象"""
+
+    def __init__(self, size=192):
+        self.buf = bytearray(size)
+        self.mv = memoryview(self.buf)
+        self.pos = 0
+
+    def reset(self):
+        """从头开始写入新的一帧"""
+        self.pos = 0
+
+    def put(self, data):
+        """写入字节串"""
+        pos = self.pos
+        end = pos + len(data)
+        self.buf[pos:end] = data
+        self.pos = end
+
+    def put_int(self, value):
+        """写入十进制整数"""
+        buf = self.buf
+        pos = self.pos
+        if value < 0:
+            buf[pos] = 0x2D  # '-'
+            pos += 1
+            value = -value
+        start = pos
+        while True:
+            buf[pos] = 0x30 + value % 10
+            pos += 1
+            value //= 10
+            if not value:
+                break
+        # 数字是逆序写入的，就地翻转
+        end = pos - 1
+        while start < end:
+            buf[start], buf[end] = buf[end], buf[start]
+            start += 1
+            end -= 1
+        self.pos = pos
+
+    def put_centi(self, value):
+        """写入两位小数的定点数 (value单位为0.01)"""
+        if value < 0:
+            self.buf[self.pos] = 0x2D  # '-'
+            self.pos += 1
+            value = -value
+        self.put_int(value // 100)
+        buf = self.buf
+        pos = self.pos
+        frac = value % 100
+        buf[pos] = 0x2E  # '.'
+        buf[pos + 1] = 0x30 + frac // 10
+        buf[pos + 2] = 0x30 + frac % 10
+        self.pos = pos + 3
+
+    def view(self):
+        """已写入的内容(memoryview)"""
+        return self.mv[:self.pos]
+
+
+class Telemetry:
+    """遥测编码器 - 记录上次发送的状态以生成增量帧"""
+
+    def __init__(self, data_manager):
+        self.data_manager = data_manager
+        n = data_manager.device_count
+
+        # 上次发送给主机的状态
+        self.sent_temps = array('i', [0] * n)
+        self.sent_flags = bytearray(n)
+        self.sent_flows = array('i', [0] * n)
+        self.sent_volumes = array('I', [0] * n)
+
+        self.delta = config.TELEMETRY_DELTA                   # 是否增量模式
+        self.keyframe_ms = config.TELEMETRY_KEYFRAME_MS       # 关键帧周期(毫秒)
+        self.keyframe_pending = bytearray(b'\x01' * n)         # 各设备下一次发送关键帧
+        self.seq = 0                                          # 帧序号 (0-65535循环)
+        self.codec = BinaryCodec()
+        # 诊断帧最长约320字节(12个统计值)
+        self.writer = ByteWriter(352)
+
+        # 每个输出周期的堆分配量(gc.mem_alloc差值，字节)
+        self.last_alloc = 0
+        self.max_alloc = 0
+
+        # 数据变化时唤醒输出任务
+        self.sub = data_manager.subscribe()
+
+        # 各数据流的输出周期
+        rates = config.TELEMETRY_RATES
+        self.streams = (
+            TelemetryStream(STREAM_DEVICE, rates.get(STREAM_DEVICE, 1000)),
+            TelemetryStream(STREAM_FLOW, rates.get(STREAM_FLOW, 0)),
+            TelemetryStream(STREAM_DIAG, rates.get(STREAM_DIAG, 0)),
+        )
+        # 设备数据变化时立即输出的最小间隔(毫秒)
+        self.min_gap_ms = config.TELEMETRY_MIN_GAP_MS
+        # 下一个要发送的任务统计编号(发送队列满时下一周期从这里继续)
+        self.task_cursor = 0
+
+    def get_stream(self, name):
+        """按名称查找数据流，未知名称返回None"""
+        for stream in self.streams:
+            if stream.name == name:
+                return stream
+        return None
+
+    def set_rate(self, name, period_ms):
+        """调整数据流的空闲输出周期，并唤醒输出任务"""
+        stream = self.get_stream(name)
+        if stream is None:
+            return False
+        stream.set_rate(period_ms)
+        self.sub.notify()
+        return True
+
+    def burst(self, name, period_ms, duration_ms):
+        """数据流临时加速输出，并唤醒输出任务"""
+        stream = self.get_stream(name)
+        if stream is None:
+            return False
+        stream.burst(period_ms, duration_ms)
+        self.sub.notify()
+        return True
+
+    def request_keyframe(self):
+        """请求下一次发送关键帧(主机检测到丢帧时发送)，并立即唤醒输出任务"""
+        for index in range(len(self.keyframe_pending)):
+            self.keyframe_pending[index] = 1
+        self.sub.notify()
+
+    def changed_mask(self, index):
+        """
+        计算设备相对上次发送的变化掩码
+
+        Returns:
+            int: 变化掩码 (FLAG_* / CHANGE_TEMP / CHANGE_FLOW / CHANGE_VOLUME)
+        """
+        dm = self.data_manager
+        mask = self.sent_flags[index] ^ dm.flags[index]
+        if self.sent_temps[index] != dm.temps[index]:
+            mask |= CHANGE_TEMP
+        if self.sent_flows[index] != dm.flows[index]:
+            mask |= CHANGE_FLOW
+        if self.sent_volumes[index] != dm.volumes[index]:
+            mask |= CHANGE_VOLUME
+        return mask
+
+    def mark_sent(self, index):
+        """记录设备当前状态已发送"""
+        dm = self.data_manager
+        self.sent_temps[index] = dm.temps[index]
+        self.sent_flags[index] = dm.flags[index]
+        self.sent_flows[index] = dm.flows[index]
+        self.sent_volumes[index] = dm.volumes[index]
+
+    def next_seq(self):
+        """分配下一个帧序号"""
+        seq = self.seq
+        self.seq = (seq + 1) & 0xFFFF
+        return seq
+
+    def send_full(self, uart_util):
+        """完整模式：发送所有设备的完整状态"""
+        dm = self.data_manager
+        binary = uart_util.protocol == 'binary'
+        for index in range(dm.device_count):
+            # 队列满时丢弃：下一周期会发送更新的完整状态
+            if binary:
+                uart_util.send(self.codec.encode_state(index, dm.temps[index], dm.flags[index], dm.flows[index],
+                                                       dm.volumes[index]), True)
+            else:
+                uart_util.send(self.encode_json(-1, index, CHANGE_ALL), True)
+
+    def send_delta(self, uart_util):
+        """
+        增量模式：只发送变化的字段，有关键帧请求的设备发送全部字段
+
+        Args:
+            uart_util: UART工具实例
+        """
+        dm = self.data_manager
+        binary = uart_util.protocol == 'binary'
+        for index in range(dm.device_count):
+            keyframe = self.keyframe_pending[index]
+            mask = CHANGE_ALL if keyframe else self.changed_mask(index)
+            if not mask:
+                continue
+            seq = self.next_seq()
+            if binary:
+                frame = self.codec.encode_delta(seq, index, mask, dm.temps[index], dm.flags[index], dm.flows[index],
+                                                dm.volumes[index])
+            else:
+                frame = self.encode_json(seq, index, mask, keyframe)
+            if uart_util.send(frame, True):
+                self.mark_sent(index)
+                self.keyframe_pending[index] = 0
+            else:
+                # 队列满：收回序号，未发送的变化(或关键帧)并入下一帧
+                self.seq = seq
+
+    def send_flow(self, uart_util):
+        """发送流量数据流：所有设备的流速和累计流量一帧"""
+        dm = self.data_manager
+        n = dm.device_count
+        if uart_util.protocol == 'binary':
+            codec = self.codec
+            codec.begin(FRAME_FLOW)
+            for index in range(n):
+                codec.pack(FLOW_FORMAT, FLOW_SIZE, dm.flows[index], dm.volumes[index])
+            uart_util.send(codec.end(), True)
+        else:
+            w = self.writer
+            w.reset()
+            w.put(JSON_FLOW_ONLY)
+            for index in range(n):
+                if index:
+                    w.put(JSON_LIST_SEP)
+                w.put_centi(dm.flows[index])
+            w.put(JSON_VOLUME_LIST)
+            for index in range(n):
+                if index:
+                    w.put(JSON_LIST_SEP)
+                w.put_centi(dm.volumes[index])
+            w.put(JSON_LIST_END)
+            uart_util.send(w.view(), True)
+
+    def send_diag(self, uart_util):
+        """发送诊断数据流"""
+        values = collect_stats(uart_util)
+        if uart_util.protocol == 'binary':
+            codec = self.codec
+            codec.begin(FRAME_DIAG)
+            for value in values:
+                codec.pack('<I', 4, value & 0xFFFFFFFF)
+            uart_util.send(codec.end(), True)
+        else:
+            w = self.writer
+            w.reset()
+            w.put(JSON_DIAG)
+            for i in range(len(values)):
+                w.put(JSON_STATS_KEYS[i])
+                w.put_int(values[i])
+            w.put(JSON_END)
+            uart_util.send(w.view(), True)
+        self.send_tasks(uart_util)
+
+    def send_tasks(self, uart_util):
+        """发送各任务的运行统计，每个任务一帧；发送队列满时停止，下一周期从该任务继续"""
+        tasks = get_task_stats()
+        binary = uart_util.protocol == 'binary'
+        index = self.task_cursor if self.task_cursor < len(tasks) else 0
+        while index < len(tasks):
+            stats = tasks[index]
+            values = stats.snapshot()
+            if binary:
+                codec = self.codec
+                codec.begin(FRAME_TASK)
+                codec.pack('<B', 1, index)
+                codec.pack(TASK_FORMAT, TASK_SIZE, *values)
+                codec.put(stats.name_bytes)
+                frame = codec.end()
+            else:
+                frame = self.encode_task_json(stats, values)
+            if not uart_util.send(frame, True):
+                break
+            index += 1
+        self.task_cursor = index if index < len(tasks) else 0
+
+    def encode_task_json(self, stats, values):
+        """
+        编码一行任务统计JSON帧
+
+        Args:
+            stats (TaskStats): 任务统计
+            values (tuple): 与 TASK_FIELDS 顺序对应的统计值
+
+        Returns:
+            memoryview: 帧内容(含换行)，下一次编码前有效
+        """
+        w = self.writer
+        w.reset()
+        w.put(JSON_TASK)
+        w.put(stats.name_bytes)
+        for i in range(len(values)):
+            w.put(JSON_TASK_KEYS[i])
+            w.put_int(values[i])
+        w.put(JSON_END)
+        return w.view()
+
+    def send_devices(self, uart_util):
+        """发送设备状态数据流(完整或增量)"""
+        if self.delta:
+            self.send_delta(uart_util)
+        else:
+            self.send_full(uart_util)
+
+    def encode_json(self, seq, index, mask, keyframe=False):
+        """
+        编码一行JSON帧，只包含掩码中的字段
+
+        Args:
+            seq (int): 帧序号，-1表示完整模式(不带序号)
+            index (int): 设备索引
+            mask (int): 字段掩码 (FLAG_* / CHANGE_TEMP / CHANGE_FLOW / CHANGE_VOLUME)
+            keyframe (bool): 是否标记为关键帧
+
+        Returns:
+            memoryview: 帧内容(含换行)，下一次编码前有效
+        """
+        dm = self.data_manager
+        w = self.writer
+        w.reset()
+        w.put(JSON_DEVICE)
+        w.put_int(index + 1)
+        if seq < 0:
+            w.put(JSON_DEVICE_TEMP)
+            w.put_centi(dm.temps[index])
+        else:
+            w.put(JSON_SEQ)
+            w.put_int(seq)
+            if keyframe:
+                w.put(JSON_KEY)
+            if mask & CHANGE_TEMP:
+                w.put(JSON_TEMP)
+                w.put_centi(dm.temps[index])
+        flags = dm.flags[index]
+        for key, flag in JSON_FLAG_KEYS:
+            if mask & flag:
+                w.put(key)
+                w.put_int(1 if flags & flag else 0)
+        if mask & CHANGE_FLOW:
+            w.put(JSON_FLOW)
+            w.put_centi(dm.flows[index])
+        if mask & CHANGE_VOLUME:
+            w.put(JSON_VOLUME)
+            w.put_centi(dm.volumes[index])
+        w.put(JSON_END)
+        return w.view()
+
+
+# 全局遥测实例
+telemetry = Telemetry(get_data_manager())
+
+
+def get_telemetry():
+    """获取全局遥测实例"""
+    return telemetry
+
+
+async def serial_output_task(uart_util):
+    """
+    串口输出任务 - 按各数据流的周期输出
+    设备数据变化时立即输出设备状态(最小间隔 min_gap_ms)；增量模式下无变化时不输出
+    """
+    print("🚀 串口输出任务开始运行...")
+
+    stats = register_task('serial_out')
+    sub = telemetry.sub
+    device_stream, flow_stream, diag_stream = telemetry.streams
+    last_keyframe = time.ticks_ms()
+    changed = True
+
+    while True:
+        try:
+            alloc_before = gc.mem_alloc()
+            now = time.ticks_ms()
+
+            # 定期发送关键帧
+            if telemetry.delta and time.ticks_diff(now, last_keyframe) >= telemetry.keyframe_ms:
+                telemetry.request_keyframe()
+                last_keyframe = now
+                changed = True
+
+            # 设备数据变化：提前到最小间隔之后输出
+            if changed and device_stream.current_period(now):
+                soon = time.ticks_add(device_stream.last_sent, telemetry.min_gap_ms)
+                if time.ticks_diff(soon, device_stream.next_due) < 0:
+                    device_stream.next_due = soon
+
+            timeout_ms = None
+            for stream in telemetry.streams:
+                period = stream.current_period(now)
+                if not period:
+                    continue
+                if time.ticks_diff(now, stream.next_due) >= 0:
+                    if stream is device_stream:
+                        telemetry.send_devices(uart_util)
+                    elif stream is flow_stream:
+                        telemetry.send_flow(uart_util)
+                    else:
+                        telemetry.send_diag(uart_util)
+                    stream.last_sent = now
+                    stream.next_due = time.ticks_add(now, period)
+                remaining = time.ticks_diff(stream.next_due, now)
+                if timeout_ms is None or remaining < timeout_ms:
+                    timeout_ms = remaining
+
+            # 统计本周期的堆分配量(期间发生过垃圾回收时差值为负，忽略)
+            alloc = gc.mem_alloc() - alloc_before
+            if alloc >= 0:
+                telemetry.last_alloc = alloc
+                if alloc > telemetry.max_alloc:
+                    telemetry.max_alloc = alloc
+
+            # 等待下一个到期的数据流或数据变化
+            changed = await stats.wait(sub, timeout_ms)
+
+        except Exception as e:
+            print(f"❌ 串口输出任务错误: {e}")
+            await stats.sleep_ms(1000)
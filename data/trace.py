@@ -0,0 +1,216 @@
+"""
+运行轨迹记录
+把带时间戳的输入(串口接收数据、DS18B20读数、流量脉冲数、水位引脚电平)和
+输出(继电器/LED引脚变化、串口发送数据)写入紧凑的二进制轨迹文件，
+供主机上的 sim/replay.py 在虚拟时钟下重放并比对输出
+
+文件格式: 文件头 TRACE_MAGIC，之后是连续的记录
+记录格式: RECORD_FORMAT 头(时间毫秒, 类型, 通道, 负载长度) + 负载
+"""
+
+import struct
+import time
+from micropython import const
+from machine import Pin
+
+TRACE_MAGIC = b'BRWT\x01'
+
+# 记录头: 自记录开始的毫秒数, 记录类型, 通道, 负载长度
+RECORD_FORMAT = '<IBBH'
+RECORD_SIZE = const(8)
+
+# 记录类型          通道          负载
+TRACE_UART_RX = const(1)   # 0            收到的原始字节
+TRACE_TEMP = const(2)      # 设备索引     温度 int16 (0.01°C)
+TRACE_PULSES = const(3)    # 流量计编号   一个测量周期内的脉冲数 uint16
+TRACE_GPIO = const(4)      # 设备索引     水位引脚电平 uint8 (只在变化时记录)
+TRACE_OUTPUT = const(5)    # 引脚编号     输出电平 uint8 (只在变化时记录)
+TRACE_UART_TX = const(6)   # 0            发送的原始字节
+
+# 输入/输出记录类型
+TRACE_INPUTS = (TRACE_UART_RX, TRACE_TEMP, TRACE_PULSES, TRACE_GPIO)
+TRACE_OUTPUTS = (TRACE_OUTPUT, TRACE_UART_TX)
+
+
+class TraceRecorder:
+    """轨迹记录器 - 记录先写入内存缓冲区，缓冲区满或超过刷新间隔时写入文件"""
+
+    def __init__(self, buffer_size=1024, flush_ms=2000):
+        """
+        Args:
+            buffer_size (int): 内存缓冲区大小(字节)
+            flush_ms (int): 最长刷新间隔(毫秒)，掉电时最多丢失这段时间的记录
+        """
+        self.buf = bytearray(buffer_size)
+        self.mv = memoryview(self.buf)
+        self.length = 0
+        self.flush_ms = flush_ms
+        self.stream = None
+        self.active = False        # 是否正在记录(各任务据此跳过记录调用)
+        self.record_tx = False     # 是否记录串口发送数据(数据量大，默认关闭)
+        self.elapsed_ms = 0        # 自记录开始的毫秒数
+        self.last_ticks = 0
+        self.last_flush = 0
+        self.gpio_levels = {}      # 设备索引 -> 上次记录的水位电平
+        self.output_levels = {}    # 引脚编号 -> 上次记录的输出电平
+        self.records = 0
+        self.dropped = 0           # 超过缓冲区大小被丢弃的记录数
+
+    def start(self, stream, record_tx=False):
+        """
+        开始记录
+
+        Args:
+            stream: 可写入的流(文件等)
+            record_tx (bool): 是否记录串口发送数据
+        """
+        self.stream = stream
+        self.record_tx = record_tx
+        self.length = 0
+        self.elapsed_ms = 0
+        self.last_ticks = time.ticks_ms()
+        self.last_flush = self.last_ticks
+        self.gpio_levels = {}
+        self.output_levels = {}
+        stream.write(TRACE_MAGIC)
+        self.active = True
+
+    def stop(self):
+        """停止记录并写出缓冲区"""
+        if self.active:
+            self.flush()
+            self.active = False
+            self.stream = None
+
+    def now_ms(self):
+        """自记录开始的毫秒数(累加ticks差值，ticks回绕不影响)"""
+        ticks = time.ticks_ms()
+        self.elapsed_ms += time.ticks_diff(ticks, self.last_ticks)
+        self.last_ticks = ticks
+        return self.elapsed_ms
+
+    def record(self, kind, channel, payload):
+        """追加一条记录"""
+        size = RECORD_SIZE + len(payload)
+        if size > len(self.buf):
+            self.dropped += 1
+            return
+        if self.length + size > len(self.buf):
+            self.flush()
+        pos = self.length
+        struct.pack_into(RECORD_FORMAT, self.buf, pos, self.now_ms() & 0xFFFFFFFF, kind, channel, len(payload))
+        self.buf[pos + RECORD_SIZE:pos + size] = payload
+        self.length = pos + size
+        self.records += 1
+        if time.ticks_diff(self.last_ticks, self.last_flush) >= self.flush_ms:
+            self.flush()
+
+    def flush(self):
+        """把缓冲区写入流"""
+        if self.length:
+            self.stream.write(self.mv[:self.length])
+            self.length = 0
+        if hasattr(self.stream, 'flush'):
+            self.stream.flush()
+        self.last_flush = self.last_ticks
+
+    def uart_rx(self, data):
+        self.record(TRACE_UART_RX, 0, data)
+
+    def uart_tx(self, data):
+        if self.record_tx:
+            self.record(TRACE_UART_TX, 0, data)
+
+    def temp(self, index, temp):
+        self.record(TRACE_TEMP, index, struct.pack('<h', int(round(temp * 100))))
+
+    def pulses(self, count, channel=0):
+        if count:
+            self.record(TRACE_PULSES, channel, struct.pack('<H', min(count, 0xFFFF)))
+
+    def gpio(self, index, level):
+        level = 1 if level else 0
+        if self.gpio_levels.get(index) != level:
+            self.gpio_levels[index] = level
+            self.record(TRACE_GPIO, index, bytes((level,)))
+
+    def output(self, pin_id, level):
+        level = 1 if level else 0
+        if self.output_levels.get(pin_id) != level:
+            self.output_levels[pin_id] = level
+            self.record(TRACE_OUTPUT, pin_id, bytes((level,)))
+
+
+class RecordedPin:
+    """输出引脚包装 - 电平变化时写入轨迹"""
+
+    def __init__(self, pin, pin_id, recorder):
+        self.pin = pin
+        self.pin_id = pin_id
+        self.recorder = recorder
+
+    def value(self, value=None):
+        if value is None:
+            return self.pin.value()
+        self.pin.value(value)
+        if self.recorder.active:
+            self.recorder.output(self.pin_id, value)
+
+    __call__ = value
+
+    def on(self):
+        self.value(1)
+
+    def off(self):
+        self.value(0)
+
+
+def output_pin(pin_id):
+    """
+    创建输出引脚；记录轨迹时返回记录电平变化的包装对象
+
+    Args:
+        pin_id (int): 引脚编号
+
+    Returns:
+        Pin|RecordedPin: 输出引脚
+    """
+    pin = Pin(pin_id, Pin.OUT)
+    if recorder.active:
+        return RecordedPin(pin, pin_id, recorder)
+    return pin
+
+
+def read_trace(data):
+    """
+    解析轨迹数据
+
+    Args:
+        data (bytes): 轨迹文件内容
+
+    Returns:
+        list: (时间毫秒, 类型, 通道, 负载memoryview) 元组列表
+    """
+    if bytes(data[:len(TRACE_MAGIC)]) != TRACE_MAGIC:
+        raise ValueError('not a trace file')
+    mv = memoryview(data)
+    pos = len(TRACE_MAGIC)
+    records = []
+    while pos + RECORD_SIZE <= len(data):
+        t_ms, kind, channel, length = struct.unpack_from(RECORD_FORMAT, data, pos)
+        pos += RECORD_SIZE
+        if pos + length > len(data):
+            # 掉电时写了一半的记录
+            break
+        records.append((t_ms, kind, channel, mv[pos:pos + length]))
+        pos += length
+    return records
+
+
+# 全局轨迹记录器(默认不记录)
+recorder = TraceRecorder()
+
+
+def get_recorder():
+    """获取全局轨迹记录器"""
+    return recorder
@@ -23,12 +23,23 @@ SET_CHARGE_PUMP = const(0x8D)
 # Subclassing FrameBuffer provides support for graphics primitives
 # http://docs.micropython.org/en/latest/pyboard/library/framebuf.html
 class SSD1306(framebuf.FrameBuffer):
-    def __init__(self, width, height, external_vcc):
+    # bytes a window update puts on the bus besides the pixel data
+    # (six window-setup commands); transports override this
+    WINDOW_OVERHEAD = 6
+
+    def __init__(self, width, height, external_vcc, dirty_tracking=False):
         self.width = width
         self.height = height
         self.external_vcc = external_vcc
         self.pages = self.height // 8
         self.buffer = bytearray(self.pages * self.width)
+        # dirty tracking: shadow copy of the last frame sent to the panel
+        self.dirty_tracking = dirty_tracking
+        self.shadow = bytearray(len(self.buffer)) if dirty_tracking else None
+        self.shadow_valid = False
+        # bytes put on the bus by the last show() (commands + pixel data)
+        self.last_show_bytes = 0
+        self.total_show_bytes = 0
         super().__init__(self.buffer, self.width, self.height, framebuf.MONO_VLSB)
         self.init_display()
 
@@ -66,6 +77,7 @@ class SSD1306(framebuf.FrameBuffer):
             SET_DISP | 0x01,
         ):  # on
             self.write_cmd(cmd)
+        self.shadow_valid = False
         self.fill(0)
         self.show()
 
@@ -82,29 +94,73 @@ class SSD1306(framebuf.FrameBuffer):
     def invert(self, invert):
         self.write_cmd(SET_NORM_INV | (invert & 1))
 
+    def invalidate(self):
+        # force the next show() to push the whole frame
+        self.shadow_valid = False
+
     def show(self):
+        if self.dirty_tracking and self.shadow_valid:
+            self.show_dirty()
+            return
         x0 = 0
         x1 = self.width - 1
         if self.width == 64:
             # displays with width of 64 pixels are shifted by 32
             x0 += 32
             x1 += 32
+        self.write_window(x0, x1, 0, self.pages - 1)
+        self.write_data(self.buffer)
+        self.last_show_bytes = self.WINDOW_OVERHEAD + len(self.buffer)
+        self.total_show_bytes += self.last_show_bytes
+        if self.dirty_tracking:
+            self.shadow[:] = self.buffer
+            self.shadow_valid = True
+
+    def show_dirty(self):
+        # send only the changed column span of each changed page
+        buf = self.buffer
+        shadow = self.shadow
+        width = self.width
+        offset = 32 if width == 64 else 0
+        mv = memoryview(buf)
+        sent = 0
+        for page in range(self.pages):
+            start = page * width
+            end = start + width - 1
+            while start <= end and buf[start] == shadow[start]:
+                start += 1
+            if start > end:
+                continue
+            while buf[end] == shadow[end]:
+                end -= 1
+            col = start - page * width
+            self.write_window(col + offset, end - page * width + offset, page, page)
+            self.write_data(mv[start : end + 1])
+            shadow[start : end + 1] = mv[start : end + 1]
+            sent += self.WINDOW_OVERHEAD + end + 1 - start
+        self.last_show_bytes = sent
+        self.total_show_bytes += sent
+
+    def write_window(self, x0, x1, page0, page1):
         self.write_cmd(SET_COL_ADDR)
         self.write_cmd(x0)
         self.write_cmd(x1)
         self.write_cmd(SET_PAGE_ADDR)
-        self.write_cmd(0)
-        self.write_cmd(self.pages - 1)
-        self.write_data(self.buffer)
+        self.write_cmd(page0)
+        self.write_cmd(page1)
 
 
 class SSD1306_I2C(SSD1306):
-    def __init__(self, width, height, i2c, addr=0x3C, external_vcc=False):
+    # each command is a 2-byte transfer (control byte + command) and the
+    # data write is prefixed with a 0x40 control byte; address bytes not counted
+    WINDOW_OVERHEAD = 6 * 2 + 1
+
+    def __init__(self, width, height, i2c, addr=0x3C, external_vcc=False, dirty_tracking=False):
         self.i2c = i2c
         self.addr = addr
         self.temp = bytearray(2)
         self.write_list = [b"\x40", None]  # Co=0, D/C#=1
-        super().__init__(width, height, external_vcc)
+        super().__init__(width, height, external_vcc, dirty_tracking)
 
     def write_cmd(self, cmd):
         self.temp[0] = 0x80  # Co=1, D/C#=0
@@ -117,7 +173,7 @@ class SSD1306_I2C(SSD1306):
 
 # only required for SPI version (not covered in this project)
 class SSD1306_SPI(SSD1306):
-    def __init__(self, width, height, spi, dc, res, cs, external_vcc=False):
+    def __init__(self, width, height, spi, dc, res, cs, external_vcc=False, dirty_tracking=False):
         self.rate = 10 * 1024 * 1024
         dc.init(dc.OUT, value=0)
         res.init(res.OUT, value=0)
@@ -133,7 +189,7 @@ class SSD1306_SPI(SSD1306):
         self.res(0)
         time.sleep_ms(10)
         self.res(1)
-        super().__init__(width, height, external_vcc)
+        super().__init__(width, height, external_vcc, dirty_tracking)
 
     def write_cmd(self, cmd):
         self.spi.init(baudrate=self.rate, polarity=0, phase=0)
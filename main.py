@@ -1,41 +1,55 @@
 import uasyncio as asyncio
 from uart.uart_utils import UARTUtil
 
-from task.dx180x20 import dx_task_1, dx_task_2
+import config
+from task.dx180x20 import dx_task
 from task.gpio_reader import gpio_reader_task
 # from task.jqc import jqc_task
 from task.led import led_task
-from task.display import display_task_1, display_task_2, async_display_task_1, async_display_task_2
+from task.display import display_task, async_display_task
 from task.pulse_counter import pulse_counter_task
 from task.uart_handler import uart_receive_task
-from data.singleton_data import serial_output_task
+from data.telemetry import serial_output_task
+from data.trace import get_recorder
+from task.supervisor import get_supervisor
 
 
 async def main():
     """主函数，同时运行所有任务"""
     print("🚀 啤酒酿造系统启动中...")
     
+    # 📼 运行轨迹记录(在创建任务之前开始，输出引脚才会被记录)
+    if config.TRACE_FILE:
+        get_recorder().start(open(config.TRACE_FILE, 'wb'), config.TRACE_TX)
+        print("📼 轨迹记录到: {}".format(config.TRACE_FILE))
+    
     # 初始化UART
     uart_util = UARTUtil(
         uart_id=0,
         baudrate=115200,
         tx_pin=12,
-        rx_pin=13
+        rx_pin=13,
+        protocol=config.UART_PROTOCOL,
+        tx_queue_size=config.UART_TX_QUEUE,
+        rx_max_line=config.UART_RX_MAX_LINE
     )
+    # 任务监控：登记的任务异常退出时自动重启，关键任务按时运行才喂看门狗
+    supervisor = get_supervisor()
+    
+    # 📤 串口发送任务(非阻塞发送队列)
+    supervisor.add('uart_tx', uart_util.tx_writer_task)
     print("✅ UART初始化完成")
     
     # # 创建并启动所有任务
-    # # 🖥️ 设备1显示任务
-    # asyncio.create_task(async_display_task_1())
-    #
-    # # 🖥️ 设备2显示任务
-    # asyncio.create_task(async_display_task_2())
+    # # 🖥️ 各设备显示任务(屏幕多于设备时多出的屏幕不使用)
+    # for index in range(min(len(config.DISPLAYS), config.DEVICE_COUNT)):
+    #     supervisor.add('display{}'.format(index + 1), async_display_task, (index,))
     #
     # # 📤 串口数据输出任务
-    # asyncio.create_task(serial_output_task(uart_util))
+    # supervisor.add('serial_out', serial_output_task, (uart_util,))
     #
     # # 📥 UART数据接收任务
-    # asyncio.create_task(uart_receive_task(uart_util))
+    # supervisor.add('uart_rx', uart_receive_task, (uart_util,))
     #
     # # 💧 脉冲计数任务
     # asyncio.create_task(pulse_counter_task())
@@ -43,15 +57,13 @@ async def main():
     # 🔌 其他可选任务（可根据需要启用）
     asyncio.create_task(led_task())
     # asyncio.create_task(jqc_task())
-    # asyncio.create_task(dx_task_1())
-    # asyncio.create_task(dx_task_2())
+    # asyncio.create_task(dx_task())
     # asyncio.create_task(gpio_reader_task())
     
     print("✅ 所有任务已启动")
     
-    # 防止主程序退出
-    while True:
-        await asyncio.sleep(1)
+    # 监控任务并喂看门狗(不返回)
+    await supervisor.run()
 
 
 # 运行主函数
@@ -0,0 +1,136 @@
+"""
+主机仿真环境
+在Linux(CPython)上运行固件：用 sim/modules 中的替身模块代替 machine、framebuf、onewire、
+ds18x20、micropython、uasyncio，并给 time / gc 补上MicroPython特有的函数
+
+用法:
+    import sim
+    sim.install()          # 必须在导入固件模块之前调用
+    import main            # 或 python -m sim.run
+"""
+
+import gc
+import os
+import sys
+import time
+import tracemalloc
+
+# 替身模块目录
+MODULES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'modules')
+
+# 固件根目录(main.py所在目录)
+FIRMWARE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# MicroPython的ticks计数周期(ticks_ms/ticks_us在此回绕)
+TICKS_PERIOD = 1 << 30
+TICKS_MAX = TICKS_PERIOD - 1
+TICKS_HALFPERIOD = TICKS_PERIOD // 2
+
+# 模拟的堆大小(字节)，RP2040上MicroPython可用堆约为190KB
+HEAP_SIZE = 192 * 1024
+
+# 时钟函数(返回秒)和阻塞等待函数，可替换为虚拟时钟
+_clock = time.monotonic
+_busy = time.sleep
+_installed = False
+
+
+def set_clock(clock, busy):
+    """
+    替换时钟函数
+
+    Args:
+        clock: 无参数函数，返回单调递增的秒数
+        busy: 阻塞等待函数，参数为秒数(模拟I2C传输、time.sleep_ms等占用CPU的等待)
+    """
+    global _clock, _busy
+    _clock = clock
+    _busy = busy
+
+
+def now():
+    """当前时钟(秒)"""
+    return _clock()
+
+
+def busy(seconds):
+    """阻塞等待(占用CPU，期间其他协程不能运行)"""
+    _busy(seconds)
+
+
+def ticks_ms():
+    return int(_clock() * 1000) & TICKS_MAX
+
+
+def ticks_us():
+    return int(_clock() * 1000000) & TICKS_MAX
+
+
+def ticks_add(ticks, delta):
+    # 与MicroPython一致：增量超出 [-TICKS_PERIOD/2, TICKS_PERIOD/2) 时抛出异常
+    if not -TICKS_HALFPERIOD <= delta < TICKS_HALFPERIOD:
+        raise OverflowError('ticks interval overflow')
+    return (ticks + delta) & TICKS_MAX
+
+
+def ticks_diff(end, start):
+    # 与MicroPython一致：结果在 [-TICKS_PERIOD/2, TICKS_PERIOD/2) 范围内
+    return ((end - start + TICKS_HALFPERIOD) & TICKS_MAX) - TICKS_HALFPERIOD
+
+
+def sleep_ms(ms):
+    _busy(ms / 1000)
+
+
+def sleep_us(us):
+    _busy(us / 1000000)
+
+
+def mem_alloc():
+    """当前Python堆分配量(字节)，由tracemalloc统计"""
+    return tracemalloc.get_traced_memory()[0]
+
+
+def mem_free():
+    return max(0, HEAP_SIZE - mem_alloc())
+
+
+def alloc_begin():
+    """
+    开始统计堆分配量；CPython的引用计数会立即回收临时对象，
+    因此用 tracemalloc 峰值近似MicroPython上关闭gc时 mem_alloc 的增量
+    """
+    tracemalloc.reset_peak()
+    return tracemalloc.get_traced_memory()[0]
+
+
+def alloc_end(begin):
+    """alloc_begin() 之后的堆分配峰值增量(字节)"""
+    return max(0, tracemalloc.get_traced_memory()[1] - begin)
+
+
+def install():
+    """安装替身模块和 time / gc 扩展，可重复调用"""
+    global _installed
+    if _installed:
+        return
+    _installed = True
+
+    for path in (FIRMWARE_DIR, MODULES_DIR):
+        if path in sys.path:
+            sys.path.remove(path)
+    sys.path.insert(0, FIRMWARE_DIR)
+    sys.path.insert(0, MODULES_DIR)
+
+    time.ticks_ms = ticks_ms
+    time.ticks_us = ticks_us
+    time.ticks_cpu = ticks_us
+    time.ticks_add = ticks_add
+    time.ticks_diff = ticks_diff
+    time.sleep_ms = sleep_ms
+    time.sleep_us = sleep_us
+
+    if not tracemalloc.is_tracing():
+        tracemalloc.start()
+    gc.mem_alloc = mem_alloc
+    gc.mem_free = mem_free
@@ -0,0 +1,71 @@
+"""
+虚拟时钟
+事件循环没有就绪任务时直接把时钟拨到下一个定时器，不真正等待；
+固件看到的 time.ticks_*、asyncio 定时器和阻塞等待(I2C传输等)都使用同一个虚拟时钟，
+因此长时间运行可以在几秒内完成
+"""
+
+import asyncio
+
+import sim
+
+
+class VirtualClock:
+    """虚拟时钟(秒)"""
+
+    def __init__(self, start=0.0):
+        self.t = start
+
+    def now(self):
+        return self.t
+
+    def advance(self, seconds):
+        """阻塞等待：时钟前进，不占用真实时间"""
+        if seconds > 0:
+            self.t += seconds
+
+
+class _VirtualSelector:
+    """选择器包装 - 等待超时时拨动虚拟时钟，只轮询真实的I/O事件"""
+
+    def __init__(self, selector, clock):
+        self._selector = selector
+        self._clock = clock
+
+    def select(self, timeout=None):
+        events = self._selector.select(0)
+        if events:
+            return events
+        if timeout is None:
+            raise RuntimeError('虚拟时钟下所有任务都在无限期等待(死锁)')
+        self._clock.advance(timeout)
+        return []
+
+    def __getattr__(self, name):
+        return getattr(self._selector, name)
+
+
+class VirtualEventLoop(asyncio.SelectorEventLoop):
+    """使用虚拟时钟的事件循环"""
+
+    def __init__(self, clock):
+        super().__init__()
+        self._virtual_clock = clock
+        self._selector = _VirtualSelector(self._selector, clock)
+        # 定时器只能精确到毫秒以下，避免浮点误差造成的空转
+        self._clock_resolution = 1e-6
+
+    def time(self):
+        return self._virtual_clock.t
+
+
+def install_virtual_clock(start=0.0):
+    """
+    让 sim 的时间函数使用虚拟时钟
+
+    Returns:
+        VirtualClock: 虚拟时钟，用它创建 VirtualEventLoop
+    """
+    clock = VirtualClock(start)
+    sim.set_clock(clock.now, clock.advance)
+    return clock
@@ -0,0 +1,138 @@
+"""
+ds18x20 替身模块
+仿真脚本用 add_sensor() 在引脚上挂接传感器，用 set_temp() 设置温度；
+温度转换完成前读取返回上一次转换的结果(上电后为85°C，与真实传感器一致)，
+转换时间按配置寄存器的分辨率(9-12位)计算；
+给 Sensor.readings 赋值后，各次转换按顺序返回其中的读数(用于轨迹重放)；
+Sensor.corrupt 为接下来CRC错误的读取次数，Sensor.power_on_reset() 模拟掉电后暂存器恢复为85°C
+"""
+
+import sim
+import onewire
+
+# 12位分辨率的转换时间(秒)，每少一位减半
+CONVERSION_TIME = 0.75
+
+
+class Sensor:
+    """仿真的DS18B20传感器"""
+
+    def __init__(self, rom, temp):
+        self.rom = bytes(rom)
+        self.temp = temp              # 当前实际温度
+        self.latched = 85.0           # 暂存器中的温度(上次转换结果)
+        self.th = 0x4B
+        self.tl = 0x46
+        self.config = 0x7F            # 配置寄存器(上电默认12位)
+        self.readings = []            # 按顺序返回的脚本读数，用完后返回 temp
+        self.converting_since = None  # 转换开始时间
+        self.conversions = 0
+        self.reads = 0
+        self.corrupt = 0              # 接下来CRC错误的读取次数
+
+    def power_on_reset(self):
+        """掉电复位：暂存器温度恢复为85°C，配置恢复为12位"""
+        self.latched = 85.0
+        self.config = 0x7F
+        self.converting_since = None
+
+    def resolution(self):
+        return 9 + ((self.config >> 5) & 0x03)
+
+    def conversion_time(self):
+        return CONVERSION_TIME / (1 << (12 - self.resolution()))
+
+    def start_conversion(self):
+        self.converting_since = sim.now()
+        self.conversions += 1
+
+    def read(self):
+        self.reads += 1
+        if self.converting_since is not None and sim.now() - self.converting_since >= self.conversion_time():
+            if self.conversions <= len(self.readings):
+                self.latched = self.readings[self.conversions - 1]
+            else:
+                self.latched = self.temp
+            self.converting_since = None
+        return self.latched
+
+    def scratchpad(self):
+        """9字节暂存器(温度按分辨率截去低位)，末字节为CRC8"""
+        raw = int(round(self.read() * 16)) & ~((1 << (12 - self.resolution())) - 1)
+        buf = bytearray(9)
+        buf[0] = raw & 0xFF
+        buf[1] = (raw >> 8) & 0xFF
+        buf[2] = self.th
+        buf[3] = self.tl
+        buf[4] = self.config
+        buf[5] = 0xFF
+        buf[7] = 0x10
+        buf[8] = onewire.crc8(buf[:8])
+        if self.corrupt:
+            self.corrupt -= 1
+            buf[0] ^= 0x04
+        return buf
+
+
+def _make_rom(pin_id, index):
+    """生成带正确CRC的ROM编码(家族码0x28)"""
+    rom = bytearray([0x28, pin_id & 0xFF, index & 0xFF, 0, 0, 0, 0x5A, 0])
+    rom[7] = onewire.crc8(rom[:7])
+    return bytes(rom)
+
+
+def add_sensor(pin_id, temp=20.0, rom=None):
+    """
+    在引脚上挂接一个传感器
+
+    Returns:
+        Sensor: 仿真传感器，修改其 temp 改变温度
+    """
+    devices = onewire.bus(pin_id)
+    sensor = Sensor(rom or _make_rom(pin_id, len(devices)), temp)
+    devices.append(sensor)
+    return sensor
+
+
+def set_temp(pin_id, temp, index=0):
+    """设置引脚上第 index 个传感器的温度"""
+    onewire.bus(pin_id)[index].temp = temp
+
+
+class DS18X20:
+    def __init__(self, onewire):
+        self.ow = onewire
+
+    def scan(self):
+        return [rom for rom in self.ow.scan() if rom[0] in (0x10, 0x22, 0x28)]
+
+    def convert_temp(self):
+        if not self.ow.reset():
+            raise onewire.OneWireError
+        for sensor in self.ow.devices:
+            sensor.start_conversion()
+
+    def _sensor(self, rom):
+        rom = bytes(rom)
+        for sensor in self.ow.devices:
+            if sensor.rom == rom:
+                return sensor
+        raise onewire.OneWireError
+
+    def read_scratch(self, rom):
+        if not self.ow.reset():
+            raise onewire.OneWireError
+        return self._sensor(rom).scratchpad()
+
+    def write_scratch(self, rom, buf):
+        if not self.ow.reset():
+            raise onewire.OneWireError
+        sensor = self._sensor(rom)
+        sensor.th, sensor.tl, sensor.config = buf[0], buf[1], buf[2]
+
+    def read_temp(self, rom):
+        buf = self.read_scratch(rom)
+        raw = buf[0] | (buf[1] << 8)
+        if raw & 0x8000:
+            raw -= 0x10000
+        return raw / 16
@@ -0,0 +1,139 @@
+"""
+framebuf 替身模块
+只实现 MONO_VLSB 格式(SSD1306使用的格式)；text() 的字形由字符编码生成，
+不是真实的8x8字体，但不同字符的像素不同，足以检验刷新范围和传输量
+"""
+
+MONO_VLSB = 0
+MONO_HLSB = 3
+MONO_HMSB = 4
+RGB565 = 1
+GS2_HMSB = 5
+GS4_HMSB = 2
+GS8 = 6
+
+
+_glyphs = {}
+
+
+def _glyph(ch):
+    """字符的8列像素(每列一个字节，低位在上)，空格为空白"""
+    cols = _glyphs.get(ch)
+    if cols is None:
+        cols = _glyphs[ch] = _make_glyph(ch)
+    return cols
+
+
+def _make_glyph(ch):
+    code = ord(ch)
+    if code == 0x20:
+        return (0,) * 8
+    cols = []
+    for col in range(8):
+        if col == 0 or col == 7:
+            # 字符间距
+            cols.append(0)
+        else:
+            cols.append(((code * 0x9D + col * 0x3B) ^ (code >> 1)) & 0x7E | 0x01)
+    return tuple(cols)
+
+
+class FrameBuffer:
+    def __init__(self, buffer, width, height, format, stride=None):
+        if format != MONO_VLSB:
+            raise ValueError('only MONO_VLSB is supported')
+        self._buf = buffer
+        self._width = width
+        self._height = height
+        self._stride = width if stride is None else stride
+
+    def pixel(self, x, y, c=None):
+        if not (0 <= x < self._width and 0 <= y < self._height):
+            return None if c is None else None
+        index = (y >> 3) * self._stride + x
+        bit = 1 << (y & 7)
+        if c is None:
+            return 1 if self._buf[index] & bit else 0
+        if c:
+            self._buf[index] |= bit
+        else:
+            self._buf[index] &= ~bit & 0xFF
+
+    def fill(self, c):
+        buf = self._buf
+        buf[:] = (b'\xff' if c else b'\x00') * len(buf)
+
+    def fill_rect(self, x, y, w, h, c):
+        for yy in range(max(y, 0), min(y + h, self._height)):
+            for xx in range(max(x, 0), min(x + w, self._width)):
+                self.pixel(xx, yy, c)
+
+    def hline(self, x, y, w, c):
+        self.fill_rect(x, y, w, 1, c)
+
+    def vline(self, x, y, h, c):
+        self.fill_rect(x, y, 1, h, c)
+
+    def rect(self, x, y, w, h, c, f=False):
+        if f:
+            self.fill_rect(x, y, w, h, c)
+            return
+        self.hline(x, y, w, c)
+        self.hline(x, y + h - 1, w, c)
+        self.vline(x, y, h, c)
+        self.vline(x + w - 1, y, h, c)
+
+    def line(self, x1, y1, x2, y2, c):
+        dx = abs(x2 - x1)
+        dy = -abs(y2 - y1)
+        sx = 1 if x1 < x2 else -1
+        sy = 1 if y1 < y2 else -1
+        err = dx + dy
+        while True:
+            self.pixel(x1, y1, c)
+            if x1 == x2 and y1 == y2:
+                break
+            e2 = 2 * err
+            if e2 >= dy:
+                err += dy
+                x1 += sx
+            if e2 <= dx:
+                err += dx
+                y1 += sy
+
+    def text(self, s, x, y, c=1):
+        # 按列写入：字符跨两页时拆成上下两部分
+        buf = self._buf
+        stride = self._stride
+        page, shift = divmod(y, 8)
+        for ch in s:
+            cols = _glyph(ch)
+            for col in range(8):
+                xx = x + col
+                if not 0 <= xx < self._width:
+                    continue
+                bits = cols[col] << shift
+                for p, part in ((page, bits & 0xFF), (page + 1, bits >> 8)):
+                    if part and 0 <= p and p * 8 < self._height:
+                        index = p * stride + xx
+                        if c:
+                            buf[index] |= part
+                        else:
+                            buf[index] &= ~part & 0xFF
+            x += 8
+
+    def scroll(self, xstep, ystep):
+        old = FrameBuffer(bytearray(self._buf), self._width, self._height, MONO_VLSB, self._stride)
+        for y in range(self._height):
+            for x in range(self._width):
+                sx = x - xstep
+                sy = y - ystep
+                if 0 <= sx < self._width and 0 <= sy < self._height:
+                    self.pixel(x, y, old.pixel(sx, sy))
+
+    def blit(self, fbuf, x, y, key=-1, palette=None):
+        for yy in range(fbuf._height):
+            for xx in range(fbuf._width):
+                c = fbuf.pixel(xx, yy)
+                if c != key:
+                    self.pixel(x + xx, y + yy, c)
@@ -0,0 +1,335 @@
+"""
+machine 替身模块
+引脚电平、串口接收数据、I2C从设备都可以由仿真脚本设置，输出引脚的变化可以被监听
+"""
+
+import asyncio
+
+import sim
+
+
+class Pin:
+    """GPIO引脚 - 同一编号的所有实例共享电平"""
+
+    IN = 0
+    OUT = 1
+    OPEN_DRAIN = 2
+    ALT = 3
+    PULL_UP = 1
+    PULL_DOWN = 2
+    IRQ_FALLING = 4
+    IRQ_RISING = 8
+
+    levels = {}         # 引脚编号 -> 电平
+    modes = {}          # 引脚编号 -> 模式
+    handlers = {}       # 引脚编号 -> (触发方式, 回调, 引脚对象)
+    watchers = []       # 输出变化监听函数 watcher(引脚编号, 电平)
+    listeners = {}      # 引脚编号 -> 电平变化监听函数列表 listener(电平) (PIO状态机等外设)
+
+    def __init__(self, id, mode=-1, pull=-1, value=None, **kwargs):
+        self._id = id
+        self.init(mode, pull, value)
+
+    def init(self, mode=-1, pull=-1, value=None, **kwargs):
+        if mode != -1:
+            Pin.modes[self._id] = mode
+        if self._id not in Pin.levels:
+            # 上拉输入默认高电平
+            Pin.levels[self._id] = 1 if pull == Pin.PULL_UP else 0
+        if value is not None:
+            self.value(value)
+
+    def id(self):
+        return self._id
+
+    def value(self, value=None):
+        if value is None:
+            return Pin.levels.get(self._id, 0)
+        Pin.set_level(self._id, 1 if value else 0)
+
+    __call__ = value
+
+    def on(self):
+        self.value(1)
+
+    def off(self):
+        self.value(0)
+
+    def high(self):
+        self.value(1)
+
+    def low(self):
+        self.value(0)
+
+    def toggle(self):
+        self.value(not self.value())
+
+    def irq(self, handler=None, trigger=IRQ_FALLING | IRQ_RISING, **kwargs):
+        if handler is None:
+            Pin.handlers.pop(self._id, None)
+        else:
+            Pin.handlers[self._id] = (trigger, handler, self)
+
+    def __repr__(self):
+        return 'Pin({})'.format(self._id)
+
+    @classmethod
+    def set_level(cls, pin_id, level):
+        """设置电平，产生边沿时调用中断回调，输出引脚通知监听函数"""
+        old = cls.levels.get(pin_id, 0)
+        cls.levels[pin_id] = level
+        if old == level:
+            return
+        if cls.modes.get(pin_id) == cls.OUT:
+            for watcher in cls.watchers:
+                watcher(pin_id, level)
+        for listener in cls.listeners.get(pin_id, ()):
+            listener(level)
+        entry = cls.handlers.get(pin_id)
+        if entry is not None:
+            trigger, handler, pin = entry
+            if trigger & (cls.IRQ_RISING if level else cls.IRQ_FALLING):
+                handler(pin)
+
+    @classmethod
+    def drive(cls, pin_id, level):
+        """仿真脚本驱动输入引脚电平"""
+        cls.set_level(pin_id, 1 if level else 0)
+
+    @classmethod
+    def pulse(cls, pin_id, count=1):
+        """在输入引脚上产生 count 个脉冲，每个脉冲各有一个上升沿和下降沿，结束时回到空闲电平"""
+        idle = cls.levels.get(pin_id, 0)
+        for _ in range(count):
+            cls.set_level(pin_id, 1 - idle)
+            cls.set_level(pin_id, idle)
+
+    @classmethod
+    def reset_all(cls):
+        """清除所有引脚状态(每次仿真开始时调用)"""
+        cls.levels.clear()
+        cls.modes.clear()
+        cls.handlers.clear()
+        cls.listeners.clear()
+        del cls.watchers[:]
+
+
+class UART:
+    """串口 - feed() 注入接收数据，发送的数据累积在 tx 中"""
+
+    instances = {}      # 串口编号 -> 实例
+
+    def __init__(self, id, baudrate=115200, bits=8, parity=None, stop=1, **kwargs):
+        self.id = id
+        self.rx = bytearray()
+        self.tx = bytearray()
+        self._rx_event = None
+        self.init(baudrate, bits, parity, stop, **kwargs)
+        UART.instances[id] = self
+
+    def init(self, baudrate=115200, bits=8, parity=None, stop=1, **kwargs):
+        self.baudrate = baudrate
+        # 每字节线路位数: 起始位 + 数据位 + 校验位 + 停止位
+        self.frame_bits = 1 + bits + (0 if parity is None else 1) + stop
+
+    def any(self):
+        return len(self.rx)
+
+    def read(self, nbytes=None):
+        if not self.rx:
+            return None
+        n = len(self.rx) if nbytes is None else min(nbytes, len(self.rx))
+        data = bytes(self.rx[:n])
+        del self.rx[:n]
+        return data
+
+    def readinto(self, buf, nbytes=None):
+        n = min(len(buf), len(self.rx)) if nbytes is None else min(nbytes, len(buf), len(self.rx))
+        if not n:
+            return None
+        buf[:n] = self.rx[:n]
+        del self.rx[:n]
+        return n
+
+    def write(self, buf):
+        self.tx += buf
+        return len(buf)
+
+    def tx_time(self, nbytes):
+        """发送 nbytes 字节所需的线路时间(秒)"""
+        return nbytes * self.frame_bits / self.baudrate
+
+    def feed(self, data):
+        """仿真脚本注入接收数据，唤醒等待中的StreamReader"""
+        if isinstance(data, str):
+            data = data.encode()
+        self.rx += data
+        if self._rx_event is not None:
+            self._rx_event.set()
+
+    def take_tx(self):
+        """取出并清空已发送的数据"""
+        data = bytes(self.tx)
+        del self.tx[:]
+        return data
+
+    async def wait_rx(self):
+        """等待接收数据(供uasyncio替身的StreamReader使用)"""
+        if self._rx_event is None:
+            self._rx_event = asyncio.Event()
+        while not self.rx:
+            self._rx_event.clear()
+            await self._rx_event.wait()
+
+    def __repr__(self):
+        return 'UART({}, baudrate={})'.format(self.id, self.baudrate)
+
+
+class I2C:
+    """I2C总线 - devices 中列出的地址可以应答，写入按总线频率计时"""
+
+    devices = {}        # 总线编号 -> 可应答的从设备地址列表，未设置时为 [0x3C]
+    simulate_timing = True
+
+    def __init__(self, id, scl=None, sda=None, freq=400000, **kwargs):
+        self.id = id
+        self.freq = freq
+        self.transactions = 0
+        self.bytes_written = 0
+
+    def scan(self):
+        return list(I2C.devices.get(self.id, [0x3C]))
+
+    def _write(self, addr, nbytes):
+        if addr not in I2C.devices.get(self.id, [0x3C]):
+            raise OSError(19)  # ENODEV
+        self.transactions += 1
+        self.bytes_written += nbytes
+        if I2C.simulate_timing:
+            # 地址字节 + 数据字节，每字节9个时钟(含ACK)；I2C写入在设备上是阻塞的
+            sim.busy((nbytes + 1) * 9 / self.freq)
+
+    def writeto(self, addr, buf, stop=True):
+        self._write(addr, len(buf))
+        return len(buf)
+
+    def writevto(self, addr, vector, stop=True):
+        self._write(addr, sum(len(buf) for buf in vector))
+        return len(vector)
+
+    def readfrom_into(self, addr, buf, stop=True):
+        self._write(addr, 0)
+        for i in range(len(buf)):
+            buf[i] = 0
+
+    def __repr__(self):
+        return 'I2C({}, freq={})'.format(self.id, self.freq)
+
+
+SoftI2C = I2C
+
+
+class Timer:
+    """软件定时器 - 在事件循环中调用回调"""
+
+    ONE_SHOT = 0
+    PERIODIC = 1
+
+    def __init__(self, id=-1, **kwargs):
+        self._handle = None
+        if kwargs:
+            self.init(**kwargs)
+
+    def init(self, mode=PERIODIC, period=-1, freq=-1, callback=None, **kwargs):
+        self.deinit()
+        if freq > 0:
+            period = 1000 / freq
+        self.mode = mode
+        self.period = period
+        self.callback = callback
+        self._loop = asyncio.get_event_loop()
+        self._schedule()
+
+    def _schedule(self):
+        self._handle = self._loop.call_later(self.period / 1000, self._fire)
+
+    def _fire(self):
+        if self.mode == Timer.PERIODIC:
+            self._schedule()
+        else:
+            self._handle = None
+        if self.callback is not None:
+            self.callback(self)
+
+    def deinit(self):
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+
+
+class WDT:
+    """看门狗 - 记录喂狗时间，expired() 判断运行期间是否超时过"""
+
+    instance = None
+
+    def __init__(self, id=0, timeout=5000):
+        self.timeout = timeout
+        self.feeds = 0
+        self.last_feed = sim.now()
+        self.max_gap = 0.0      # 两次喂狗的最长间隔(秒)
+        WDT.instance = self
+
+    def feed(self):
+        now = sim.now()
+        self.max_gap = max(self.max_gap, now - self.last_feed)
+        self.feeds += 1
+        self.last_feed = now
+
+    def expired(self):
+        """运行期间是否有过超时(真实硬件此时已复位)"""
+        gap = max(self.max_gap, sim.now() - self.last_feed)
+        return gap * 1000 > self.timeout
+
+
+PWRON_RESET = 1
+WDT_RESET = 3
+
+_reset_cause = PWRON_RESET
+
+
+def reset_cause():
+    return _reset_cause
+
+
+_freq = 125000000
+
+
+def freq(hz=None):
+    global _freq
+    if hz is None:
+        return _freq
+    _freq = hz
+
+
+def unique_id():
+    return b'\xe6\x61\x38\x52\x83\x43\x51\x2f'
+
+
+def disable_irq():
+    return 0
+
+
+def enable_irq(state=0):
+    pass
+
+
+def idle():
+    pass
+
+
+def reset():
+    raise SystemExit('machine.reset()')
+
+
+def soft_reset():
+    raise SystemExit('machine.soft_reset()')
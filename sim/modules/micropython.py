@@ -0,0 +1,35 @@
+"""micropython 替身模块"""
+
+
+def const(value):
+    return value
+
+
+def native(func):
+    return func
+
+
+viper = native
+
+
+def schedule(func, arg):
+    """在事件循环中尽快调用(对应中断中安排的软回调)"""
+    import asyncio
+    try:
+        asyncio.get_running_loop().call_soon(func, arg)
+    except RuntimeError:
+        func(arg)
+    return True
+
+
+def alloc_emergency_exception_buf(size):
+    pass
+
+
+def opt_level(level=None):
+    return 0
+
+
+def mem_info(verbose=False):
+    import gc
+    print('mem: total={}, free={}'.format(gc.mem_alloc() + gc.mem_free(), gc.mem_free()))
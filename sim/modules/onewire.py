@@ -0,0 +1,83 @@
+"""
+onewire 替身模块
+每个引脚上的单总线设备登记在 buses 中，仿真脚本通过 ds18x20.add_sensor() 挂接温度传感器；
+从 buses 中移除传感器即模拟拔出探头。MATCH ROM 选中设备后的读暂存器命令(0xBE)返回该设备的暂存器，
+没有设备应答时读到全1
+"""
+
+READ_SCRATCH = 0xBE
+
+
+class OneWireError(Exception):
+    pass
+
+
+# 引脚编号 -> 总线上的设备列表
+buses = {}
+
+
+def crc8(data):
+    """Dallas/Maxim CRC8"""
+    crc = 0
+    for byte in data:
+        for _ in range(8):
+            mix = (crc ^ byte) & 0x01
+            crc >>= 1
+            if mix:
+                crc ^= 0x8C
+            byte >>= 1
+    return crc
+
+
+def bus(pin_id):
+    """获取引脚上的设备列表(不存在时创建)"""
+    return buses.setdefault(pin_id, [])
+
+
+class OneWire:
+    SEARCH_ROM = 0xF0
+    MATCH_ROM = 0x55
+    SKIP_ROM = 0xCC
+
+    def __init__(self, pin):
+        self.pin = pin
+        self.devices = bus(pin.id())
+        self.selected = None
+        self.command = None
+
+    def reset(self, required=False):
+        present = bool(self.devices)
+        if required and not present:
+            raise OneWireError
+        return present
+
+    def scan(self):
+        return [bytearray(device.rom) for device in self.devices]
+
+    def select_rom(self, rom):
+        self.writebyte(self.MATCH_ROM)
+        rom = bytes(rom)
+        self.selected = None
+        for device in self.devices:
+            if device.rom == rom:
+                self.selected = device
+
+    def writebyte(self, value):
+        self.command = value
+
+    def readbyte(self):
+        return 0xFF
+
+    def write(self, buf):
+        pass
+
+    def readinto(self, buf):
+        data = b''
+        if self.command == READ_SCRATCH and self.selected is not None and self.selected in self.devices:
+            data = self.selected.scratchpad()
+        self.command = None
+        for i in range(len(buf)):
+            buf[i] = data[i] if i < len(data) else 0xFF
+
+    def crc8(self, data):
+        return crc8(data)
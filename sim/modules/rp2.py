@@ -0,0 +1,117 @@
+"""
+rp2 替身模块
+不解释PIO指令：StateMachine 只模拟固件使用的脉冲计数程序(in_base 引脚每个上升沿X减1)，
+exec() 支持该程序读取计数所需的几条指令
+"""
+
+from collections import deque
+
+from machine import Pin
+
+
+class PIO:
+    IN_LOW = 0
+    IN_HIGH = 1
+    OUT_LOW = 2
+    OUT_HIGH = 3
+    SHIFT_LEFT = 0
+    SHIFT_RIGHT = 1
+    JOIN_NONE = 0
+    JOIN_TX = 1
+    JOIN_RX = 2
+
+    def __init__(self, id):
+        self.id = id
+
+    def state_machine(self, id, *args, **kwargs):
+        return StateMachine(self.id * 4 + id, *args, **kwargs)
+
+
+class PIOProgram:
+    """asm_pio 装饰后的程序(函数体不执行)"""
+
+    def __init__(self, func, options):
+        self.func = func
+        self.name = func.__name__
+        self.options = options
+
+
+def asm_pio(**options):
+    def decorator(func):
+        return PIOProgram(func, options)
+    return decorator
+
+
+class StateMachine:
+    """PIO状态机 - 8个编号(0-7)，同一编号的实例共享状态"""
+
+    machines = {}       # 状态机编号 -> 实例
+
+    def __new__(cls, id, program=None, *args, **kwargs):
+        if not 0 <= id < 8:
+            raise ValueError('invalid state machine id')
+        sm = cls.machines.get(id)
+        if sm is None:
+            sm = super().__new__(cls)
+            sm.id = id
+            sm.pin_id = None
+            sm.running = False
+            sm.x = 0
+            sm.isr = 0
+            sm.rx = deque(maxlen=4)
+            cls.machines[id] = sm
+        return sm
+
+    def __init__(self, id, program=None, freq=-1, in_base=None, **kwargs):
+        if program is not None:
+            self.init(program, freq, in_base=in_base, **kwargs)
+
+    def init(self, program, freq=-1, in_base=None, **kwargs):
+        self.program = program
+        listeners = Pin.listeners.get(self.pin_id)
+        if listeners and self._edge in listeners:
+            listeners.remove(self._edge)
+        self.pin_id = in_base.id() if in_base is not None else None
+        if self.pin_id is not None:
+            Pin.listeners.setdefault(self.pin_id, []).append(self._edge)
+        self.running = False
+        self.x = 0
+        self.isr = 0
+        self.rx.clear()
+
+    def _edge(self, level):
+        if self.running and level:
+            self.x = (self.x - 1) & 0xFFFFFFFF
+
+    def active(self, value=None):
+        if value is None:
+            return self.running
+        self.running = bool(value)
+
+    def exec(self, instr):
+        instr = instr.replace(' ', '')
+        if instr in ('set(x,0)', 'mov(x,null)'):
+            self.x = 0
+        elif instr == 'mov(isr,x)':
+            self.isr = self.x
+        elif instr == 'push()':
+            self.rx.append(self.isr)
+            self.isr = 0
+        else:
+            raise ValueError('unsupported instruction: ' + instr)
+
+    def get(self, buf=None, shift=0):
+        if not self.rx:
+            raise RuntimeError('RX FIFO empty (would block)')
+        return self.rx.popleft() >> shift
+
+    def rx_fifo(self):
+        return len(self.rx)
+
+    def irq(self, handler=None, trigger=0, hard=False):
+        pass
+
+    @classmethod
+    def reset_all(cls):
+        """清除所有状态机(每次仿真开始时调用)"""
+        cls.machines.clear()
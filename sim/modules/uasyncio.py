@@ -0,0 +1,103 @@
+"""
+uasyncio 替身模块
+基于CPython asyncio，补上MicroPython特有的 sleep_ms、wait_for_ms、ThreadSafeFlag，
+StreamReader/StreamWriter 直接操作 machine.UART 替身(发送按波特率计时)
+"""
+
+import asyncio as _asyncio
+from asyncio import (
+    CancelledError, Event, Lock, create_task, current_task, gather, get_event_loop,
+    new_event_loop, sleep, wait_for,
+)
+
+TimeoutError = _asyncio.TimeoutError
+
+# 仿真运行器可替换 run() 的实现(例如限制运行时长)
+run_hook = None
+
+
+async def sleep_ms(ms):
+    await _asyncio.sleep(ms / 1000)
+
+
+async def wait_for_ms(aw, timeout):
+    return await _asyncio.wait_for(aw, timeout / 1000)
+
+
+def run(main):
+    if run_hook is not None:
+        return run_hook(main)
+    return _asyncio.run(main)
+
+
+class ThreadSafeFlag:
+    """可在中断(回调)中设置的标志"""
+
+    def __init__(self):
+        self._event = Event()
+
+    def set(self):
+        self._event.set()
+
+    def clear(self):
+        self._event.clear()
+
+    async def wait(self):
+        await self._event.wait()
+        self._event.clear()
+
+
+class StreamReader:
+    """串口读取器 - 无数据时挂起，直到仿真脚本 feed() 数据"""
+
+    def __init__(self, stream, extra=None):
+        self.s = stream
+
+    async def readinto(self, buf):
+        while True:
+            n = self.s.readinto(buf)
+            if n:
+                return n
+            await self.s.wait_rx()
+
+    async def read(self, n=-1):
+        while True:
+            data = self.s.read(None if n < 0 else n)
+            if data:
+                return data
+            await self.s.wait_rx()
+
+    async def readline(self):
+        line = bytearray()
+        while not line.endswith(b'\n'):
+            line += await self.read(1)
+        return bytes(line)
+
+
+class StreamWriter:
+    """串口写入器 - drain() 按串口的线路时间等待，期间其他协程可以运行"""
+
+    def __init__(self, stream, extra=None):
+        self.s = stream
+        self.out = bytearray()
+
+    def write(self, buf):
+        self.out += buf
+
+    async def drain(self):
+        if not self.out:
+            return
+        data = bytes(self.out)
+        del self.out[:]
+        self.s.write(data)
+        tx_time = getattr(self.s, 'tx_time', None)
+        await _asyncio.sleep(tx_time(len(data)) if tx_time else 0)
+
+    def close(self):
+        pass
+
+    async def wait_closed(self):
+        pass
+
+
+Stream = StreamWriter
@@ -0,0 +1,244 @@
+"""
+轨迹重放
+在虚拟时钟下把轨迹中的输入重新注入固件：串口数据经 uart_receive_task 交给 uart_data_handler，
+温度读数按顺序由 TempEngine (ds 任务) 读出，脉冲送入 PulseCounter 的中断，水位电平由 gpio_pin_reader 读取；
+重放时记录的继电器/LED/串口输出与轨迹中的输出比对
+
+用法:
+    python -m sim.replay trace.bin
+    python -m sim.replay trace.bin --main main.py.new --time-tolerance-ms 500 --max-diffs 20
+"""
+
+import argparse
+import difflib
+import io
+import os
+import sys
+import time
+import tracemalloc
+
+import sim
+
+sim.install()
+# 重放不统计内存，关闭 tracemalloc 提高速度
+tracemalloc.stop()
+
+import uasyncio as asyncio
+import machine
+import ds18x20
+import rp2
+
+import config
+from data.trace import (
+    get_recorder, read_trace, TRACE_UART_RX, TRACE_TEMP, TRACE_PULSES, TRACE_GPIO,
+    TRACE_OUTPUT, TRACE_UART_TX,
+)
+from sim.run import Simulation
+
+# 脉冲和水位电平在记录时刻之前的测量周期内发生，重放时提前注入(秒)
+INPUT_LEAD = 0.5
+# 串口数据在固件读取之前已经到达，重放时提前注入(秒)
+UART_LEAD = 0.001
+
+
+class Replayer(Simulation):
+    """轨迹重放 - 用轨迹中的输入代替仿真运行器的模拟输入"""
+
+    def __init__(self, records):
+        super().__init__(probe_ms=0, line_interval_ms=0, virtual=True)
+        self.records = records
+        self.duration = (records[-1][0] / 1000 + 2) if records else 2
+
+    def setup_hardware(self):
+        """挂接传感器并装入轨迹中的温度读数，水位引脚置为轨迹中的初始电平"""
+        machine.Pin.reset_all()
+        machine.WDT.instance = None
+        rp2.StateMachine.reset_all()
+        readings = {}
+        levels = {}
+        for t_ms, kind, channel, payload in self.records:
+            if kind == TRACE_TEMP:
+                readings.setdefault(channel, []).append(int.from_bytes(payload, 'little', signed=True) / 100)
+            elif kind == TRACE_GPIO and channel not in levels:
+                levels[channel] = payload[0]
+        for index, pin in enumerate(config.DS_PINS[:config.DEVICE_COUNT]):
+            sensor = ds18x20.add_sensor(pin, 20.0)
+            sensor.readings = readings.get(index, [])
+            if sensor.readings:
+                sensor.temp = sensor.readings[-1]
+            self.sensors.append(sensor)
+        for index, pin in enumerate(config.WATER_PINS[:config.DEVICE_COUNT]):
+            machine.Pin.drive(pin, levels.get(index, 0))
+
+    async def drive_inputs(self):
+        """按轨迹时间注入串口数据、脉冲和水位电平"""
+        for t_ms, kind, channel, payload in self.records:
+            if kind == TRACE_UART_RX:
+                at = max(0, t_ms / 1000 - UART_LEAD)
+            elif kind in (TRACE_PULSES, TRACE_GPIO):
+                at = max(0, t_ms / 1000 - INPUT_LEAD)
+            else:
+                continue
+            delay = at - sim.now()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+            if kind == TRACE_UART_RX:
+                uart = self.uart()
+                while uart is None:
+                    await asyncio.sleep(0)
+                    uart = self.uart()
+                uart.feed(bytes(payload))
+                self.rx_bytes += len(payload)
+            elif kind == TRACE_PULSES:
+                if channel < len(config.FLOW_METERS):
+                    machine.Pin.pulse(config.FLOW_METERS[channel][0], int.from_bytes(payload, 'little'))
+            elif channel < len(config.WATER_PINS):
+                machine.Pin.drive(config.WATER_PINS[channel], payload[0])
+
+
+def output_events(records):
+    """
+    提取输出事件
+
+    Returns:
+        tuple: (引脚编号 -> [(时间毫秒, 电平)], [(时间毫秒, 串口输出的一行或一帧)])
+    """
+    pins = {}
+    lines = []
+    pending = bytearray()
+    pending_t = 0
+    for t_ms, kind, channel, payload in records:
+        if kind == TRACE_OUTPUT:
+            pins.setdefault(channel, []).append((t_ms, payload[0]))
+        elif kind == TRACE_UART_TX:
+            if not pending:
+                pending_t = t_ms
+            pending += payload
+            # JSON行以换行结束，二进制帧以0x00结束
+            while True:
+                end = -1
+                for i, b in enumerate(pending):
+                    if b == 0x0A or b == 0x00:
+                        end = i
+                        break
+                if end < 0:
+                    break
+                lines.append((pending_t, bytes(pending[:end + 1])))
+                del pending[:end + 1]
+                pending_t = t_ms
+    return pins, lines
+
+
+def collapse_repeats(lines, window):
+    """
+    去掉与最近 window 行之一相同的行：完整模式下周期性重发的相同快照不含新信息，
+    同一时刻的事件先后不同会让两次运行多发或少发一次快照
+
+    Returns:
+        list: 去重后的 (时间毫秒, 行) 列表
+    """
+    kept = []
+    for t_ms, line in lines:
+        if any(line == previous for _, previous in kept[-window:]):
+            continue
+        kept.append((t_ms, line))
+    return kept
+
+
+def compare_events(expected, actual, tolerance_ms, max_diffs):
+    """
+    比对两组 (时间毫秒, 值) 序列：值序列按最长公共子序列对齐，相同部分检查时间偏差
+
+    Returns:
+        tuple: (差异描述列表, 最大时间偏差毫秒, 时间偏差超限的个数)
+    """
+    diffs = []
+    max_skew = 0
+    late = 0
+    a = [value for _, value in expected]
+    b = [value for _, value in actual]
+    matcher = difflib.SequenceMatcher(None, a, b, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == 'equal':
+            for k in range(i2 - i1):
+                skew = abs(expected[i1 + k][0] - actual[j1 + k][0])
+                max_skew = max(max_skew, skew)
+                if skew > tolerance_ms:
+                    late += 1
+            continue
+        if len(diffs) < max_diffs:
+            at = expected[i1][0] if i1 < len(expected) else (actual[j1][0] if j1 < len(actual) else 0)
+            diffs.append('{:>9.3f}s 记录: {} / 重放: {}'.format(at / 1000, a[i1:i2][:3], b[j1:j2][:3]))
+        else:
+            diffs.append(None)
+    return diffs, max_skew, late
+
+
+def print_diffs(label, diffs, max_skew, late, tolerance_ms):
+    """打印一组比对结果，返回是否一致"""
+    shown = [d for d in diffs if d is not None]
+    ok = not diffs and not late
+    print('{} {}: 差异 {} 处，最大时间偏差 {} ms (超过 {} ms: {} 个)'.format(
+        '✅' if ok else '❌', label, len(diffs), max_skew, tolerance_ms, late))
+    for line in shown:
+        print('      ' + line)
+    if len(diffs) > len(shown):
+        print('      ... 另有 {} 处差异'.format(len(diffs) - len(shown)))
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description='在虚拟时钟下重放运行轨迹并比对输出')
+    parser.add_argument('trace', help='轨迹文件')
+    parser.add_argument('--main', default=os.path.join(sim.FIRMWARE_DIR, 'main.py.new'), help='固件主程序')
+    parser.add_argument('--time-tolerance-ms', type=int, default=1000, help='输出时间允许的偏差(毫秒)')
+    parser.add_argument('--max-diffs', type=int, default=10, help='每组最多显示的差异数')
+    parser.add_argument('--exact', action='store_true', help='串口输出逐行比对，不合并重复的快照')
+    parser.add_argument('--verbose', action='store_true', help='显示固件的打印输出')
+    args = parser.parse_args()
+
+    with open(args.trace, 'rb') as f:
+        records = read_trace(f.read())
+    expected_pins, expected_lines = output_events(records)
+    print('📼 轨迹: {} 条记录，时长 {:.1f} s'.format(len(records), records[-1][0] / 1000 if records else 0))
+
+    # 重放时由仿真运行器记录输出，不按 config.TRACE_FILE 写文件
+    config.TRACE_FILE = None
+    replayer = Replayer(records)
+    recorder = get_recorder()
+    replay_out = io.BytesIO()
+    recorder.start(replay_out, record_tx=bool(expected_lines))
+
+    started = time.monotonic()
+    replayer.run(args.main, replayer.duration, quiet=not args.verbose)
+    recorder.stop()
+    wall = time.monotonic() - started
+    print('⏩ 重放 {:.1f} s 用时 {:.1f} s ({:.0f} 倍速)'.format(replayer.elapsed, wall, replayer.elapsed / max(wall, 1e-6)))
+
+    # 只比对轨迹时长以内的输出
+    end_ms = records[-1][0] if records else 0
+    actual = [record for record in read_trace(replay_out.getvalue()) if record[0] <= end_ms]
+    actual_pins, actual_lines = output_events(actual)
+    ok = True
+    for pin_id in sorted(set(expected_pins) | set(actual_pins)):
+        diffs, skew, late = compare_events(expected_pins.get(pin_id, []), actual_pins.get(pin_id, []),
+                                           args.time_tolerance_ms, args.max_diffs)
+        ok = print_diffs('引脚{:>2} ({}次变化)'.format(pin_id, len(expected_pins.get(pin_id, []))),
+                         diffs, skew, late, args.time_tolerance_ms) and ok
+    if expected_lines:
+        if not args.exact:
+            window = 2 * config.DEVICE_COUNT
+            expected_lines = collapse_repeats(expected_lines, window)
+            actual_lines = collapse_repeats(actual_lines, window)
+        diffs, skew, late = compare_events(expected_lines, actual_lines, args.time_tolerance_ms, args.max_diffs)
+        ok = print_diffs('串口输出 ({}行)'.format(len(expected_lines)), diffs, skew, late,
+                         args.time_tolerance_ms) and ok
+    else:
+        print('ℹ️  轨迹没有记录串口发送数据(config.TRACE_TX)，跳过串口输出比对')
+
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,241 @@
+"""
+主机仿真运行器
+在CPython上运行 main.py(或 main.py.new)，同时注入传感器和串口输入，并测量事件循环延迟、
+串口吞吐量和内存占用
+
+用法:
+    python -m sim.run --seconds 10
+    python -m sim.run --main main.py.new --seconds 30 --quiet --json sim_result.json
+    python -m sim.run --main main.py.new --seconds 43200 --virtual --quiet --record trace.bin
+"""
+
+import argparse
+import asyncio as host_asyncio
+import contextlib
+import json
+import os
+import runpy
+import sys
+import time
+import tracemalloc
+
+import sim
+
+sim.install()
+
+import uasyncio as asyncio
+import machine
+import ds18x20
+import rp2
+
+import config
+from data.trace import get_recorder
+from sim.clock import VirtualEventLoop, install_virtual_clock
+
+
+def percentile(values, fraction):
+    """values 的百分位数(values 已排序)"""
+    if not values:
+        return 0
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+class Simulation:
+    """一次仿真运行 - 准备仿真硬件，驱动输入并收集测量结果"""
+
+    def __init__(self, uart_id=0, probe_ms=10, line_interval_ms=200, pulse_hz=30, virtual=False):
+        """
+        Args:
+            uart_id (int): 固件使用的串口编号
+            probe_ms (int): 事件循环延迟探测周期(毫秒)，0表示不探测
+            line_interval_ms (int): 主机下发数据行的间隔(毫秒)，0表示不下发
+            pulse_hz (int): 流量传感器脉冲频率
+            virtual (bool): 是否使用虚拟时钟(不真正等待，长时间运行可快速完成)
+        """
+        self.uart_id = uart_id
+        self.probe_ms = probe_ms
+        self.line_interval_ms = line_interval_ms
+        self.pulse_hz = pulse_hz
+        self.lags = []             # 事件循环延迟(毫秒)
+        self.rx_bytes = 0          # 注入的串口字节数
+        self.rx_lines = 0          # 注入的串口行数
+        self.sensors = []
+        self.elapsed = 0
+        self.clock = install_virtual_clock() if virtual else None
+
+    def setup_hardware(self):
+        """挂接传感器，水位引脚置为正常(低电平)"""
+        machine.Pin.reset_all()
+        machine.WDT.instance = None
+        rp2.StateMachine.reset_all()
+        for index, pin in enumerate(config.DS_PINS[:config.DEVICE_COUNT]):
+            self.sensors.append(ds18x20.add_sensor(pin, 20.0 + index))
+        for pin in config.WATER_PINS[:config.DEVICE_COUNT]:
+            machine.Pin.drive(pin, 0)
+
+    def uart(self):
+        """固件创建的串口替身，尚未创建时返回None"""
+        return machine.UART.instances.get(self.uart_id)
+
+    async def probe(self):
+        """事件循环延迟探测：周期性睡眠，记录实际唤醒时间比预期晚多少"""
+        if not self.probe_ms:
+            return
+        period = self.probe_ms / 1000
+        while True:
+            start = sim.now()
+            await asyncio.sleep(period)
+            self.lags.append((sim.now() - start - period) * 1000)
+
+    async def drive_inputs(self):
+        """模拟外部输入：温度缓慢变化、流量脉冲、主机周期性下发数据和查询"""
+        tick = 0
+        asyncio.create_task(self.drive_pulses())
+        while True:
+            await asyncio.sleep_ms(100)
+            tick += 1
+
+            for index, sensor in enumerate(self.sensors):
+                sensor.temp = 20.0 + index + (tick % 100) / 20
+
+            uart = self.uart()
+            if uart is None or not self.line_interval_ms or tick % max(1, self.line_interval_ms // 100):
+                continue
+            n = self.rx_lines
+            device = 'device{}'.format(n % config.DEVICE_COUNT + 1)
+            if n % 5 == 4:
+                line = '{{"cmd": "get", "device": "{}", "id": {}}}\n'.format(device, n)
+            else:
+                line = '{{"device": "{}", "heat": {}, "pump": 1}}\n'.format(device, n // 10 % 2)
+            uart.feed(line)
+            self.rx_bytes += len(line)
+            self.rx_lines += 1
+
+    async def drive_pulses(self):
+        """流量脉冲：每个流量计按 pulse_hz 等间隔逐个产生(周期测量需要真实的脉冲间隔)"""
+        if not self.pulse_hz:
+            return
+        period = 1 / self.pulse_hz
+        pins = [meter[0] for meter in config.FLOW_METERS]
+        while True:
+            await asyncio.sleep(period)
+            for pin in pins:
+                machine.Pin.pulse(pin, 1)
+
+    def run_hook(self, seconds):
+        """生成 uasyncio.run 的替代实现：固件主协程与探测、输入任务一起运行 seconds 秒"""
+        def run(main):
+            async def bounded():
+                asyncio.create_task(main)
+                asyncio.create_task(self.probe())
+                asyncio.create_task(self.drive_inputs())
+                start = sim.now()
+                await asyncio.sleep(seconds)
+                self.elapsed = sim.now() - start
+                # 取消固件的所有任务
+                tasks = [t for t in host_asyncio.all_tasks() if t is not host_asyncio.current_task()]
+                for t in tasks:
+                    t.cancel()
+                await host_asyncio.gather(*tasks, return_exceptions=True)
+
+            loop = VirtualEventLoop(self.clock) if self.clock else host_asyncio.new_event_loop()
+            try:
+                loop.run_until_complete(bounded())
+            finally:
+                loop.close()
+        return run
+
+    def run(self, main_path, seconds, quiet=False):
+        """
+        运行固件主程序
+
+        Args:
+            main_path (str): 主程序路径
+            seconds (float): 运行时长(秒)
+            quiet (bool): 是否屏蔽固件的打印输出
+        """
+        self.setup_hardware()
+        asyncio.run_hook = self.run_hook(seconds)
+        tracemalloc.reset_peak()
+        out = open(os.devnull, 'w') if quiet else sys.stdout
+        try:
+            with contextlib.redirect_stdout(out):
+                runpy.run_path(main_path, run_name='__main__')
+        finally:
+            asyncio.run_hook = None
+            if quiet:
+                out.close()
+            if config.TRACE_FILE:
+                # 写出并关闭固件主程序打开的轨迹文件
+                recorder = get_recorder()
+                stream = recorder.stream
+                recorder.stop()
+                if stream is not None:
+                    stream.close()
+
+    def report(self):
+        """测量结果字典"""
+        lags = sorted(self.lags)
+        uart = self.uart()
+        tx_bytes = len(uart.tx) if uart is not None else 0
+        current, peak = tracemalloc.get_traced_memory()
+        elapsed = self.elapsed or 1
+        wdt = machine.WDT.instance
+        return {
+            'seconds': round(self.elapsed, 3),
+            'virtual': self.clock is not None,
+            'loop_lag_ms': {
+                'samples': len(lags),
+                'avg': round(sum(lags) / len(lags), 3) if lags else 0,
+                'p99': round(percentile(lags, 0.99), 3),
+                'max': round(lags[-1], 3) if lags else 0,
+            },
+            'uart': {
+                'rx_lines': self.rx_lines,
+                'rx_bytes': self.rx_bytes,
+                'tx_bytes': tx_bytes,
+                'tx_bytes_per_s': round(tx_bytes / elapsed, 1),
+            },
+            'memory': {
+                'current': current,
+                'peak': peak,
+            },
+            'watchdog': {
+                'feeds': wdt.feeds,
+                'max_gap_ms': round(wdt.max_gap * 1000, 1),
+                'expired': wdt.expired(),
+            } if wdt is not None else None,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='在主机上仿真运行固件')
+    parser.add_argument('--main', default=os.path.join(sim.FIRMWARE_DIR, 'main.py'), help='固件主程序')
+    parser.add_argument('--seconds', type=float, default=10, help='运行时长(秒)')
+    parser.add_argument('--quiet', action='store_true', help='屏蔽固件的打印输出')
+    parser.add_argument('--json', help='测量结果写入JSON文件')
+    parser.add_argument('--virtual', action='store_true', help='使用虚拟时钟')
+    parser.add_argument('--record', help='记录运行轨迹(含串口发送数据)到文件，供 sim.replay 重放')
+    args = parser.parse_args()
+
+    if args.record:
+        # 固件主程序按 config.TRACE_FILE 开始记录
+        config.TRACE_FILE = args.record
+        config.TRACE_TX = True
+
+    simulation = Simulation(virtual=args.virtual)
+    started = time.monotonic()
+    simulation.run(args.main, args.seconds, args.quiet)
+    result = simulation.report()
+    result['main'] = os.path.basename(args.main)
+    result['wall_seconds'] = round(time.monotonic() - started, 3)
+
+    text = json.dumps(result, indent=2, ensure_ascii=False)
+    print(text)
+    if args.json:
+        with open(args.json, 'w') as f:
+            f.write(text + '\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,154 +1,175 @@
 from machine import Pin, I2C
 import framebuf, sys
-import uasyncio as asyncio
 
+import config
 from display.ssd1306 import SSD1306_I2C
-from data.singleton_data import get_data_manager
+from data.singleton_data import (
+    get_data_manager, FLAG_WATER, FLAG_HEAT, FLAG_PUMP, FLAG_COOL, FLAG_WARN, FLAG_ALARM, FLAG_FAULT
+)
+from data.task_stats import register_task
 
 
-def display_task_1():
-    """设备1显示任务 - 显示温度、液位、控制状态、水泵状态"""
-    pix_res_x = 128  # SSD1306水平分辨率
-    pix_res_y = 64   # SSD1306垂直分辨率
+class DisplaySession:
+    """长连接显示会话 - I2C总线和SSD1306驱动只创建一次，I2C出错后才重新探测和初始化"""
 
-    i2c_dev = I2C(1, scl=Pin(27), sda=Pin(26), freq=200000)  # I2C1 (GPIO 26/27)
-    i2c_addr = [hex(ii) for ii in i2c_dev.scan()]  # 获取I2C地址
-    if i2c_addr == []:
-        print('未找到I2C显示屏')
-        return None
-    else:
-        print("I2C地址      : {}".format(i2c_addr[0]))
-        print("I2C配置: {}".format(i2c_dev))
+    def __init__(self, i2c_id, scl_pin, sda_pin, freq=200000, width=128, height=64):
+        """
+        Args:
+            i2c_id (int): I2C控制器编号
+            scl_pin (int): SCL引脚编号
+            sda_pin (int): SDA引脚编号
+            freq (int): I2C总线频率
+            width (int): 屏幕水平分辨率
+            height (int): 屏幕垂直分辨率
+        """
+        self.i2c_id = i2c_id
+        self.scl_pin = scl_pin
+        self.sda_pin = sda_pin
+        self.freq = freq
+        self.width = width
+        self.height = height
+        self.i2c = None                # I2C总线对象(只创建一次)
+        self.oled = None               # SSD1306驱动对象(出错后重建)
+        self.drawn_version = None      # 屏幕上当前画面对应的数据版本
 
-    oled = SSD1306_I2C(pix_res_x, pix_res_y, i2c_dev)
-    
-    # 获取数据管理器
-    data_mgr = get_data_manager()
-    
-    # 显示设备1信息
-    oled.fill(0)  # 清屏
-    
-    # 标题
-    oled.text("DEV1 - Brewing", 0, 0)
-    
-    # 温度显示
-    oled.text(f"Temp: {data_mgr.device1_temp:.1f}C", 0, 15)
-    
-    # 液位状态
-    water_status = "FULL" if data_mgr.device1_water else "LOW"
-    oled.text(f"Level: {water_status}", 0, 25)
-    
-    # 控制状态 (加热/制冷)
-    control_status = ""
-    if data_mgr.device1_heat:
-        control_status = "HEAT+"
-    elif data_mgr.device1_cool:
-        control_status = "COOL-"
-    else:
-        control_status = "IDLE"
-    oled.text(f"Ctrl: {control_status}", 0, 35)
-    
-    # 水泵状态
-    if data_mgr.device1_pump:
-        oled.text(f"Pump: {data_mgr.shared_flow:.1f}", 0, 45)
-    else:
-        oled.text("Pump: OFF", 0, 45)
-    
-    # 警告报警指示
-    alert_text = ""
-    if data_mgr.device1_warn:
-        alert_text += "W!"
-    if data_mgr.device1_alarm:
-        alert_text += "A!"
-    if alert_text:
-        oled.text(alert_text, 90, 0)
-    
-    oled.show()
-    return oled
+    def open(self):
+        """
+        获取可用的显示驱动，必要时创建总线、探测地址并初始化屏幕
 
+        Returns:
+            SSD1306_I2C: 显示驱动，未找到屏幕时返回None
+        """
+        if self.oled is not None:
+            return self.oled
 
-def display_task_2():
-    """设备2显示任务 - 显示温度、液位、控制状态、水泵状态"""
-    pix_res_x = 128  # SSD1306水平分辨率
-    pix_res_y = 64   # SSD1306垂直分辨率
+        if self.i2c is None:
+            self.i2c = I2C(self.i2c_id, scl=Pin(self.scl_pin), sda=Pin(self.sda_pin), freq=self.freq)
 
-    i2c_dev = I2C(0, scl=Pin(1), sda=Pin(0), freq=200000)  # I2C0 (GPIO 0/1)
-    i2c_addr = [hex(ii) for ii in i2c_dev.scan()]  # 获取I2C地址
-    if i2c_addr == []:
-        print('未找到I2C显示屏')
-        return None
-    else:
+        i2c_addr = [hex(ii) for ii in self.i2c.scan()]  # 获取I2C地址
+        if i2c_addr == []:
+            print('未找到I2C显示屏')
+            return None
         print("I2C地址      : {}".format(i2c_addr[0]))
-        print("I2C配置: {}".format(i2c_dev))
+        print("I2C配置: {}".format(self.i2c))
 
-    oled = SSD1306_I2C(pix_res_x, pix_res_y, i2c_dev)
-    
+        # 脏页跟踪：每次只发送变化的页和列区间
+        self.oled = SSD1306_I2C(self.width, self.height, self.i2c, dirty_tracking=True)
+        return self.oled
+
+    def reset(self):
+        """丢弃当前驱动，下次刷新时重新探测并初始化屏幕"""
+        self.oled = None
+        self.drawn_version = None
+
+    def render(self, draw, version=None, *args):
+        """
+        重绘一帧画面
+
+        Args:
+            draw: 绘制函数，参数为显示驱动和 args
+            version: 数据版本号，与屏幕上画面的版本相同时跳过重绘；None表示总是重绘
+
+        Returns:
+            SSD1306_I2C: 显示驱动，屏幕不可用时返回None
+        """
+        if version is not None and version == self.drawn_version and self.oled is not None:
+            return self.oled
+        try:
+            oled = self.open()
+            if oled is None:
+                return None
+            oled.fill(0)  # 清屏
+            draw(oled, *args)
+            oled.show()
+            self.drawn_version = version
+            return oled
+        except OSError as e:
+            # I2C通信失败：下次刷新时重新探测和初始化
+            print(f"❌ I2C显示屏通信错误: {e}")
+            self.reset()
+            return None
+
+
+# 每个设备一块显示屏，按 config.DISPLAYS 创建会话
+display_sessions = [
+    DisplaySession(i2c_id, scl_pin=scl, sda_pin=sda) for i2c_id, scl, sda in config.DISPLAYS
+]
+
+
+def draw_device(oled, index):
+    """绘制指定设备的画面 - 温度、液位、控制状态、水泵状态、累计流量"""
     # 获取数据管理器
     data_mgr = get_data_manager()
-    
-    # 显示设备2信息
-    oled.fill(0)  # 清屏
+    flags = data_mgr.flags[index]
     
     # 标题
-    oled.text("DEV2 - Brewing", 0, 0)
+    oled.text("DEV{} - Brewing".format(index + 1), 0, 0)
     
-    # 温度显示
-    oled.text(f"Temp: {data_mgr.device2_temp:.1f}C", 0, 15)
+    # 温度显示(传感器故障时温度为最后一个有效值，不显示)
+    if flags & FLAG_FAULT:
+        oled.text("Temp: ERR", 0, 15)
+    else:
+        oled.text(f"Temp: {data_mgr.get_temp(index):.1f}C", 0, 15)
     
     # 液位状态
-    water_status = "FULL" if data_mgr.device2_water else "LOW"
+    water_status = "FULL" if flags & FLAG_WATER else "LOW"
     oled.text(f"Level: {water_status}", 0, 25)
     
     # 控制状态 (加热/制冷)
-    control_status = ""
-    if data_mgr.device2_heat:
+    if flags & FLAG_HEAT:
         control_status = "HEAT+"
-    elif data_mgr.device2_cool:
+    elif flags & FLAG_COOL:
         control_status = "COOL-"
     else:
         control_status = "IDLE"
     oled.text(f"Ctrl: {control_status}", 0, 35)
     
-    # 水泵状态
-    if data_mgr.device2_pump:
-        oled.text(f"Pump: {data_mgr.shared_flow:.1f}", 0, 45)
+    # 水泵状态(本设备流量计的流速)和累计流量
+    if flags & FLAG_PUMP:
+        oled.text(f"Pump: {data_mgr.get_flow(index):.1f}", 0, 45)
     else:
         oled.text("Pump: OFF", 0, 45)
+    oled.text(f"Vol: {data_mgr.get_volume(index):.1f}L", 0, 55)
     
     # 警告报警指示
     alert_text = ""
-    if data_mgr.device2_warn:
+    if flags & FLAG_WARN:
         alert_text += "W!"
-    if data_mgr.device2_alarm:
+    if flags & FLAG_ALARM:
         alert_text += "A!"
     if alert_text:
         oled.text(alert_text, 90, 0)
-    
-    oled.show()
-    return oled
 
 
-async def async_display_task_1():
-    """异步封装的设备1显示任务 - 每秒刷新"""
-    print("🚀 设备1显示任务开始运行...")
-    
-    while True:
-        try:
-            display_task_1()
-            await asyncio.sleep(1)
-        except Exception as e:
-            print(f"❌ 设备1显示任务错误: {e}")
-            await asyncio.sleep(1)
+def display_task(index):
+    """指定设备的显示任务 - 复用长连接会话，数据无变化时跳过重绘"""
+    data_mgr = get_data_manager()
+    return display_sessions[index].render(draw_device, data_mgr.get_version(index), index)
 
 
-async def async_display_task_2():
-    """异步封装的设备2显示任务 - 每秒刷新"""
-    print("🚀 设备2显示任务开始运行...")
+async def async_display_task(index):
+    """异步封装的设备显示任务 - 设备数据或流速变化时刷新"""
+    print("🚀 设备{}显示任务开始运行...".format(index + 1))
     
-    while True:
-        try:
-            display_task_2()
-            await asyncio.sleep(1)
-        except Exception as e:
-            print(f"❌ 设备2显示任务错误: {e}")
-            await asyncio.sleep(1)
+    session = display_sessions[index]
+    data_mgr = get_data_manager()
+    sub = data_mgr.subscribe((index,))
+    stats = register_task('display{}'.format(index + 1))
+    
+    try:
+        while True:
+            try:
+                display_task(index)
+                # 合并短时间内的连续变化，最多每200ms重绘一次
+                await stats.sleep_ms(200)
+                if session.oled is None:
+                    # 屏幕不可用：每秒重新探测一次
+                    await stats.wait(sub, 800)
+                else:
+                    await stats.wait(sub)
+            except Exception as e:
+                print("❌ 设备{}显示任务错误: {}".format(index + 1, e))
+                await stats.sleep_ms(1000)
+    finally:
+        # 任务退出(如被监督器重启)时取消订阅，重启后的任务会重新订阅
+        data_mgr.unsubscribe(sub)
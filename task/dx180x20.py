@@ -1,48 +1,353 @@
 import uasyncio as asyncio
 import machine, onewire, ds18x20
-from data.singleton_data import get_data_manager
+import time
+import config
+from data.singleton_data import get_data_manager, FLAG_FAULT
+from data.trace import get_recorder
+from data.task_stats import register_task
+from data.log import get_logger, DEBUG, INFO, WARN, ERROR
+from task.supervisor import get_supervisor
 
+logger = get_logger()
 
-async def dx_read_task(pin, device_id):
+log_found = logger.site(INFO, 'Found DS devices: {} -> {}')
+log_temp = logger.site(DEBUG, '✅ 设备{}温度已更新: {:.2f}°C (DS{})', 10000, config.DEVICE_COUNT)
+log_bus_error = logger.site(WARN, '❌ DS{}单总线无响应: {}', 10000, config.DEVICE_COUNT)
+log_resolution = logger.site(INFO, '🌡️ DS18B20分辨率: {}位，转换时间{}ms')
+log_bad_read = logger.site(WARN, '⚠️ DS{}读数无效({})，重试{}次后放弃', 10000, config.DEVICE_COUNT)
+log_stale = logger.site(ERROR, '❌ 设备{}温度超过{}ms没有有效读数，标记故障')
+log_recovered = logger.site(INFO, '✅ 设备{}温度恢复有效读数')
+
+# DS18B20分辨率(位) -> 配置寄存器值
+RESOLUTION_CONFIG = {9: 0x1F, 10: 0x3F, 11: 0x5F, 12: 0x7F}
+# DS18B20分辨率(位) -> 最长转换时间(毫秒)
+CONVERSION_MS = {9: 94, 10: 188, 11: 375, 12: 750}
+# 写入暂存器时的报警上下限(不使用报警功能，保持上电默认值)
+ALARM_TH = 0x4B
+ALARM_TL = 0x46
+
+# 单总线命令
+CMD_READ_SCRATCH = 0xBE
+# 上电复位后暂存器中的温度值(85°C，原始值 0x0550)
+RAW_POWER_ON = 0x0550
+# DS18B20测量范围(原始值，1/16°C)
+RAW_MIN = -55 * 16
+RAW_MAX = 125 * 16
+
+# 读取失败的原因(日志用)
+BAD_BUS = 'bus'
+BAD_CRC = 'crc'
+BAD_RANGE = 'range'
+BAD_POWER_ON = '85C'
+
+# 任务监控期限(毫秒)：一个采集周期最长约 750 + 采集间隔
+DS_DEADLINE_MS = 6000
+# 采集间隔上限(毫秒)，须留出12位转换时间和余量，不超过任务监控期限
+DS_INTERVAL_MAX_MS = 4000
+# 读数无效时第一次重试前的等待(毫秒)，之后每次加倍；重试2次时一个探头最多多花约15ms
+DS_RETRY_MS = 5
+
+
+class DsBus:
+    """一条单总线(一个引脚)及其上的DS18B20传感器，读数写入对应设备"""
+
+    def __init__(self, pin, index):
+        """
+        Args:
+            pin (int): GPIO引脚号
+            index (int): 设备索引
+        """
+        self.pin = pin
+        self.index = index
+        self.sensor = ds18x20.DS18X20(onewire.OneWire(machine.Pin(pin)))
+        self.roms = []             # 缓存的ROM编码，重新搜索前一直使用
+        self.converting = False    # 本周期是否已启动转换
+        self.scratch = bytearray(9)
+        self.last_raw = None       # 上一次有效读数的原始值(1/16°C)
+        self.valid_ms = time.ticks_ms()     # 最近一次有效读数的时刻
+        self.scanned_ms = self.valid_ms     # 最近一次搜索的时刻
+        self.scans = 0             # 搜索次数
+        self.healthy = False       # 本周期是否读到有效温度
+        self.faulted = False       # 是否已标记故障
+
+    def scan(self):
+        """搜索总线上的传感器；空总线会被反复重新搜索，只在首次及ROM列表变化时记录"""
+        self.scanned_ms = time.ticks_ms()
+        roms = self.sensor.scan()
+        if roms != self.roms or not self.scans:
+            log_found(self.pin, roms)
+        self.roms = roms
+        self.scans += 1
+
+    def read_raw(self, rom):
+        """
+        读取暂存器并校验，不分配内存
+
+        Args:
+            rom: ROM编码
+
+        Returns:
+            int|str: 温度原始值(1/16°C)，无效时返回失败原因 (BAD_*)
+        """
+        ow = self.sensor.ow
+        buf = self.scratch
+        try:
+            ow.reset(True)
+            ow.select_rom(rom)
+            ow.writebyte(CMD_READ_SCRATCH)
+            ow.readinto(buf)
+        except onewire.OneWireError:
+            return BAD_BUS
+        # 含CRC字节整体计算CRC8结果为0；配置寄存器的保留位固定(全0的暂存器同样能通过CRC)
+        if ow.crc8(buf) or (buf[4] & 0x9F) != 0x1F:
+            return BAD_CRC
+        raw = buf[0] | (buf[1] << 8)
+        if raw & 0x8000:
+            raw -= 0x10000
+        if not RAW_MIN <= raw <= RAW_MAX:
+            return BAD_RANGE
+        # 85°C 是上电(或转换期间掉电)后的默认值：除非温度本来就接近85°C，否则视为无效
+        if raw == RAW_POWER_ON and (self.last_raw is None or abs(self.last_raw - raw) > 5 * 16):
+            return BAD_POWER_ON
+        return raw
+
+    def set_resolution(self, bits):
+        """把分辨率写入总线上所有传感器的配置寄存器"""
+        buf = bytes((ALARM_TH, ALARM_TL, RESOLUTION_CONFIG[bits]))
+        for rom in self.roms:
+            self.sensor.write_scratch(rom, buf)
+
+
+class TempEngine:
+    """
+    温度采集引擎 - 一个协程负责所有单总线：
+    同时启动所有总线的温度转换(SKIP ROM广播，每条总线一次)，共同等待一次转换时间，
+    再一轮读出所有传感器；每次读取之间让出事件循环，单次阻塞只有一个单总线事务
+    """
+
+    def __init__(self, pins, resolution=12, interval_ms=2000, retries=2, stale_ms=10000, rescan_ms=5000):
+        """
+        Args:
+            pins (tuple): 各设备的DS18B20引脚，按设备顺序
+            resolution (int): 分辨率(9-12位)，决定转换等待时间
+            interval_ms (int): 读完一轮到下一次启动转换的间隔(毫秒)
+            retries (int): 读数无效时的重试次数
+            stale_ms (int): 超过此时间没有有效读数时置故障标志(毫秒)
+            rescan_ms (int): 没有有效读数的总线重新搜索的最小间隔(毫秒)
+        """
+        self.buses = [DsBus(pin, index) for index, pin in enumerate(pins)]
+        self.resolution = resolution
+        self.resolution_pending = True     # 下一周期开始前写入传感器
+        self.interval_ms = min(interval_ms, DS_INTERVAL_MAX_MS)
+        self.retries = retries
+        self.stale_ms = stale_ms
+        self.rescan_ms = rescan_ms
+        self.rescan_cursor = 0             # 下一次从这条总线开始查找需要重新搜索的总线
+        self.cycles = 0                    # 完成的采集周期数
+        self.bad_reads = 0                 # 无效读数次数(含重试)
+        self.rescans = 0                   # 重新搜索次数
+
+    def set_resolution(self, bits):
+        """
+        调整分辨率(下一采集周期生效)，需要更快采样时降低分辨率
+
+        Returns:
+            bool: 分辨率是否有效
+        """
+        if bits not in CONVERSION_MS:
+            return False
+        self.resolution = bits
+        self.resolution_pending = True
+        return True
+
+    def set_interval(self, interval_ms):
+        """
+        调整采集间隔
+
+        Returns:
+            bool: 间隔是否有效(0 到 DS_INTERVAL_MAX_MS)
+        """
+        if not 0 <= interval_ms <= DS_INTERVAL_MAX_MS:
+            return False
+        self.interval_ms = interval_ms
+        return True
+
+    def conversion_ms(self):
+        """当前分辨率的转换等待时间(毫秒)"""
+        return CONVERSION_MS[self.resolution]
+
+    def start(self):
+        """搜索所有总线上的传感器，下一周期重新写入分辨率"""
+        self.resolution_pending = True
+        for bus in self.buses:
+            try:
+                bus.scan()
+            except onewire.OneWireError as e:
+                log_bus_error(bus.index + 1, e, key=bus.index)
+
+    def apply_resolution(self):
+        """把待生效的分辨率写入所有传感器"""
+        for bus in self.buses:
+            try:
+                bus.set_resolution(self.resolution)
+            except onewire.OneWireError as e:
+                log_bus_error(bus.index + 1, e, key=bus.index)
+        self.resolution_pending = False
+        log_resolution(self.resolution, self.conversion_ms())
+
+    def convert_all(self):
+        """
+        启动所有总线的温度转换
+
+        Returns:
+            int: 启动成功的总线数
+        """
+        started = 0
+        for bus in self.buses:
+            bus.converting = False
+            if not bus.roms:
+                continue
+            try:
+                bus.sensor.convert_temp()
+                bus.converting = True
+                started += 1
+            except onewire.OneWireError as e:
+                log_bus_error(bus.index + 1, e, key=bus.index)
+        return started
+
+    async def read_valid(self, bus, rom, stats):
+        """
+        读取一个传感器的有效温度，失败时按退避时间重试 DS_READ_RETRIES 次
+
+        Returns:
+            int: 温度原始值(1/16°C)，重试后仍无效返回None
+        """
+        delay = DS_RETRY_MS
+        for attempt in range(self.retries + 1):
+            result = bus.read_raw(rom)
+            if not isinstance(result, str):
+                return result
+            self.bad_reads += 1
+            if attempt < self.retries:
+                await stats.sleep_ms(delay)
+                delay *= 2
+        log_bad_read(bus.index + 1, result, self.retries, key=bus.index)
+        return None
+
+    async def collect(self, stats):
+        """读出所有已启动转换的传感器，只把有效读数写入设备温度，每次读取后让出事件循环"""
+        data_mgr = get_data_manager()
+        recorder = get_recorder()
+        for bus in self.buses:
+            bus.healthy = False
+            if not bus.converting:
+                continue
+            for rom in bus.roms:
+                raw = await self.read_valid(bus, rom, stats)
+                if raw is None:
+                    continue
+                bus.last_raw = raw
+                bus.healthy = True
+                bus.valid_ms = time.ticks_ms()
+                temp = raw / 16
+                if recorder.active:
+                    recorder.temp(bus.index, temp)
+
+                # 更新对应设备的温度数据
+                data_mgr.set_temp(bus.index, temp)
+                log_temp(bus.index + 1, temp, bus.pin, key=bus.index)
+                await stats.sleep_ms(0)
+
+    def check_stale(self):
+        """超过 DS_STALE_MS 没有有效读数的设备置故障标志，恢复有效读数后清除"""
+        data_mgr = get_data_manager()
+        now = time.ticks_ms()
+        for bus in self.buses:
+            if bus.healthy:
+                if bus.faulted:
+                    bus.faulted = False
+                    data_mgr.set_flag(bus.index, FLAG_FAULT, False)
+                    log_recovered(bus.index + 1)
+            elif not bus.faulted and time.ticks_diff(now, bus.valid_ms) > self.stale_ms:
+                bus.faulted = True
+                data_mgr.set_flag(bus.index, FLAG_FAULT, True)
+                log_stale(bus.index + 1, self.stale_ms)
+
+    def rescan_one(self):
+        """
+        重新搜索一条没有读到有效温度的总线(每周期最多一条，单总线搜索是阻塞操作)，
+        同一总线两次搜索至少间隔 DS_RESCAN_MS；搜索后重新写入分辨率(重新插入的探头恢复为12位)
+
+        Returns:
+            bool: 是否搜索了总线
+        """
+        now = time.ticks_ms()
+        n = len(self.buses)
+        for k in range(n):
+            bus = self.buses[(self.rescan_cursor + k) % n]
+            if bus.healthy or time.ticks_diff(now, bus.scanned_ms) < self.rescan_ms:
+                continue
+            self.rescan_cursor = (bus.index + 1) % n
+            self.rescans += 1
+            try:
+                bus.scan()
+                bus.set_resolution(self.resolution)
+            except onewire.OneWireError as e:
+                log_bus_error(bus.index + 1, e, key=bus.index)
+            return True
+        return False
+
+    async def cycle(self, stats):
+        """一个采集周期：统一启动转换，共同等待一次，再一轮读出；然后检查过期读数，必要时重新搜索一条总线"""
+        if self.resolution_pending:
+            self.apply_resolution()
+        if self.convert_all():
+            await stats.sleep_ms(self.conversion_ms())
+            await self.collect(stats)
+        else:
+            for bus in self.buses:
+                bus.healthy = False
+        self.check_stale()
+        if self.rescan_one():
+            await stats.sleep_ms(0)
+        self.cycles += 1
+
+
+# 全局温度采集引擎(dx_task 中创建)
+temp_engine = None
+
+
+def get_temp_engine():
+    """获取全局温度采集引擎，dx_task 启动前为None"""
+    return temp_engine
+
+
+async def temp_engine_task(engine):
     """
-    DS18B20温度读取任务
-    
+    DS18B20温度采集任务
+
     Args:
-        pin: GPIO引脚号
-        device_id: 设备ID ('device1' 或 'device2')
+        engine (TempEngine): 温度采集引擎(任务重启后沿用)
     """
-    # 获取数据管理器
-    data_mgr = get_data_manager()
-    
-    ds_pin = machine.Pin(pin)
-    ds_sensor = ds18x20.DS18X20(onewire.OneWire(ds_pin))
+    stats = register_task('ds')
+    engine.start()
 
-    roms = ds_sensor.scan()
-    print('Found DS devices: {} -> {}'.format(pin, roms))
+    while True:
+        await engine.cycle(stats)
+        await stats.sleep_ms(engine.interval_ms)
+
+
+async def dx_task():
+    """
+    温度读取主任务，按 config.DS_PINS 为所有设备创建一个采集引擎
+    默认GPIO9对应设备1，GPIO7对应设备2
+    """
+    global temp_engine
+    temp_engine = TempEngine(config.DS_PINS[:get_data_manager().device_count],
+                             config.DS_RESOLUTION, config.DS_INTERVAL_MS,
+                             config.DS_READ_RETRIES, config.DS_STALE_MS, config.DS_RESCAN_MS)
+    get_supervisor().add('ds', temp_engine_task, (temp_engine,), critical=True, deadline_ms=DS_DEADLINE_MS)
 
+    # 主协程挂起，不退出
     while True:
-        ds_sensor.convert_temp()
-        await asyncio.sleep_ms(750)
-        for rom in roms:
-            temp = ds_sensor.read_temp(rom)
-            print('DS{}温度: {:.2f}°C'.format(pin, temp))
-            
-            # 更新对应设备的温度数据
-            if device_id == 'device1':
-                data_mgr.device1_temp = temp
-                print('✅ 设备1温度已更新: {:.2f}°C'.format(temp))
-            elif device_id == 'device2':
-                data_mgr.device2_temp = temp
-                print('✅ 设备2温度已更新: {:.2f}°C'.format(temp))
-                
-        await asyncio.sleep(2)
-
-
-async def dx_task_1():
-    """设备1温度读取任务 (GPIO9)"""
-    await dx_read_task(9, 'device1')
-
-
-async def dx_task_2():
-    """设备2温度读取任务 (GPIO7)"""
-    await dx_read_task(7, 'device2')
\ No newline at end of file
+        await asyncio.sleep(10)
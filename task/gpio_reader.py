@@ -1,19 +1,35 @@
 import uasyncio as asyncio
 from machine import Pin
-from data.singleton_data import get_data_manager
+import config
+from data.singleton_data import get_data_manager, FLAG_WATER, FLAG_WARN
+from data.trace import get_recorder
+from data.task_stats import register_task
+from data.log import get_logger, DEBUG, INFO, WARN
+from task.supervisor import get_supervisor
 
+logger = get_logger()
 
-async def gpio_pin_reader(pin_number, device_id):
+log_level = logger.site(DEBUG, "GPIO {} 引脚电平: {} (水位状态: {})", 10000, config.DEVICE_COUNT)
+log_water_ok = logger.site(INFO, "✅ 设备{}水位状态已更新: 正常")
+log_water_bad = logger.site(WARN, "⚠️  设备{}水位异常 (GPIO {})")
+
+# 任务监控期限(毫秒)
+GPIO_DEADLINE_MS = 3000
+
+
+async def gpio_pin_reader(pin_number, index):
     """
     读取指定引脚的高低电平状态并更新设备水位状态
     高电平表示水位异常，低电平表示水位正常
     
     Args:
         pin_number: 要读取的引脚编号
-        device_id: 设备ID ('device1' 或 'device2')
+        index: 设备索引
     """
     # 获取数据管理器
     data_mgr = get_data_manager()
+    recorder = get_recorder()
+    stats = register_task('gpio{}'.format(index + 1))
     
     # 配置引脚为输入模式
     pin = Pin(pin_number, Pin.IN)
@@ -21,40 +37,38 @@ async def gpio_pin_reader(pin_number, device_id):
     while True:
         # 读取引脚状态
         state = pin.value()
+        if recorder.active:
+            recorder.gpio(index, state)
         # 高电平表示水位异常，低电平表示正常
         water_level_normal = not state  # 低电平为正常
         
-        # 打印引脚状态
-        level_status = "正常" if water_level_normal else "异常"
-        print("GPIO {} 引脚电平: {} (水位状态: {})".format(pin_number, "高" if state else "低", level_status))
+        # 记录引脚状态
+        log_level(pin_number, "高" if state else "低", "正常" if water_level_normal else "异常", key=index)
         
-        # 更新对应设备的水位和警告状态
-        if device_id == 'device1':
-            data_mgr.device1_water = water_level_normal
-            data_mgr.device1_warn = not water_level_normal  # 水位异常时设置警告
-            status_text = "正常" if water_level_normal else "异常"
-            print("✅ 设备1水位状态已更新: {}".format(status_text))
-        elif device_id == 'device2':
-            data_mgr.device2_water = water_level_normal
-            data_mgr.device2_warn = not water_level_normal  # 水位异常时设置警告
-            status_text = "正常" if water_level_normal else "异常"
-            print("✅ 设备2水位状态已更新: {}".format(status_text))
+        # 更新对应设备的水位和警告状态(水位异常时设置警告)，状态变化时记录
+        if water_level_normal:
+            if data_mgr.update_device(index, set_bits=FLAG_WATER, clear_bits=FLAG_WARN):
+                log_water_ok(index + 1)
+        else:
+            if data_mgr.update_device(index, set_bits=FLAG_WARN, clear_bits=FLAG_WATER):
+                log_water_bad(index + 1, pin_number)
             
         # 等待1秒
-        await asyncio.sleep(1)
+        await stats.sleep_ms(1000)
 
 
 async def gpio_reader_task():
     """
-    GPIO引脚读取任务，同时读取24号和8号引脚的电平状态
-    分别对应设备1和设备2的水位检测
+    GPIO引脚读取任务，按 config.WATER_PINS 读取各设备的水位检测引脚
+    默认24号引脚对应设备1，8号引脚对应设备2
     """
     print("🚀 GPIO引脚读取任务开始运行...")
     
-    # 创建读取24号引脚的任务 (对应设备1)
-    asyncio.create_task(gpio_pin_reader(24, 'device1'))
-    # 创建读取8号引脚的任务 (对应设备2)
-    asyncio.create_task(gpio_pin_reader(8, 'device2'))
+    # 每个设备创建一个读取任务(关键任务)
+    supervisor = get_supervisor()
+    for index, pin_number in enumerate(config.WATER_PINS[:get_data_manager().device_count]):
+        supervisor.add('gpio{}'.format(index + 1), gpio_pin_reader, (pin_number, index),
+                       critical=True, deadline_ms=GPIO_DEADLINE_MS)
     
     # 主协程挂起，不退出
     while True:
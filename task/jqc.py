@@ -1,13 +1,29 @@
 import uasyncio as asyncio
-from machine import Pin
-from data.singleton_data import get_data_manager
+import time
+import config
+from data.singleton_data import get_data_manager, FLAG_HEAT, FLAG_PUMP, FLAG_COOL
+from data.trace import output_pin
+from data.task_stats import register_task
+from data.log import get_logger, DEBUG, INFO
+from task.supervisor import get_supervisor
+
+logger = get_logger()
+
+# 继电器开关只在状态变化时记录；制冷循环的通断按设备限速
+log_relay = logger.site(INFO, "🔌 设备{}{}继电器 {}")
+log_cool_cycle = logger.site(DEBUG, "🔌 设备{}制冷继电器 {}", 10000, config.DEVICE_COUNT)
+
+# 无状态变化时重新输出继电器状态的周期(毫秒)，同时向任务监控报告运行
+RELAY_REFRESH_MS = 1000
+# 任务监控期限(毫秒)
+JQC_DEADLINE_MS = 3000
 
 
 # ---------------- JQC继电器控制任务 ----------------
 async def jqc_control_task():
     """JQC继电器控制任务，根据设备状态控制对应的继电器
     
-    引脚分配：
+    引脚分配见 config.*_RELAY_PINS，默认：
     - 14: 设备1制冷 (特殊：通电0.5s断电2s循环)
     - 15: 设备2制冷 (特殊：通电0.5s断电2s循环)
     - 17: 设备1制热
@@ -18,102 +34,103 @@ async def jqc_control_task():
     # 获取数据管理器
     data_mgr = get_data_manager()
     
-    # 初始化继电器引脚
-    relay_pins = {
-        'device1_cool': Pin(14, Pin.OUT),  # 设备1制冷
-        'device2_cool': Pin(15, Pin.OUT),  # 设备2制冷
-        'device1_heat': Pin(17, Pin.OUT),  # 设备1制热
-        'device2_heat': Pin(18, Pin.OUT),  # 设备2制热
-        'device1_pump': Pin(19, Pin.OUT),  # 设备1水泵
-        'device2_pump': Pin(20, Pin.OUT)   # 设备2水泵
-    }
+    # 初始化继电器引脚(按设备索引排列)
+    cool_pins = [output_pin(pin) for pin in config.COOL_RELAY_PINS]
+    heat_pins = [output_pin(pin) for pin in config.HEAT_RELAY_PINS]
+    pump_pins = [output_pin(pin) for pin in config.PUMP_RELAY_PINS]
+    device_count = min(data_mgr.device_count, len(cool_pins), len(heat_pins), len(pump_pins))
     
     # 上电初始化：所有继电器重置为低电平(关闭)
-    for pin in relay_pins.values():
+    for pin in cool_pins + heat_pins + pump_pins:
         pin.value(0)
     print("✅ 所有继电器已初始化为关闭状态")
     
-    # 特殊继电器状态跟踪(用于14和15的循环控制)
-    cool_cycle_state = {
-        'device1_cool': False,  # False表示等待通电，True表示等待断电
-        'device2_cool': False
-    }
+    # 特殊继电器状态跟踪(用于制冷继电器的循环控制)
+    # False表示等待通电，True表示等待断电
+    cool_cycle_state = [False] * device_count
     
-    while True:
-        # 处理设备1制冷继电器(14号引脚) - 特殊循环控制
-        if data_mgr.device1_cool:
-            if not cool_cycle_state['device1_cool']:  # 等待通电阶段
-                relay_pins['device1_cool'].value(1)
-                cool_cycle_state['device1_cool'] = True
-                print("🔌 设备1制冷继电器(14) 通电")
-            else:  # 等待断电阶段
-                relay_pins['device1_cool'].value(0)
-                cool_cycle_state['device1_cool'] = False
-                print("🔌 设备1制冷继电器(14) 断电")
-        else:
-            # 制冷关闭时，确保继电器为低电平
-            relay_pins['device1_cool'].value(0)
-            cool_cycle_state['device1_cool'] = False
-            print("🔌 设备1制冷继电器(14) 关闭")
-        
-        # 处理设备2制冷继电器(15号引脚) - 特殊循环控制
-        if data_mgr.device2_cool:
-            if not cool_cycle_state['device2_cool']:  # 等待通电阶段
-                relay_pins['device2_cool'].value(1)
-                cool_cycle_state['device2_cool'] = True
-                print("🔌 设备2制冷继电器(15) 通电")
-            else:  # 等待断电阶段
-                relay_pins['device2_cool'].value(0)
-                cool_cycle_state['device2_cool'] = False
-                print("🔌 设备2制冷继电器(15) 断电")
-        else:
-            # 制冷关闭时，确保继电器为低电平
-            relay_pins['device2_cool'].value(0)
-            cool_cycle_state['device2_cool'] = False
-            print("🔌 设备2制冷继电器(15) 关闭")
-        
-        # 处理设备1制热继电器(17号引脚) - 普通开关控制
-        if data_mgr.device1_heat:
-            relay_pins['device1_heat'].value(1)
-            print("🔌 设备1制热继电器(17) 开启")
-        else:
-            relay_pins['device1_heat'].value(0)
-            print("🔌 设备1制热继电器(17) 关闭")
-        
-        # 处理设备2制热继电器(18号引脚) - 普通开关控制
-        if data_mgr.device2_heat:
-            relay_pins['device2_heat'].value(1)
-            print("🔌 设备2制热继电器(18) 开启")
-        else:
-            relay_pins['device2_heat'].value(0)
-            print("🔌 设备2制热继电器(18) 关闭")
-        
-        # 处理设备1水泵继电器(19号引脚) - 普通开关控制
-        if data_mgr.device1_pump:
-            relay_pins['device1_pump'].value(1)
-            print("🔌 设备1水泵继电器(19) 开启")
-        else:
-            relay_pins['device1_pump'].value(0)
-            print("🔌 设备1水泵继电器(19) 关闭")
-        
-        # 处理设备2水泵继电器(20号引脚) - 普通开关控制
-        if data_mgr.device2_pump:
-            relay_pins['device2_pump'].value(1)
-            print("🔌 设备2水泵继电器(20) 开启")
-        else:
-            relay_pins['device2_pump'].value(0)
-            print("🔌 设备2水泵继电器(20) 关闭")
-        
-        # 等待0.5秒后检查下一个循环
-        await asyncio.sleep(0.5)
+    # 制冷循环上次步进的时刻(ticks_ms)，None表示循环未运行
+    cool_last_step = [None] * device_count
+    
+    # 制冷循环步进周期(毫秒)
+    cool_step_ms = 500
+    
+    # 制热/水泵继电器当前状态(用于只在变化时记录日志)
+    heat_states = bytearray(device_count)
+    pump_states = bytearray(device_count)
+    
+    # 继电器相关状态变化时立即唤醒
+    sub = data_mgr.subscribe(None, FLAG_HEAT | FLAG_PUMP | FLAG_COOL)
+    
+    # 运行统计：唤醒延迟即状态变化到继电器动作的延迟
+    stats = register_task('jqc')
+    
+    try:
+        while True:
+            now = time.ticks_ms()
+            
+            for index in range(device_count):
+                flags = data_mgr.flags[index]
+                
+                # 处理制冷继电器 - 特殊循环控制
+                cool_pin = cool_pins[index]
+                if flags & FLAG_COOL:
+                    # 制冷刚开启时立即通电，之后每500ms步进一次
+                    last_step = cool_last_step[index]
+                    if last_step is None:
+                        log_relay(index + 1, "制冷", "开启")
+                    if last_step is None or time.ticks_diff(now, last_step) >= cool_step_ms:
+                        cool_last_step[index] = now
+                        if not cool_cycle_state[index]:  # 等待通电阶段
+                            cool_pin.value(1)
+                            cool_cycle_state[index] = True
+                            log_cool_cycle(index + 1, "通电", key=index)
+                        else:  # 等待断电阶段
+                            cool_pin.value(0)
+                            cool_cycle_state[index] = False
+                            log_cool_cycle(index + 1, "断电", key=index)
+                else:
+                    # 制冷关闭时，确保继电器为低电平
+                    cool_pin.value(0)
+                    if cool_last_step[index] is not None:
+                        log_relay(index + 1, "制冷", "关闭")
+                    cool_cycle_state[index] = False
+                    cool_last_step[index] = None
+                
+                # 处理制热继电器 - 普通开关控制
+                heat = 1 if flags & FLAG_HEAT else 0
+                heat_pins[index].value(heat)
+                if heat != heat_states[index]:
+                    heat_states[index] = heat
+                    log_relay(index + 1, "制热", "开启" if heat else "关闭")
+                
+                # 处理水泵继电器 - 普通开关控制
+                pump = 1 if flags & FLAG_PUMP else 0
+                pump_pins[index].value(pump)
+                if pump != pump_states[index]:
+                    pump_states[index] = pump
+                    log_relay(index + 1, "水泵", "开启" if pump else "关闭")
+            
+            # 有制冷循环在运行：等到下一个步进时刻；否则等待状态变化，最长 RELAY_REFRESH_MS
+            timeout_ms = RELAY_REFRESH_MS
+            now = time.ticks_ms()
+            for last_step in cool_last_step:
+                if last_step is not None:
+                    remaining = max(cool_step_ms - time.ticks_diff(now, last_step), 0)
+                    if remaining < timeout_ms:
+                        timeout_ms = remaining
+            await stats.wait(sub, timeout_ms)
+    finally:
+        # 任务退出(如被监督器重启)时取消订阅，重启后的任务会重新订阅
+        data_mgr.unsubscribe(sub)
 
 
 async def jqc_task():
     """主函数，启动JQC继电器控制任务"""
     print("🚀 JQC继电器控制系统开始运行...")
 
-    # 启动继电器控制任务
-    asyncio.create_task(jqc_control_task())
+    # 启动继电器控制任务(关键任务：停止运行时看门狗复位)
+    get_supervisor().add('jqc', jqc_control_task, critical=True, deadline_ms=JQC_DEADLINE_MS)
 
     # 主协程挂起，不退出
     while True:
@@ -1,13 +1,25 @@
 import uasyncio as asyncio
-from machine import Pin
-from data.singleton_data import get_data_manager
+import config
+from data.singleton_data import get_data_manager, FLAG_WARN, FLAG_ALARM
+from data.trace import output_pin
+from data.task_stats import register_task
+from data.log import get_logger, DEBUG
+from task.supervisor import get_supervisor
+
+logger = get_logger()
+
+# 闪烁和熄灭按设备限速记录
+log_warn_blink = logger.site(DEBUG, "⚠️  设备{}警告灯闪烁({})", 10000, config.DEVICE_COUNT)
+log_warn_off = logger.site(DEBUG, "⚠️  设备{}警告灯熄灭", 10000, config.DEVICE_COUNT)
+log_alarm_blink = logger.site(DEBUG, "🚨 设备{}报警灯闪烁({})", 10000, config.DEVICE_COUNT)
+log_alarm_off = logger.site(DEBUG, "🚨 设备{}报警灯熄灭", 10000, config.DEVICE_COUNT)
 
 
 # ---------------- LED状态控制任务 ----------------
 async def led_control_task():
     """LED状态控制任务，根据设备状态控制警告和报警灯
     
-    引脚分配：
+    引脚分配见 config.WARN_LED_PINS / config.ALARM_LED_PINS，默认：
     - 2:  设备1警告灯
     - 29: 设备2警告灯
     - 3:  设备1报警灯
@@ -16,93 +28,78 @@ async def led_control_task():
     # 获取数据管理器
     data_mgr = get_data_manager()
     
-    # 初始化LED引脚
-    warning_leds = {
-        'device1_warn': Pin(2, Pin.OUT),   # 设备1警告灯
-        'device2_warn': Pin(29, Pin.OUT)   # 设备2警告灯
-    }
-    
-    alarm_leds = {
-        'device1_alarm': Pin(3, Pin.OUT),  # 设备1报警灯
-        'device2_alarm': Pin(28, Pin.OUT)  # 设备2报警灯
-    }
+    # 初始化LED引脚(按设备索引排列)
+    warning_leds = [output_pin(pin) for pin in config.WARN_LED_PINS]
+    alarm_leds = [output_pin(pin) for pin in config.ALARM_LED_PINS]
+    device_count = min(data_mgr.device_count, len(warning_leds), len(alarm_leds))
     
     # 上电初始化：所有LED重置为低电平(熄灭)
-    for led in list(warning_leds.values()) + list(alarm_leds.values()):
+    for led in warning_leds + alarm_leds:
         led.value(0)
     print("✅ 所有LED已初始化为熄灭状态")
     
     # 闪烁状态跟踪
-    blink_state = {
-        'device1_warn': False,
-        'device2_warn': False,
-        'device1_alarm': False,
-        'device2_alarm': False
-    }
+    warn_blink = bytearray(device_count)
+    alarm_blink = bytearray(device_count)
     
-    while True:
-        # 处理设备1警告灯(2号引脚)
-        if data_mgr.device1_warn:
-            # 警告状态：慢速闪烁(1秒亮1秒灭)
-            warning_leds['device1_warn'].value(blink_state['device1_warn'])
-            blink_state['device1_warn'] = not blink_state['device1_warn']
-            if blink_state['device1_warn']:
-                print("⚠️  设备1警告灯闪烁(亮)")
-            else:
-                print("⚠️  设备1警告灯闪烁(灭)")
-        else:
-            # 无警告：保持熄灭
-            warning_leds['device1_warn'].value(0)
-            blink_state['device1_warn'] = False
-            print("⚠️  设备1警告灯熄灭")
-        
-        # 处理设备2警告灯(29号引脚)
-        if data_mgr.device2_warn:
-            # 警告状态：慢速闪烁(1秒亮1秒灭)
-            warning_leds['device2_warn'].value(blink_state['device2_warn'])
-            blink_state['device2_warn'] = not blink_state['device2_warn']
-            if blink_state['device2_warn']:
-                print("⚠️  设备2警告灯闪烁(亮)")
-            else:
-                print("⚠️  设备2警告灯闪烁(灭)")
-        else:
-            # 无警告：保持熄灭
-            warning_leds['device2_warn'].value(0)
-            blink_state['device2_warn'] = False
-            print("⚠️  设备2警告灯熄灭")
-        
-        # 处理设备1报警灯(3号引脚)
-        if data_mgr.device1_alarm:
-            # 报警状态：快速闪烁(0.3秒亮0.3秒灭)
-            alarm_leds['device1_alarm'].value(blink_state['device1_alarm'])
-            blink_state['device1_alarm'] = not blink_state['device1_alarm']
-            if blink_state['device1_alarm']:
-                print("🚨 设备1报警灯快速闪烁(亮)")
-            else:
-                print("🚨 设备1报警灯快速闪烁(灭)")
-        else:
-            # 无报警：保持熄灭
-            alarm_leds['device1_alarm'].value(0)
-            blink_state['device1_alarm'] = False
-            print("🚨 设备1报警灯熄灭")
-        
-        # 处理设备2报警灯(28号引脚)
-        if data_mgr.device2_alarm:
-            # 报警状态：快速闪烁(0.3秒亮0.3秒灭)
-            alarm_leds['device2_alarm'].value(blink_state['device2_alarm'])
-            blink_state['device2_alarm'] = not blink_state['device2_alarm']
-            if blink_state['device2_alarm']:
-                print("🚨 设备2报警灯快速闪烁(亮)")
+    # 上次处理时各设备的数据版本
+    last_versions = [None] * device_count
+    
+    # 警告/报警状态变化时立即唤醒
+    sub = data_mgr.subscribe(None, FLAG_WARN | FLAG_ALARM)
+    stats = register_task('led')
+    
+    try:
+        while True:
+            blinking = False
+            for index in range(device_count):
+                warn = data_mgr.get_flag(index, FLAG_WARN)
+                alarm = data_mgr.get_flag(index, FLAG_ALARM)
+                blinking = blinking or warn or alarm
+                
+                # 数据无变化且没有灯在闪烁：LED保持现状，不写引脚
+                version = data_mgr.get_version(index)
+                if version == last_versions[index] and not warn and not alarm:
+                    continue
+                last_versions[index] = version
+                
+                # 警告状态：慢速闪烁(1秒亮1秒灭)
+                drive_blink_led(warning_leds[index], warn_blink, index, warn, log_warn_blink, log_warn_off)
+                
+                # 报警状态：快速闪烁
+                drive_blink_led(alarm_leds[index], alarm_blink, index, alarm, log_alarm_blink, log_alarm_off)
+            
+            # 有灯在闪烁：1秒后翻转；否则一直等待状态变化
+            if blinking:
+                await stats.wait(sub, 1000)
             else:
-                print("🚨 设备2报警灯快速闪烁(灭)")
-        else:
-            # 无报警：保持熄灭
-            alarm_leds['device2_alarm'].value(0)
-            blink_state['device2_alarm'] = False
-            print("🚨 设备2报警灯熄灭")
-        
-        # 警告灯闪烁周期：1秒
-        await asyncio.sleep(1)
+                await stats.wait(sub)
+    finally:
+        # 任务退出(如被监督器重启)时取消订阅，重启后的任务会重新订阅
+        data_mgr.unsubscribe(sub)
+
+
+def drive_blink_led(led, blink_state, key, active, log_blink, log_off):
+    """
+    驱动单个闪烁指示灯
+    
+    Args:
+        led: LED引脚对象
+        blink_state (bytearray): 闪烁状态表
+        key (int): 闪烁状态索引(设备索引)
+        active (bool): 是否处于警告/报警状态
+        log_blink (LogSite): 闪烁日志调用点
+        log_off (LogSite): 熄灭日志调用点
+    """
+    if active:
+        led.value(blink_state[key])
+        blink_state[key] ^= 1
+        log_blink(key + 1, "亮" if blink_state[key] else "灭", key=key)
+    else:
+        # 无警告/报警：保持熄灭
+        led.value(0)
+        blink_state[key] = 0
+        log_off(key + 1, key=key)
 
 
 async def led_task():
@@ -110,7 +107,7 @@ async def led_task():
     print("🚀 LED状态控制系统开始运行...")
 
     # 启动LED控制任务
-    asyncio.create_task(led_control_task())
+    get_supervisor().add('led', led_control_task)
 
     # 主协程挂起，不退出
     while True:
@@ -1,30 +1,243 @@
 import uasyncio as asyncio
-from machine import Pin, Timer
+import machine
+import time
+from array import array
+from machine import Pin
+import config
 from data.singleton_data import get_data_manager
+from data.trace import get_recorder
+from data.task_stats import register_task
+from data.log import get_logger, DEBUG
+from task.supervisor import get_supervisor
+
+try:
+    import rp2
+except ImportError:
+    rp2 = None
+
+logger = get_logger()
+
+log_flow = logger.site(DEBUG, "💧 设备{}流量 - 流速: {:.2f} L/min, 累计: {:.2f} L", 10000, config.DEVICE_COUNT)
+log_idle = logger.site(DEBUG, "💧 设备{}流量传感器待机 - 无流量", 60000, config.DEVICE_COUNT)
+
+# 任务监控期限(毫秒)：按轮询周期计算，FLOW_UPDATE_MS 调大后不会被误判为停滞
+PULSE_DEADLINE_MS = 3 * config.FLOW_UPDATE_MS
+
+
+class IrqPulseSource:
+    """中断计数后端 - 每个上升沿在硬中断中计数一次(PIO不可用时的后备)"""
+    
+    def __init__(self, pin):
+        self.pin = pin
+        self.count = 0
+    
+    def _callback(self, pin):
+        # 硬中断：只做整数加法，不分配内存
+        self.count += 1
+    
+    def start(self):
+        self.pin.irq(trigger=Pin.IRQ_RISING, handler=self._callback, hard=True)
+    
+    def stop(self):
+        self.pin.irq(handler=None)
+    
+    def peek(self):
+        """上次取出后的脉冲数"""
+        return self.count
+    
+    def take(self):
+        """取出上次取出后的脉冲数并清零"""
+        state = machine.disable_irq()
+        count = self.count
+        self.count = 0
+        machine.enable_irq(state)
+        return count
+
+
+class StampedPulseSource:
+    """时间戳后端 - 硬中断把每个上升沿的时刻(ticks_us)写入固定大小的环形缓冲区，供周期测量使用"""
+    
+    def __init__(self, pin, size=16, stale_ms=3000):
+        """
+        Args:
+            pin: 脉冲输入引脚
+            size (int): 环形缓冲区条数(2的幂)
+            stale_ms (int): 与上个脉冲间隔超过该时间(毫秒)时丢弃之前的时间戳
+        """
+        self.pin = pin
+        self.stamps = array('I', [0] * size)
+        self.mask = size - 1
+        self.head = 0              # 下一个写入位置
+        self.filled = 0            # 有效时间戳条数(最多 size)
+        self.count = 0
+        self.stale_ms = stale_ms
+        self.last_ms = time.ticks_ms()   # 最新脉冲的时刻(ticks_ms)
+    
+    def _callback(self, pin):
+        # 硬中断：ticks_us 是小整数，写入数组不分配内存
+        # ticks_us 约1074秒回绕，长时间无脉冲后按毫秒时钟判断旧时间戳已失效
+        now_ms = time.ticks_ms()
+        if time.ticks_diff(now_ms, self.last_ms) > self.stale_ms:
+            self.filled = 0
+        self.last_ms = now_ms
+        i = self.head
+        self.stamps[i] = time.ticks_us()
+        self.head = (i + 1) & self.mask
+        if self.filled <= self.mask:
+            self.filled += 1
+        self.count += 1
+    
+    def start(self):
+        self.pin.irq(trigger=Pin.IRQ_RISING, handler=self._callback, hard=True)
+    
+    def stop(self):
+        self.pin.irq(handler=None)
+    
+    def peek(self):
+        """上次取出后的脉冲数"""
+        return self.count
+    
+    def take(self):
+        """取出上次取出后的脉冲数并清零"""
+        state = machine.disable_irq()
+        count = self.count
+        self.count = 0
+        machine.enable_irq(state)
+        return count
+    
+    def clear(self):
+        """丢弃已记录的时间戳(零流量后重新开始测量周期)"""
+        state = machine.disable_irq()
+        self.head = 0
+        self.filled = 0
+        machine.enable_irq(state)
+    
+    def average_period_us(self, window_us):
+        """
+        最近脉冲的平均周期：窗口内最新与最早时间戳之差除以间隔数，至少使用最新的两个时间戳
+        
+        Args:
+            window_us (int): 滑动窗口(微秒)
+            
+        Returns:
+            tuple: (平均周期微秒，不足两个脉冲时为0, 距最新脉冲的微秒数)
+        """
+        stamps = self.stamps
+        mask = self.mask
+        state = machine.disable_irq()
+        head = self.head
+        n = self.filled
+        newest = stamps[(head - 1) & mask]
+        oldest = newest
+        k = 1
+        while k < n:
+            t = stamps[(head - 1 - k) & mask]
+            if k >= 2 and time.ticks_diff(newest, t) > window_us:
+                break
+            oldest = t
+            k += 1
+        machine.enable_irq(state)
+        since_last = time.ticks_diff(time.ticks_us(), newest)
+        if k < 2:
+            return 0, since_last
+        return time.ticks_diff(newest, oldest) // (k - 1), since_last
+
+
+if rp2 is not None:
+    @rp2.asm_pio()
+    def pulse_counter_pio():
+        # 每个上升沿X减1(X从0开始向下回绕)，CPU读取时 -X 即累计脉冲数
+        wrap_target()
+        wait(0, pin, 0)
+        wait(1, pin, 0)
+        jmp(x_dec, "next")
+        label("next")
+        wrap()
+
+
+class PioPulseSource:
+    """PIO计数后端 - 状态机在硬件中计数上升沿，CPU每个测量周期读取一次"""
+    
+    def __init__(self, pin, sm_id):
+        self.sm = rp2.StateMachine(sm_id, pulse_counter_pio, in_base=pin)
+        self.sm.exec("set(x, 0)")
+        self.last = 0              # 上次取出时的累计计数
+    
+    def start(self):
+        self.sm.active(1)
+    
+    def stop(self):
+        self.sm.active(0)
+    
+    def total(self):
+        """状态机的累计计数(32位回绕)"""
+        sm = self.sm
+        sm.exec("mov(isr, x)")
+        sm.exec("push()")
+        return -sm.get() & 0xFFFFFFFF
+    
+    def peek(self):
+        """上次取出后的脉冲数"""
+        return (self.total() - self.last) & 0xFFFFFFFF
+    
+    def take(self):
+        """取出上次取出后的脉冲数"""
+        total = self.total()
+        count = (total - self.last) & 0xFFFFFFFF
+        self.last = total
+        return count
 
 
 class PulseCounter:
-    """脉冲计数器类，用于读取ZJS201流量传感器的脉冲信号"""
+    """脉冲计数器类，用于读取ZJS201流量传感器的脉冲信号
+    
+    计数后端: 'pio' 由RP2040的PIO状态机在硬件中计数，'irq' 每个脉冲一次中断；
+    PIO不可用(非RP2040或状态机已被占用)时自动使用中断计数
     
-    def __init__(self, pin_number=11):
+    测量方式: 'count' 按测量间隔内的脉冲数计算流速(分辨率为 60/每升脉冲数/间隔 L/min)；
+    'period' 按滑动窗口内的平均脉冲周期计算，低流速下也能快速精确读数，
+    超过 zero_timeout_ms 没有脉冲时流速为0。周期测量需要每个脉冲的时刻，使用中断时间戳后端
+    """
+    
+    def __init__(self, pin_number=11, backend='pio', sm_id=0, mode='count',
+                 window_ms=2000, zero_timeout_ms=3000, device=0, pulses_per_liter=450):
         """
         初始化脉冲计数器
         
         Args:
             pin_number (int): 脉冲输入引脚编号，默认为11号引脚
+            backend (str): 计数后端 'pio' 或 'irq'
+            sm_id (int): PIO后端使用的状态机编号(0-7)
+            mode (str): 测量方式 'count' 或 'period'
+            window_ms (int): 周期测量的滑动窗口(毫秒)
+            zero_timeout_ms (int): 周期测量时判定零流量的无脉冲时间(毫秒)
+            device (int): 流量计所属的设备索引
+            pulses_per_liter (float): 每升对应的脉冲数(校准值)
         """
         self.pin_number = pin_number
-        self.pulse_count = 0           # 脉冲计数
-        self.last_pulse_time = 0       # 上次脉冲时间
+        self.device = device
+        self.mode = mode
+        self.last_pulses = 0           # 上一个测量周期的脉冲数
+        self.total_pulses = 0          # 累计脉冲数(用于累计流量)
         self.flow_rate = 0.0           # 当前流速 (L/min)
-        self.timer = None              # 定时器对象
+        self.source = None             # 计数后端
         
         # ZJS201流量传感器参数
-        self.pulses_per_liter = 450    # 每升对应的脉冲数 (根据ZJS201规格)
+        self.pulses_per_liter = pulses_per_liter   # 每升对应的脉冲数 (ZJS201规格为450，按实测校准)
         self.measurement_interval = 1  # 测量间隔(秒)
         
-        # 初始化引脚
+        # 周期测量参数
+        self.window_us = window_ms * 1000
+        self.zero_timeout_ms = zero_timeout_ms
+        self.last_edge_ms = time.ticks_add(time.ticks_ms(), -zero_timeout_ms)   # 最近一次有脉冲的测量时刻
+        
+        # 初始化引脚和计数后端
         self.setup_pin()
+        if mode == 'period':
+            self.source = StampedPulseSource(self.pulse_pin, stale_ms=zero_timeout_ms)
+            self.backend = 'stamp'
+        else:
+            self.setup_source(backend, sm_id)
         
     def setup_pin(self):
         """配置脉冲输入引脚"""
@@ -36,54 +249,78 @@ class PulseCounter:
             print(f"❌ 脉冲计数引脚初始化失败: {e}")
             raise
     
-    def pulse_callback(self, pin):
-        """
-        脉冲中断回调函数
-        
-        Args:
-            pin: 触发中断的引脚对象
-        """
-        # 增加脉冲计数
-        self.pulse_count += 1
-        
-        # 记录当前时间
-        import time
-        current_time = time.ticks_ms()
-        
-        # 计算脉冲频率(可选)
-        if self.last_pulse_time > 0:
-            interval = time.ticks_diff(current_time, self.last_pulse_time)
-            # 可以在这里计算瞬时频率
-            pass
-            
-        self.last_pulse_time = current_time
+    def setup_source(self, backend, sm_id):
+        """创建计数后端，PIO不可用时使用中断计数"""
+        if backend == 'pio' and rp2 is not None:
+            try:
+                self.source = PioPulseSource(self.pulse_pin, sm_id)
+                self.backend = 'pio'
+                return
+            except (OSError, ValueError) as e:
+                print(f"⚠️  PIO计数不可用，改用中断计数: {e}")
+        self.source = IrqPulseSource(self.pulse_pin)
+        self.backend = 'irq'
     
     def calculate_flow_rate(self):
         """计算流速"""
         # 计算每分钟流速 (L/min)
         # 脉冲数 / 每升脉冲数 * 60秒 / 测量间隔
-        pulses_per_interval = self.pulse_count
-        self.flow_rate = (pulses_per_interval / self.pulses_per_liter) * (60 / self.measurement_interval)
-        
-        # 重置脉冲计数
-        self.pulse_count = 0
+        pulses_per_interval = self.source.take()
+        self.last_pulses = pulses_per_interval
+        self.total_pulses += pulses_per_interval
+        if self.mode == 'period':
+            self.flow_rate = self.period_flow_rate(pulses_per_interval)
+        else:
+            self.flow_rate = (pulses_per_interval / self.pulses_per_liter) * (60 / self.measurement_interval)
         
         return self.flow_rate
     
+    def period_flow_rate(self, pulses):
+        """
+        按平均脉冲周期计算流速
+        
+        Args:
+            pulses (int): 本测量周期的脉冲数
+            
+        Returns:
+            float: 流速 (L/min)
+        """
+        now = time.ticks_ms()
+        if pulses:
+            self.last_edge_ms = now
+        elif time.ticks_diff(now, self.last_edge_ms) >= self.zero_timeout_ms:
+            # 超时没有脉冲：真正的零流量，旧时间戳不再参与之后的周期计算
+            self.source.clear()
+            return 0.0
+        period_us, since_last = self.source.average_period_us(self.window_us)
+        if period_us <= 0:
+            return 0.0
+        # 距最新脉冲已超过平均周期：流速正在下降，按这段时间估计
+        if since_last > period_us:
+            period_us = since_last
+        return 60000000 / (period_us * self.pulses_per_liter)
+    
+    def get_volume(self):
+        """
+        获取累计流量
+        
+        Returns:
+            float: 自启动以来的累计流量 (L)
+        """
+        return self.total_pulses / self.pulses_per_liter
+    
     def start_counting(self):
         """开始脉冲计数"""
         try:
-            # 设置上升沿中断触发
-            self.pulse_pin.irq(trigger=Pin.IRQ_RISING, handler=self.pulse_callback)
-            print(f"🚀 脉冲计数已启动 - 监听GPIO{self.pin_number}")
+            self.source.start()
+            print(f"🚀 脉冲计数已启动({self.backend}) - 监听GPIO{self.pin_number}")
         except Exception as e:
             print(f"❌ 启动脉冲计数失败: {e}")
     
     def stop_counting(self):
         """停止脉冲计数"""
         try:
-            # 禁用中断
-            self.pulse_pin.irq(handler=None)
+            self.source.stop()
             print("🛑 脉冲计数已停止")
         except Exception as e:
             print(f"❌ 停止脉冲计数失败: {e}")
@@ -102,52 +339,96 @@ class PulseCounter:
         获取当前脉冲计数
         
         Returns:
-            int: 脉冲计数
+            int: 上次计算流速后的脉冲数
         """
-        return self.pulse_count
+        return self.source.peek()
+
+
+def create_meters():
+    """
+    按 config.FLOW_METERS 创建流量计，第i个流量计使用第i个PIO状态机
+    
+    Returns:
+        list: PulseCounter 列表
+    """
+    meters = []
+    for sm_id, (pin, device, pulses_per_liter) in enumerate(config.FLOW_METERS):
+        meter = PulseCounter(pin_number=pin, backend=config.FLOW_BACKEND, sm_id=sm_id, mode=config.FLOW_MODE,
+                             window_ms=config.FLOW_WINDOW_MS, zero_timeout_ms=config.FLOW_ZERO_TIMEOUT_MS,
+                             device=device, pulses_per_liter=pulses_per_liter)
+        meter.measurement_interval = config.FLOW_UPDATE_MS / 1000
+        meters.append(meter)
+    return meters
 
 
-async def pulse_monitor_task():
-    """脉冲监测任务 - 每秒计算并更新流速数据"""
-    print("🚀 脉冲流量监测任务开始运行(1秒刷新)...")
+async def pulse_monitor_task(meters):
+    """
+    脉冲监测任务 - 一个协程按 FLOW_UPDATE_MS 轮询所有流量计，更新各设备的流速和累计流量
     
-    # 创建脉冲计数器实例
-    pulse_counter = PulseCounter(pin_number=11)
+    Args:
+        meters (list): PulseCounter 列表(任务重启后沿用，累计流量不清零)
+    """
+    print("🚀 脉冲流量监测任务开始运行({}个流量计, {}ms刷新, {}测量)...".format(
+        len(meters), config.FLOW_UPDATE_MS, config.FLOW_MODE))
     
     # 获取数据管理器
     data_manager = get_data_manager()
+    recorder = get_recorder()
+    stats = register_task('pulse')
+    
+    # 各设备的流速和累计流量(同一设备有多个流量计时相加)
+    n = data_manager.device_count
+    flows = [0.0] * n
+    volumes = [0.0] * n
+    # 只更新装有流量计的设备，其余设备保留主机下发的流速
+    metered = sorted(set(meter.device for meter in meters))
     
     # 开始脉冲计数
-    pulse_counter.start_counting()
+    for meter in meters:
+        meter.start_counting()
     
     try:
         while True:
-            # 每秒刷新一次流速数据
-            await asyncio.sleep(1)
+            # 按 FLOW_UPDATE_MS 刷新流速数据
+            await stats.sleep_ms(config.FLOW_UPDATE_MS)
             
-            # 计算并更新流速
-            current_flow = pulse_counter.calculate_flow_rate()
-            data_manager.shared_flow = current_flow
+            for index in metered:
+                flows[index] = 0.0
+                volumes[index] = 0.0
+            for channel, meter in enumerate(meters):
+                flows[meter.device] += meter.calculate_flow_rate()
+                volumes[meter.device] += meter.get_volume()
+                if recorder.active:
+                    recorder.pulses(meter.last_pulses, channel)
+            
+            # 所有设备的变化一次提交
+            data_manager.begin_batch()
+            try:
+                for index in metered:
+                    data_manager.update_flow(index, flows[index], volumes[index])
+            finally:
+                data_manager.end_batch()
             
             # 输出调试信息
-            if current_flow > 0:
-                print(f"💧 流量数据更新 - 流速: {current_flow:.2f} L/min")
-            else:
-                print(f"💧 流量传感器待机 - 无流量")
-                
-    except Exception as e:
-        print(f"❌ 脉冲监测任务错误: {e}")
+            for index in metered:
+                if flows[index] > 0:
+                    log_flow(index + 1, flows[index], volumes[index], key=index)
+                else:
+                    log_idle(index + 1, key=index)
+    
     finally:
-        # 清理资源
-        pulse_counter.stop_counting()
+        # 清理资源；异常交给任务监控记录并重启
+        for meter in meters:
+            meter.stop_counting()
 
 
 async def pulse_counter_task():
     """主脉冲计数任务函数"""
     print("🚀 ZJS201脉冲计数任务启动...")
     
-    # 启动脉冲监测任务
-    asyncio.create_task(pulse_monitor_task())
+    # 流量计只创建一次，启动脉冲监测任务(关键任务)
+    meters = create_meters()
+    get_supervisor().add('pulse', pulse_monitor_task, (meters,), critical=True, deadline_ms=PULSE_DEADLINE_MS)
     
     # 主协程挂起，不退出
     while True:
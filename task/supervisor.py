@@ -0,0 +1,172 @@
+"""
+任务监控
+按名称登记任务并启动；任务抛出异常或退出时按退避时间重启，重启次数记入任务运行统计。
+关键任务(继电器、传感器)须在各自的期限内完成运行(任务运行统计的 progress_ms)，
+全部按时才喂看门狗：关键任务停止运行或事件循环卡死时，看门狗超时复位整板
+"""
+
+import uasyncio as asyncio
+import machine
+import time
+
+import config
+from data.task_stats import register_task
+from data.log import get_logger, INFO, WARN, ERROR
+
+logger = get_logger()
+
+log_failed = logger.site(ERROR, "❌ 任务{}异常退出: {}，{}ms后重启")
+log_stale = logger.site(ERROR, "⏰ 任务{}超过{}ms没有运行，重启")
+log_starving = logger.site(WARN, "🐕 关键任务{}未按时运行，暂停喂狗", 5000)
+log_wdt_start = logger.site(INFO, "🐕 看门狗已启动，超时{}ms")
+log_wdt_reset = logger.site(WARN, "🐕 上次因看门狗超时复位")
+
+# 重启退避时间(毫秒)：首次重启等待 BACKOFF_MIN_MS，连续失败时加倍，最长 BACKOFF_MAX_MS
+BACKOFF_MIN_MS = 500
+BACKOFF_MAX_MS = 30000
+# 任务连续运行超过此时间后再失败，退避时间从头计算(毫秒)
+BACKOFF_RESET_MS = 60000
+
+
+class SupervisedTask:
+    """受监控的任务"""
+
+    def __init__(self, name, func, args, critical, deadline_ms):
+        """
+        Args:
+            name (str): 任务名称(与任务运行统计同名)
+            func: 协程函数
+            args (tuple): 协程函数的参数
+            critical (bool): 是否关键任务(未按时运行时停止喂狗)
+            deadline_ms (int): 两次运行之间的最长间隔(毫秒)，0表示不检查
+        """
+        self.name = name
+        self.func = func
+        self.args = args
+        self.critical = critical
+        self.deadline_ms = deadline_ms
+        self.stats = register_task(name)
+        self.task = None
+        self.backoff_ms = BACKOFF_MIN_MS
+        self.started_ms = time.ticks_ms()
+        self.running = False        # False表示正在退避等待重启
+
+
+class Supervisor:
+    """任务监控器"""
+
+    def __init__(self, check_ms=1000, wdt_timeout_ms=None):
+        """
+        Args:
+            check_ms (int): 检查周期(毫秒)
+            wdt_timeout_ms (int): 看门狗超时(毫秒)，None表示不启用看门狗
+        """
+        self.check_ms = check_ms
+        self.wdt_timeout_ms = wdt_timeout_ms
+        self.wdt = None
+        self.entries = []
+        self.feeds = 0              # 喂狗次数
+        self.starved = 0            # 因关键任务未按时运行而未喂狗的检查次数
+
+    def add(self, name, func, args=(), critical=False, deadline_ms=0):
+        """
+        登记并立即启动任务
+
+        Args:
+            name (str): 任务名称
+            func: 协程函数
+            args (tuple): 协程函数的参数
+            critical (bool): 是否关键任务
+            deadline_ms (int): 两次运行之间的最长间隔(毫秒)，0表示不检查
+
+        Returns:
+            SupervisedTask: 受监控的任务
+        """
+        entry = SupervisedTask(name, func, args, critical, deadline_ms)
+        self.entries.append(entry)
+        self.start(entry)
+        return entry
+
+    def get(self, name):
+        """按名称查找受监控的任务，未知名称返回None"""
+        for entry in self.entries:
+            if entry.name == name:
+                return entry
+        return None
+
+    def start(self, entry):
+        """启动(或重新启动)任务"""
+        entry.task = asyncio.create_task(self.run_entry(entry))
+
+    async def run_entry(self, entry):
+        """运行任务；异常或退出后按退避时间重启"""
+        while True:
+            entry.running = True
+            entry.started_ms = time.ticks_ms()
+            # 启动时视为刚运行过，给任务一个完整的期限
+            entry.stats.progress_ms = entry.started_ms
+            try:
+                await entry.func(*entry.args)
+                error = 'exit'
+            except Exception as e:
+                error = e
+            entry.running = False
+            entry.stats.restarts += 1
+            if time.ticks_diff(time.ticks_ms(), entry.started_ms) >= BACKOFF_RESET_MS:
+                entry.backoff_ms = BACKOFF_MIN_MS
+            delay = entry.backoff_ms
+            entry.backoff_ms = min(delay * 2, BACKOFF_MAX_MS)
+            log_failed(entry.name, error, delay)
+            await asyncio.sleep_ms(delay)
+
+    def check(self):
+        """
+        检查关键任务：超过期限没有运行的任务取消后重启
+
+        Returns:
+            bool: 所有关键任务是否都按时运行(可以喂狗)
+        """
+        now = time.ticks_ms()
+        healthy = True
+        for entry in self.entries:
+            if not entry.critical:
+                continue
+            if not entry.running:
+                # 正在退避等待重启
+                healthy = False
+                log_starving(entry.name)
+                continue
+            if entry.deadline_ms and time.ticks_diff(now, entry.stats.progress_ms) > entry.deadline_ms:
+                healthy = False
+                log_starving(entry.name)
+                # 任务卡在等待中：取消后重启
+                log_stale(entry.name, entry.deadline_ms)
+                entry.task.cancel()
+                entry.stats.restarts += 1
+                self.start(entry)
+        return healthy
+
+    async def run(self):
+        """监控循环：启动看门狗，按检查结果喂狗(不返回)"""
+        if self.wdt_timeout_ms:
+            if machine.reset_cause() == machine.WDT_RESET:
+                log_wdt_reset()
+            self.wdt = machine.WDT(timeout=self.wdt_timeout_ms)
+            log_wdt_start(self.wdt_timeout_ms)
+        while True:
+            if self.check():
+                if self.wdt is not None:
+                    self.wdt.feed()
+                self.feeds += 1
+            else:
+                self.starved += 1
+            await asyncio.sleep_ms(self.check_ms)
+
+
+# 全局任务监控器
+supervisor = Supervisor(config.SUPERVISOR_CHECK_MS, config.WDT_TIMEOUT_MS)
+
+
+def get_supervisor():
+    """获取全局任务监控器"""
+    return supervisor
@@ -1,29 +1,63 @@
 """
 UART数据接收处理器
 负责接收UART数据并根据设备ID更新对应的数据
+支持按行JSON协议和COBS二进制帧协议
 """
 
-import uasyncio as asyncio
+import gc
 import json
-from data.singleton_data import get_data_manager
+import struct
+from data.singleton_data import get_data_manager, parse_fields, parse_flow, to_bool, HOST_FLAGS, CHANGE_TEMP, CHANGE_FLOW
+from data.telemetry import get_telemetry, collect_stats, STATS_FIELDS, MAX_PERIOD_MS
+from data.task_stats import register_task, get_task_stats, reset_task_stats, TASK_FIELDS
+from data.log import get_logger, parse_level, DEBUG
+from task.dx180x20 import get_temp_engine, CONVERSION_MS
+from uart.binary_protocol import (
+    FRAME_SET, FRAME_PROTO, FRAME_KEYFRAME, FRAME_BATCH, FRAME_QUERY, FRAME_REPLY,
+    SET_FORMAT, SET_SIZE, STATE_FORMAT, STATE_SIZE, QUERY_FORMAT, QUERY_SIZE,
+    REPLY_HEADER_FORMAT, REPLY_HEADER_SIZE, QUERY_DEVICE, QUERY_ALL, QUERY_STATS, QUERY_TASK,
+    TASK_FORMAT, TASK_SIZE
+)
 
+logger = get_logger()
 
-def uart_data_handler(json_data):
+# 逐行的处理结果只在调试时记录，避免每行格式化字符串
+log_updated = logger.site(DEBUG, '✅ {}数据更新成功: temp={}, water={}')
+log_line_failed = logger.site(DEBUG, '⚠️  数据处理失败: {}')
+log_batch = logger.site(DEBUG, '✅ 批量更新成功: {}个设备')
+
+
+def uart_data_handler(json_data, uart_util=None):
     """
     UART数据处理函数
-    根据设备ID更新对应设备的数据
+    根据设备ID更新对应设备的数据，带 cmd 字段的为控制命令
     
     Args:
-        json_data (str): JSON格式的输入数据
+        json_data (str|bytes|memoryview): JSON格式的输入数据
+        uart_util: UART工具实例，控制命令需要
+    
+    Returns:
+        bool|None: 是否处理成功，None表示查询应答暂时放不下发送队列
     """
     try:
-        # 解析JSON数据
-        data = json.loads(json_data)
+        # 解析JSON数据(MicroPython的json.loads可直接解析memoryview，无需复制)
+        try:
+            data = json.loads(json_data)
+        except TypeError:
+            data = json.loads(bytes(json_data))
         
         # 验证数据结构
         if not isinstance(data, dict):
             print("❌ 无效的数据格式")
             return False
+        
+        # 控制命令
+        if 'cmd' in data:
+            return handle_command(data, uart_util)
+        
+        # 批量更新
+        if 'batch' in data:
+            return handle_batch(data)
             
         # 获取设备ID
         device_id = data.get('device')
@@ -35,21 +69,14 @@ def uart_data_handler(json_data):
         data_manager = get_data_manager()
         
         # 根据设备ID更新对应数据
-        if device_id == 'device1':
-            # 更新设备1数据
-            update_device_data(data_manager, data, 'device1')
-            print(f"✅ 设备1数据更新成功: temp={data.get('temp', 'N/A')}, water={data.get('water', 'N/A')}")
-            return True
-            
-        elif device_id == 'device2':
-            # 更新设备2数据
-            update_device_data(data_manager, data, 'device2')
-            print(f"✅ 设备2数据更新成功: temp={data.get('temp', 'N/A')}, water={data.get('water', 'N/A')}")
-            return True
-            
-        else:
+        index = data_manager.device_index(device_id)
+        if index < 0:
             print(f"❌ 未知的设备ID: {device_id}")
             return False
+        
+        update_device_data(data_manager, data, index)
+        log_updated(device_id, data.get('temp', 'N/A'), data.get('water', 'N/A'))
+        return True
             
     except json.JSONDecodeError as e:
         print(f"❌ JSON解析错误: {e}")
@@ -59,93 +86,451 @@ def uart_data_handler(json_data):
         return False
 
 
-def update_device_data(data_manager, data, device_key):
+def update_device_data(data_manager, data, index):
     """
     更新指定设备的数据
     
     Args:
         data_manager: 数据管理器实例
         data (dict): 要更新的数据字典
-        device_key (str): 设备键名 ('device1' 或 'device2')
+        index (int): 设备索引
     """
     try:
-        # 构造设备数据字典
-        device_data = {}
+        # 先校验流速，任一字段无效时不更新任何字段
+        flow = parse_flow(data['flow']) if 'flow' in data else None
         
-        # 更新各个字段，如果不存在则保持原值
-        if 'temp' in data:
-            device_data['temp'] = float(data['temp'])
-        if 'water' in data:
-            device_data['water'] = bool(int(data['water'])) if isinstance(data['water'], str) else bool(data['water'])
-        if 'heat' in data:
-            device_data['heat'] = bool(int(data['heat'])) if isinstance(data['heat'], str) else bool(data['heat'])
-        if 'pump' in data:
-            device_data['pump'] = bool(int(data['pump'])) if isinstance(data['pump'], str) else bool(data['pump'])
-        if 'cool' in data:
-            device_data['cool'] = bool(int(data['cool'])) if isinstance(data['cool'], str) else bool(data['cool'])
-        if 'warn' in data:
-            device_data['warn'] = bool(int(data['warn'])) if isinstance(data['warn'], str) else bool(data['warn'])
-        if 'alarm' in data:
-            device_data['alarm'] = bool(int(data['alarm'])) if isinstance(data['alarm'], str) else bool(data['alarm'])
+        # 直接按字段更新，缺少的字段保持原值
+        data_manager.apply_fields(index, data)
         
-        # 如果有流速数据，也更新共享流速
-        if 'flow' in data:
-            data_manager.shared_flow = float(data['flow'])
-        
-        # 使用数据管理器的更新方法
-        if device_key == 'device1':
-            data_manager.update_from_dict({'device1': device_data})
-        elif device_key == 'device2':
-            data_manager.update_from_dict({'device2': device_data})
+        # 如果有流速数据，也更新该设备的流速
+        if flow is not None:
+            data_manager.set_flow(index, flow)
             
     except (ValueError, TypeError) as e:
         print(f"❌ 设备数据更新错误: {e}")
         raise
 
 
+def handle_batch(data):
+    """
+    处理批量更新: {"batch": [{"device": "device1", ..., "flow": y}, ...], "flow": x}
+    记录中的 flow 只更新该设备(优先于顶层 flow)，顶层 flow 更新所有设备；
+    先校验全部记录，全部有效才一次性原子提交，任一记录无效则整批拒绝
+    
+    Args:
+        data (dict): 批量命令字典
+    """
+    records = data['batch']
+    if not isinstance(records, list):
+        print("❌ batch字段必须是数组")
+        return False
+    
+    data_manager = get_data_manager()
+    updates = []
+    try:
+        for record in records:
+            if not isinstance(record, dict):
+                print("❌ 无效的批量记录")
+                return False
+            index = data_manager.device_index(record.get('device'))
+            if index < 0:
+                print(f"❌ 未知的设备ID: {record.get('device')}")
+                return False
+            temp, set_bits, clear_bits = parse_fields(record)
+            record_flow = parse_flow(record['flow']) if 'flow' in record else None
+            updates.append((index, temp, set_bits, clear_bits, record_flow))
+        flow = parse_flow(data['flow']) if 'flow' in data else None
+    except (ValueError, TypeError) as e:
+        print(f"❌ 批量数据无效，整批拒绝: {e}")
+        return False
+    
+    data_manager.apply_batch(updates, flow)
+    log_batch(len(updates))
+    return True
+
+
+def handle_command(data, uart_util):
+    """
+    处理控制命令
+    
+    Args:
+        data (dict): 命令字典
+        uart_util: UART工具实例
+    """
+    cmd = data.get('cmd')
+    if cmd in ('get', 'get_all', 'stats', 'tasks', 'log') and uart_util is not None:
+        return handle_query(cmd, data, uart_util)
+    if cmd == 'proto' and uart_util is not None:
+        return set_protocol(uart_util, data.get('mode'))
+    if cmd == 'keyframe':
+        get_telemetry().request_keyframe()
+        return True
+    if cmd == 'telemetry' and 'delta' in data:
+        # 切换完整/增量模式，切换后先发关键帧
+        telemetry = get_telemetry()
+        telemetry.delta = to_bool(data['delta'])
+        telemetry.request_keyframe()
+        return True
+    if cmd in ('rate', 'burst'):
+        return set_stream_rate(cmd, data)
+    if cmd == 'ds':
+        return set_temp_sampling(data)
+    print(f"❌ 未知的命令: {cmd}")
+    return False
+
+
+def set_stream_rate(cmd, data):
+    """
+    调整遥测数据流的输出周期
+    
+    - {"cmd": "rate", "stream": "flow", "period_ms": 200}      空闲周期，0表示关闭
+    - {"cmd": "burst", "stream": "device", "hz": 10, "duration_ms": 5000}
+    - {"cmd": "burst", "stream": "diag", "period_ms": 500, "duration_ms": 3000}
+    周期和时长最长 MAX_PERIOD_MS (一天)
+    
+    Args:
+        cmd (str): 'rate' 或 'burst'
+        data (dict): 命令字典
+    """
+    stream = data.get('stream')
+    try:
+        if 'hz' in data:
+            hz = float(data['hz'])
+            period_ms = int(1000 / hz) if hz > 0 else 0
+        else:
+            period_ms = int(data.get('period_ms', 0))
+        duration_ms = int(data.get('duration_ms', 5000))
+    except (TypeError, ValueError, ZeroDivisionError):
+        print(f"❌ 无效的数据流周期: {data}")
+        return False
+    if not (0 <= period_ms <= MAX_PERIOD_MS and 0 <= duration_ms <= MAX_PERIOD_MS):
+        print(f"❌ 无效的数据流周期: {data}")
+        return False
+    
+    telemetry = get_telemetry()
+    if cmd == 'rate':
+        ok = telemetry.set_rate(stream, period_ms)
+    elif period_ms:
+        ok = telemetry.burst(stream, period_ms, duration_ms)
+    else:
+        print(f"❌ 加速周期不能为0: {data}")
+        return False
+    if not ok:
+        print(f"❌ 未知的数据流: {stream}")
+    return ok
+
+
+def set_temp_sampling(data):
+    """
+    调整DS18B20采样：降低分辨率可缩短转换等待，配合缩短间隔提高采样率
+    
+    - {"cmd": "ds", "resolution": 10, "interval_ms": 500}    分辨率9-12位，间隔0-4000ms，两个字段都可省略
+    
+    Args:
+        data (dict): 命令字典
+    """
+    engine = get_temp_engine()
+    if engine is None:
+        print("❌ 温度采集未启动")
+        return False
+    try:
+        resolution = int(data.get('resolution', engine.resolution))
+        interval_ms = int(data.get('interval_ms', engine.interval_ms))
+    except (TypeError, ValueError):
+        print(f"❌ 无效的采样参数: {data}")
+        return False
+    if resolution not in CONVERSION_MS or not engine.set_interval(interval_ms):
+        print(f"❌ 无效的采样参数: {data}")
+        return False
+    engine.set_resolution(resolution)
+    print(f"✅ 温度采样: {resolution}位, 间隔{interval_ms}ms")
+    return True
+
+
+# 每次 tasks 查询应答的任务数(应答须小于发送队列)
+TASKS_PER_REPLY = 3
+# 每次 log 查询应答的日志文本最多字节数(按JSON编码后的长度计)
+LOG_REPLY_BYTES = 256
+
+
+def handle_query(cmd, data, uart_util):
+    """
+    处理JSON查询命令，应答带回请求ID；主机可连续发送多个请求，应答按请求顺序返回
+    
+    - {"cmd": "get", "device": "device1", "id": 1}
+    - {"cmd": "get_all", "id": 2}
+    - {"cmd": "stats", "id": 3}
+    - {"cmd": "tasks", "id": 4, "start": 0}    各任务运行统计和堆内存快照，每次应答 TASKS_PER_REPLY 个任务，
+      应答的 next 为下一页的 start (最后一页为null)；"reset": 1 表示应答后清除统计
+    - {"cmd": "log", "id": 5, "start": 0}      读取日志环形缓冲区，start 为日志序号(默认最早一条)，
+      应答的 next 为下一页的 start (已读完为null)，lost 为已被覆盖的条数；
+      可带 "level" / "console" 调整记录/打印级别
+    
+    Args:
+        cmd (str): 查询命令
+        data (dict): 命令字典
+        uart_util: UART工具实例
+    
+    Returns:
+        bool|None: 应答是否已入队，None表示发送队列暂时放不下(请求稍后重新处理)
+    """
+    data_manager = get_data_manager()
+    if cmd == 'get':
+        index = data_manager.device_index(data.get('device'))
+        if index < 0:
+            reply = {'error': 'unknown device'}
+        else:
+            reply = data_manager.get_device_dict(index)
+    elif cmd == 'get_all':
+        reply = {'devices': [data_manager.get_device_dict(index) for index in range(data_manager.device_count)]}
+    elif cmd == 'tasks':
+        all_tasks = get_task_stats()
+        try:
+            start = max(int(data.get('start', 0)), 0)
+        except (TypeError, ValueError):
+            start = 0
+        end = min(start + TASKS_PER_REPLY, len(all_tasks))
+        tasks = []
+        for stats in all_tasks[start:end]:
+            entry = dict(zip(TASK_FIELDS, stats.snapshot()))
+            entry['name'] = stats.name
+            tasks.append(entry)
+        reply = {
+            'tasks': tasks,
+            'next': end if end < len(all_tasks) else None,
+            'mem_free': gc.mem_free(),
+            'mem_alloc': gc.mem_alloc(),
+        }
+    elif cmd == 'log':
+        reply = log_reply(data)
+    else:
+        reply = dict(zip(STATS_FIELDS, collect_stats(uart_util)))
+    reply['id'] = data.get('id')
+    sent = uart_util.send_reply(json.dumps(reply) + '\n')
+    # 应答入队后才清除统计，放不下时请求会被重新处理
+    if sent and cmd == 'tasks' and to_bool(data.get('reset', 0)):
+        reset_task_stats()
+    return sent
+
+
+def log_reply(data):
+    """日志查询应答字典，按需先调整日志级别"""
+    for key in ('level', 'console'):
+        if key in data:
+            level = parse_level(data[key])
+            if level < 0:
+                return {'error': 'unknown level'}
+            if key == 'level':
+                logger.level = level
+            else:
+                logger.console_level = level
+    
+    oldest = logger.oldest()
+    try:
+        start = int(data.get('start', oldest))
+    except (TypeError, ValueError):
+        start = oldest
+    lost = max(oldest - start, 0)
+    seq = max(start, oldest)
+    lines = []
+    size = 0
+    while seq < logger.written and size < LOG_REPLY_BYTES:
+        line = logger.format(seq)
+        lines.append(line)
+        size += len(json.dumps(line))
+        seq += 1
+    return {'log': lines, 'next': seq if seq < logger.written else None, 'lost': lost}
+
+
+def handle_binary_query(frame, uart_util):
+    """
+    处理二进制查询帧，应答 FRAME_REPLY 带回请求ID
+    
+    Args:
+        frame (memoryview): 解码后的查询帧
+        uart_util: UART工具实例
+    """
+    req_id, kind, index = struct.unpack_from(QUERY_FORMAT, frame, 1)
+    data_manager = get_data_manager()
+    codec = uart_util.rx_codec
+    
+    if kind == QUERY_DEVICE:
+        first, last = index, index + 1
+    elif kind == QUERY_ALL:
+        first, last = 0, data_manager.device_count
+    else:
+        first = last = 0
+    tasks = get_task_stats()
+    status = 0
+    if ((kind == QUERY_DEVICE and index >= data_manager.device_count) or kind > QUERY_TASK
+            or (kind == QUERY_TASK and index >= len(tasks))):
+        status = 1
+        first = last = 0
+    
+    codec.begin(FRAME_REPLY)
+    codec.pack(REPLY_HEADER_FORMAT, REPLY_HEADER_SIZE, req_id, kind, status)
+    for i in range(first, last):
+        codec.pack(STATE_FORMAT, STATE_SIZE, i, data_manager.temps[i], data_manager.flags[i], data_manager.flows[i],
+                   data_manager.volumes[i])
+    if kind == QUERY_STATS:
+        for value in collect_stats(uart_util):
+            codec.pack('<I', 4, value & 0xFFFFFFFF)
+    if kind == QUERY_TASK and not status:
+        codec.pack(TASK_FORMAT, TASK_SIZE, *tasks[index].snapshot())
+        codec.put(tasks[index].name_bytes)
+    return uart_util.send(codec.end())
+
+
+def set_protocol(uart_util, mode):
+    """
+    切换串口协议，JSON应答在JSON模式下发送
+    
+    Args:
+        uart_util: UART工具实例
+        mode (str): 'json' 或 'binary'
+    """
+    if mode not in ('json', 'binary'):
+        print(f"❌ 未知的协议: {mode}")
+        return False
+    if mode == 'binary':
+        uart_util.send('{"proto": "binary"}\n')
+        uart_util.protocol = mode
+    else:
+        uart_util.protocol = mode
+        uart_util.send('{"proto": "json"}\n')
+    # 新协议下先发送关键帧
+    get_telemetry().request_keyframe()
+    print(f"✅ 串口协议已切换为: {mode}")
+    return True
+
+
+def apply_set_records(frame, offset, count):
+    """
+    校验并原子地应用二进制更新记录(SET负载)，任一记录无效则全部拒绝
+    
+    Args:
+        frame (memoryview): 解码后的帧
+        offset (int): 第一条记录的偏移
+        count (int): 记录条数
+    """
+    data_manager = get_data_manager()
+    for i in range(count):
+        index = frame[offset + i * SET_SIZE]
+        if index != 0xFF and index >= data_manager.device_count:
+            print(f"❌ 未知的设备索引: {index}")
+            return False
+    
+    data_manager.begin_batch()
+    try:
+        for i in range(count):
+            index, mask, temp_centi, flags, flow_centi = struct.unpack_from(SET_FORMAT, frame, offset + i * SET_SIZE)
+            if index != 0xFF:
+                temp = temp_centi / 100 if mask & CHANGE_TEMP else None
+                # 只应用主机可写的标志位
+                data_manager.update_device(index, temp, flags & mask & HOST_FLAGS, ~flags & mask & HOST_FLAGS)
+            if mask & CHANGE_FLOW:
+                data_manager.set_flow(None if index == 0xFF else index, flow_centi / 100)
+    finally:
+        data_manager.end_batch()
+    return True
+
+
+def binary_frame_handler(codec, frame, uart_util=None):
+    """
+    二进制帧处理函数
+    
+    Args:
+        codec (BinaryCodec): 解码器
+        frame (memoryview): 收到的COBS编码帧(不含分隔符)，就地解码
+        uart_util: UART工具实例，协议切换需要
+    """
+    n = codec.decode(frame)
+    if n < 0:
+        return False
+    
+    frame_type = frame[0]
+    if frame_type == FRAME_SET and n == 1 + SET_SIZE:
+        return apply_set_records(frame, 1, 1)
+    
+    if frame_type == FRAME_BATCH and n > 1 and (n - 1) % SET_SIZE == 0:
+        return apply_set_records(frame, 1, (n - 1) // SET_SIZE)
+    
+    if frame_type == FRAME_PROTO and n == 2 and uart_util is not None:
+        return set_protocol(uart_util, 'binary' if frame[1] else 'json')
+    
+    if frame_type == FRAME_QUERY and n == 1 + QUERY_SIZE and uart_util is not None:
+        return handle_binary_query(frame, uart_util)
+    
+    if frame_type == FRAME_KEYFRAME and n == 1:
+        get_telemetry().request_keyframe()
+        return True
+    
+    codec.format_errors += 1
+    print(f"❌ 无效的二进制帧: 类型={frame_type} 长度={n}")
+    return False
+
+
 async def uart_receive_task(uart_util):
     """
     UART接收任务 - 持续监听并处理接收到的数据
+    通过流式读取器等待数据，接收数据直接读入预分配的定长缓冲区，
+    JSON协议按换行切分，二进制协议按 0x00 切分
     
     Args:
         uart_util: UART工具实例
     """
     print("🚀 UART数据接收任务开始运行...")
-    buffer = ""
+    framer = uart_util.framer
+    codec = uart_util.rx_codec
+    stats = register_task('uart_rx')
+    
+    def configure_framer():
+        if uart_util.protocol == 'binary':
+            framer.configure(0x00, False)
+        else:
+            framer.configure(0x0A, True)
+    
+    def handle_line(line):
+        protocol = uart_util.protocol
+        if protocol == 'binary':
+            # 二进制帧就地解码后不能重新处理，先确认放得下最长的应答帧
+            if uart_util.tx_space() < len(codec.out):
+                uart_util.tx_wanted = len(codec.out)
+                return True
+            binary_frame_handler(codec, line, uart_util)
+        else:
+            success = uart_data_handler(line, uart_util)
+            if success is None:
+                # 应答放不下：暂停分帧，该请求留在缓冲区
+                return True
+            if not success and log_line_failed.enabled():
+                # 行数据只在调用期间有效，记录前复制
+                log_line_failed(bytes(line))
+        if uart_util.protocol != protocol:
+            configure_framer()
+        return False
+    
+    configure_framer()
     
     while True:
         try:
-            # 检查是否有数据可读
-            if uart_util.any():
-                raw_data = uart_util.safe_read()
-                if raw_data:
-                    try:
-                        # 解码数据
-                        text_data = raw_data.decode('utf-8')
-                        buffer += text_data
-                        
-                        # 按行处理数据
-                        while '\n' in buffer:
-                            line, buffer = buffer.split('\n', 1)
-                            line = line.strip()
-                            
-                            if line:
-                                # 处理完整的JSON行
-                                success = uart_data_handler(line)
-                                if not success:
-                                    print(f"⚠️  数据处理失败: {line}")
-                                    
-                    except UnicodeDecodeError as e:
-                        print(f"❌ 数据解码错误: {e}")
-                        buffer = ""  # 清空缓冲区
-                        
-            # 短暂等待避免过度占用CPU
-            await asyncio.sleep_ms(10)
+            # 挂起直到串口收到数据(等待串口不计唤醒延迟)
+            stats.end()
+            n = await uart_util.readinto_async(framer)
+            stats.begin()
+            if n:
+                # 按行(帧)处理数据；连续的查询应答放不下时暂停，
+                # 等发送队列腾出空间再继续(期间不再读入新数据)
+                while framer.process(handle_line):
+                    stats.end()
+                    await uart_util.wait_space(uart_util.tx_wanted)
+                    stats.begin()
             
         except Exception as e:
             print(f"❌ UART接收任务错误: {e}")
-            await asyncio.sleep(1)
+            framer.reset()
+            await stats.sleep_ms(1000)
 
 
 # 导出主要函数
-__all__ = ['uart_data_handler', 'uart_receive_task']
\ No newline at end of file
+__all__ = ['uart_data_handler', 'binary_frame_handler', 'uart_receive_task']
\ No newline at end of file
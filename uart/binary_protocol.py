@@ -0,0 +1,247 @@
+"""
+二进制串口协议
+帧格式: COBS编码([帧类型][负载][CRC16 小端]) + 0x00 帧分隔符
+CRC16 采用 CCITT-FALSE (多项式0x1021，初值0xFFFF)，覆盖帧类型和负载
+"""
+
+import struct
+from micropython import const
+
+# 帧类型
+FRAME_STATE = const(0x01)     # 设备 -> 主机: 设备状态
+FRAME_SET = const(0x02)       # 主机 -> 设备: 更新设备数据
+FRAME_PROTO = const(0x03)     # 主机 -> 设备: 切换协议 (负载: 0=JSON, 1=二进制)
+FRAME_DELTA = const(0x04)     # 设备 -> 主机: 增量状态(字段掩码为全部字段时即关键帧)
+FRAME_KEYFRAME = const(0x05)  # 主机 -> 设备: 请求关键帧
+FRAME_BATCH = const(0x06)     # 主机 -> 设备: 多条更新记录(连续的SET负载)，原子提交
+FRAME_QUERY = const(0x07)     # 主机 -> 设备: 查询请求
+FRAME_REPLY = const(0x08)     # 设备 -> 主机: 查询应答
+FRAME_FLOW = const(0x09)      # 设备 -> 主机: 各设备的流量 (按设备顺序的 FLOW_FORMAT 数组)
+FRAME_DIAG = const(0x0A)      # 设备 -> 主机: 诊断统计 (uint32 数组，顺序同查询应答)
+FRAME_TASK = const(0x0B)      # 设备 -> 主机: 任务运行统计 (任务编号 + TASK_FORMAT + 任务名)
+
+# 查询类型
+QUERY_DEVICE = const(0)       # 单个设备状态
+QUERY_ALL = const(1)          # 所有设备状态
+QUERY_STATS = const(2)        # 运行统计
+QUERY_TASK = const(3)         # 任务运行统计(设备索引字段为任务编号)
+
+# 查询负载: 请求ID, 查询类型, 设备索引
+QUERY_FORMAT = '<HBB'
+QUERY_SIZE = const(4)
+
+# 应答负载头: 请求ID, 查询类型, 状态(0=成功)；
+# 之后为若干设备状态负载(STATE_FORMAT)，或统计值 uint32 数组，或任务统计(TASK_FORMAT + 任务名)
+REPLY_HEADER_FORMAT = '<HBB'
+REPLY_HEADER_SIZE = const(4)
+
+# 设备状态负载: 设备索引, 温度(0.01°C), 标志位, 流速(0.01 L/min), 累计流量(0.01 L)
+STATE_FORMAT = '<BhBHI'
+STATE_SIZE = const(10)
+
+# 流量负载(每个设备一项): 流速(0.01 L/min), 累计流量(0.01 L)
+FLOW_FORMAT = '<HI'
+FLOW_SIZE = const(6)
+
+# 更新负载: 设备索引(0xFF表示只更新所有设备的流速), 字段掩码(FLAG_*/CHANGE_*，故障位只读), 温度, 标志位, 流速
+SET_FORMAT = '<BHhBH'
+SET_SIZE = const(8)
+
+# 增量负载头: 序号, 设备索引, 字段掩码(FLAG_*/CHANGE_*)；
+# 之后按掩码依次跟随: 温度 int16 (CHANGE_TEMP)、标志位 uint8 (任一FLAG_*)、流速 uint16 (CHANGE_FLOW)、
+# 累计流量 uint32 (CHANGE_VOLUME)
+DELTA_HEADER_FORMAT = '<HBH'
+DELTA_HEADER_SIZE = const(5)
+DELTA_TEMP = const(0x100)
+DELTA_FLOW = const(0x200)
+DELTA_VOLUME = const(0x400)
+
+# 任务统计负载: 运行次数, 平均/最长运行耗时(微秒), 平均/最大唤醒延迟(微秒), 重启次数；之后为ASCII任务名
+TASK_FORMAT = '<IIIIII'
+TASK_SIZE = const(24)
+
+# 单帧最大原始长度(帧类型 + 负载 + CRC)
+MAX_RAW = const(128)
+
+
+def crc16(buf, start, end, crc=0xFFFF):
+    """计算 buf[start:end] 的 CRC16/CCITT-FALSE"""
+    for i in range(start, end):
+        crc ^= buf[i] << 8
+        for _ in range(8):
+            if crc & 0x8000:
+                crc = ((crc << 1) ^ 0x1021) & 0xFFFF
+            else:
+                crc = (crc << 1) & 0xFFFF
+    return crc
+
+
+def cobs_encode(src, n, dst):
+    """
+    COBS编码 src[0:n] 到 dst，并追加 0x00 帧分隔符
+
+    Returns:
+        int: 写入 dst 的字节数(含分隔符)
+    """
+    code_pos = 0
+    code = 1
+    out = 1
+    for i in range(n):
+        b = src[i]
+        if b == 0:
+            dst[code_pos] = code
+            code_pos = out
+            out += 1
+            code = 1
+        else:
+            dst[out] = b
+            out += 1
+            code += 1
+            if code == 0xFF:
+                dst[code_pos] = code
+                code_pos = out
+                out += 1
+                code = 1
+    dst[code_pos] = code
+    dst[out] = 0
+    return out + 1
+
+
+def cobs_decode(buf, n):
+    """
+    就地COBS解码 buf[0:n] (不含 0x00 分隔符)
+
+    Returns:
+        int: 解码后的长度，数据无效时返回-1
+    """
+    i = 0
+    out = 0
+    while i < n:
+        code = buf[i]
+        if code == 0:
+            return -1
+        i += 1
+        end = i + code - 1
+        if end > n:
+            return -1
+        while i < end:
+            buf[out] = buf[i]
+            out += 1
+            i += 1
+        if code != 0xFF and i < n:
+            buf[out] = 0
+            out += 1
+    return out
+
+
+class BinaryCodec:
+    """二进制帧编解码器 - 编码使用预分配缓冲区，不产生新对象"""
+
+    def __init__(self):
+        self.raw = bytearray(MAX_RAW)
+        # COBS最坏情况每254字节增加1字节，另加分隔符
+        self.out = bytearray(MAX_RAW + MAX_RAW // 254 + 2)
+        self.out_mv = memoryview(self.out)
+        self.n = 0                 # 逐段编码的当前长度
+        self.crc_errors = 0        # CRC校验失败的帧数
+        self.format_errors = 0     # 编码或长度错误的帧数
+
+    def begin(self, frame_type):
+        """开始逐段编码一帧"""
+        self.raw[0] = frame_type
+        self.n = 1
+
+    def pack(self, fmt, size, *values):
+        """追加一段结构化负载"""
+        struct.pack_into(fmt, self.raw, self.n, *values)
+        self.n += size
+
+    def put(self, data):
+        """追加一段原始字节"""
+        n = self.n
+        self.raw[n:n + len(data)] = data
+        self.n = n + len(data)
+
+    def end(self):
+        """结束逐段编码，返回线路帧(memoryview)"""
+        return self._finish(self.n)
+
+    def _finish(self, n):
+        """追加CRC并COBS编码，返回线路帧(memoryview)"""
+        crc = crc16(self.raw, 0, n)
+        self.raw[n] = crc & 0xFF
+        self.raw[n + 1] = crc >> 8
+        length = cobs_encode(self.raw, n + 2, self.out)
+        return self.out_mv[:length]
+
+    def encode_state(self, index, temp_centi, flags, flow_centi, volume_centi):
+        """
+        编码设备状态帧
+
+        Args:
+            index (int): 设备索引
+            temp_centi (int): 温度 (0.01°C)
+            flags (int): 标志位 (FLAG_*)
+            flow_centi (int): 流速 (0.01 L/min)
+            volume_centi (int): 累计流量 (0.01 L)
+
+        Returns:
+            memoryview: 线路帧，下一次编码前有效
+        """
+        self.raw[0] = FRAME_STATE
+        struct.pack_into(STATE_FORMAT, self.raw, 1, index, temp_centi, flags, flow_centi, volume_centi)
+        return self._finish(1 + STATE_SIZE)
+
+    def encode_delta(self, seq, index, mask, temp_centi, flags, flow_centi, volume_centi):
+        """
+        编码增量状态帧，只包含掩码中的字段
+
+        Args:
+            seq (int): 帧序号 (0-65535循环)
+            index (int): 设备索引
+            mask (int): 字段掩码 (FLAG_* / CHANGE_TEMP / CHANGE_FLOW / CHANGE_VOLUME)
+            temp_centi (int): 温度 (0.01°C)
+            flags (int): 标志位当前值
+            flow_centi (int): 流速 (0.01 L/min)
+            volume_centi (int): 累计流量 (0.01 L)
+
+        Returns:
+            memoryview: 线路帧，下一次编码前有效
+        """
+        raw = self.raw
+        raw[0] = FRAME_DELTA
+        struct.pack_into(DELTA_HEADER_FORMAT, raw, 1, seq, index, mask)
+        n = 1 + DELTA_HEADER_SIZE
+        if mask & DELTA_TEMP:
+            struct.pack_into('<h', raw, n, temp_centi)
+            n += 2
+        if mask & 0xFF:
+            raw[n] = flags
+            n += 1
+        if mask & DELTA_FLOW:
+            struct.pack_into('<H', raw, n, flow_centi)
+            n += 2
+        if mask & DELTA_VOLUME:
+            struct.pack_into('<I', raw, n, volume_centi)
+            n += 4
+        return self._finish(n)
+
+    def decode(self, frame):
+        """
+        就地解码一帧(不含 0x00 分隔符)并校验CRC
+
+        Args:
+            frame (memoryview): 收到的COBS编码帧
+
+        Returns:
+            int: 解码后的长度(帧类型 + 负载)，无效帧返回-1
+        """
+        n = cobs_decode(frame, len(frame))
+        if n < 3:
+            self.format_errors += 1
+            return -1
+        n -= 2
+        if crc16(frame, 0, n) != frame[n] | (frame[n + 1] << 8):
+            self.crc_errors += 1
+            return -1
+        return n
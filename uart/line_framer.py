@@ -0,0 +1,129 @@
+"""
+UART行分帧器
+在预分配的定长缓冲区中就地查找分隔符，把完整的一行以memoryview交给处理函数
+"""
+
+
+class LineFramer:
+    """定长接收缓冲区分帧器 - 不拼接字符串，超长行整行丢弃并计数"""
+
+    def __init__(self, max_line=256, delimiter=0x0A, trim=True):
+        """
+        Args:
+            max_line (int): 单行最大长度(字节)，即接收缓冲区大小
+            delimiter (int): 行分隔符，默认换行符
+            trim (bool): 是否去掉行首尾空白(二进制帧不能去)
+        """
+        self.buf = bytearray(max_line)
+        self.mv = memoryview(self.buf)
+        self.delimiter = delimiter
+        self.trim = trim
+        self.length = 0            # 缓冲区中的有效字节数
+        self.scanned = 0           # 已确认不含分隔符的字节数
+        self.discarding = False    # 正在丢弃超长行的剩余部分
+        self.lines = 0             # 已交付的行数
+        self.overflows = 0         # 超长被丢弃的行数
+
+    def space(self):
+        """缓冲区空闲区(memoryview)，读入数据后调用 advance()"""
+        return self.mv[self.length:]
+
+    def advance(self, n):
+        """
+        登记读入空闲区的字节数
+
+        Returns:
+            int: 读入的字节数
+        """
+        if n:
+            self.length += n
+            return n
+        return 0
+
+    def readfrom(self, stream):
+        """
+        从串口(或任意支持readinto的流)读入数据到缓冲区空闲区
+
+        Returns:
+            int: 读入的字节数
+        """
+        return self.advance(stream.readinto(self.space()))
+
+    def process(self, handler):
+        """
+        切分缓冲区中的完整行并逐行调用处理函数
+
+        Args:
+            handler: 行处理函数，参数为去掉首尾空白的memoryview(只在调用期间有效)，
+                返回True表示暂时无法处理该行(如应答放不下)，该行及之后的数据留在缓冲区
+
+        Returns:
+            bool: 是否因处理函数要求而暂停，暂停后再次调用从该行继续
+        """
+        buf = self.buf
+        delimiter = self.delimiter
+        start = 0
+        i = self.scanned
+        length = self.length
+        while i < length:
+            if buf[i] != delimiter:
+                i += 1
+                continue
+            if self.discarding:
+                # 超长行到此结束
+                self.discarding = False
+            else:
+                line_start = start
+                end = i
+                if self.trim:
+                    # 去掉首尾空白(含\r)
+                    while start < end and buf[start] <= 0x20:
+                        start += 1
+                    while end > start and buf[end - 1] <= 0x20:
+                        end -= 1
+                if end > start:
+                    self.lines += 1
+                    if handler(self.mv[start:end]):
+                        # 暂停：从该行开头保留，下次重新扫描
+                        self.lines -= 1
+                        self._keep(line_start, length)
+                        self.scanned = 0
+                        return True
+                    # 处理函数可能切换了分帧方式(协议切换)
+                    delimiter = self.delimiter
+            i += 1
+            start = i
+
+        if start == 0 and length == len(buf):
+            # 缓冲区已满仍没有分隔符：丢弃这一行
+            if not self.discarding:
+                self.overflows += 1
+                self.discarding = True
+                print(f"⚠️  接收行超过{len(buf)}字节，已丢弃 (累计{self.overflows}次)")
+            self.length = 0
+            self.scanned = 0
+            return False
+
+        # 未完成的行移到缓冲区开头
+        self._keep(start, length)
+        self.scanned = self.length
+        return False
+
+    def _keep(self, start, length):
+        """把 [start, length) 的数据移到缓冲区开头"""
+        remaining = length - start
+        if start > 0 and remaining > 0:
+            self.buf[0:remaining] = self.mv[start:length]
+        self.length = remaining
+
+    def configure(self, delimiter, trim):
+        """切换分隔符和空白处理方式，缓冲区中未处理的数据按新方式重新扫描"""
+        self.delimiter = delimiter
+        self.trim = trim
+        self.scanned = 0
+
+    def reset(self):
+        """清空缓冲区"""
+        self.length = 0
+        self.scanned = 0
+        self.discarding = False
@@ -1,8 +1,19 @@
 import machine
+import uasyncio as asyncio
+from array import array
+
+from uart.line_framer import LineFramer
+from uart.binary_protocol import BinaryCodec
+from data.trace import get_recorder
+
+
+# 最多记录的可丢弃帧数量，超出的遥测帧不再参与让位
+TX_SPANS = 16
 
 
 class UARTUtil:
-    def __init__(self, uart_id, baudrate=115200, tx_pin=12, rx_pin=13, bits=8, parity=None, stop=1):
+    def __init__(self, uart_id, baudrate=115200, tx_pin=12, rx_pin=13, bits=8, parity=None, stop=1, protocol='json',
+                 tx_queue_size=512, rx_max_line=256):
         self.uart = machine.UART(
             uart_id,
             baudrate=baudrate,
@@ -13,6 +24,36 @@ class UARTUtil:
             stop=stop
         )
 
+        # 当前协议: 'json' (按行JSON) 或 'binary' (COBS帧)
+        self.protocol = protocol
+
+        # 流式读取器：只在收到数据时唤醒接收任务
+        self.reader = None
+        self.rx_wakeups = 0
+
+        # 接收分帧器和二进制帧解码器(统计数据也从这里读取)
+        self.framer = LineFramer(rx_max_line)
+        self.rx_codec = BinaryCodec()
+
+        # 发送队列：由 tx_writer_task 异步写出，任务启动前 send() 直接写串口
+        self.tx_buf = bytearray(tx_queue_size)
+        self.tx_mv = memoryview(self.tx_buf)
+        self.tx_len = 0
+        self.tx_event = asyncio.Event()
+        self.tx_running = False
+        self.tx_queued = 0      # 入队字节数
+        self.tx_dropped = 0     # 队列满被丢弃的字节数
+        self.tx_flushed = 0     # 已写出的字节数
+        # 队列中可丢弃遥测帧的位置 [起始, 结束)，应答放不下时按先后挤掉
+        self.tx_spans = array('H', [0] * (2 * TX_SPANS))
+        self.tx_span_count = 0
+        self.tx_inflight = 0    # 正在写出的字节数(这部分不能挪动)
+        self.tx_space_event = asyncio.Event()
+        self.tx_wanted = 0      # 上次放不下的应答字节数，接收任务据此等待
+
+        # 轨迹记录器(记录收发数据)
+        self.recorder = get_recorder()
+
         # 清空缓冲区
         try:
             if self.uart.any():
@@ -20,11 +61,124 @@ class UARTUtil:
         except:
             pass
 
-    # 发送数据
-    def send(self, data):
+    # 发送数据；发送任务运行时只入队不阻塞，队列满时丢弃并返回False
+    # droppable 标记可丢弃的遥测数据；控制应答放不下时先挤掉排队的遥测帧
+    def send(self, data, droppable=False):
         if isinstance(data, str):
             data = data.encode()
-        self.uart.write(data)
+        if self.recorder.active:
+            self.recorder.uart_tx(data)
+        if not self.tx_running:
+            self.uart.write(data)
+            return True
+        n = len(data)
+        free = len(self.tx_buf) - self.tx_len
+        if n > free and not droppable and n <= free + self.tx_evictable():
+            self._evict(n - free)
+        if n > len(self.tx_buf) - self.tx_len:
+            self.tx_dropped += n
+            if not droppable:
+                print(f"⚠️  发送队列已满，丢弃{n}字节应答")
+            return False
+        start = self.tx_len
+        self.tx_buf[start:start + n] = data
+        self.tx_len += n
+        self.tx_queued += n
+        if droppable and self.tx_span_count < TX_SPANS:
+            i = self.tx_span_count * 2
+            self.tx_spans[i] = start
+            self.tx_spans[i + 1] = start + n
+            self.tx_span_count += 1
+        self.tx_event.set()
+        return True
+
+    # 发送查询应答：队列暂时放不下时不丢弃，返回None，由接收任务等待空间后重新处理该请求
+    # 应答超过队列容量时按 send() 处理(必然丢弃)，避免永远等待
+    def send_reply(self, data):
+        if isinstance(data, str):
+            data = data.encode()
+        n = len(data)
+        if self.tx_running and self.tx_space() < n <= len(self.tx_buf):
+            self.tx_wanted = n
+            return None
+        return self.send(data)
+
+    # 队列当前能容纳的字节数(空闲空间加上可以挤掉的遥测帧)
+    def tx_space(self):
+        return len(self.tx_buf) - self.tx_len + self.tx_evictable()
+
+    # 等待队列腾出n字节；n超过队列容量时等到队列清空为止
+    async def wait_space(self, n):
+        n = min(n, len(self.tx_buf))
+        while self.tx_running and self.tx_space() < n:
+            self.tx_space_event.clear()
+            await self.tx_space_event.wait()
+
+    # 未在写出中的遥测帧总字节数
+    def tx_evictable(self):
+        total = 0
+        spans = self.tx_spans
+        for i in range(0, self.tx_span_count * 2, 2):
+            if spans[i] >= self.tx_inflight:
+                total += spans[i + 1] - spans[i]
+        return total
+
+    # 从最早的遥测帧开始挤出，直到腾出need字节；后面的数据整体前移
+    def _evict(self, need):
+        spans = self.tx_spans
+        mv = self.tx_mv
+        i = 0
+        while need > 0 and i < self.tx_span_count * 2:
+            start = spans[i]
+            end = spans[i + 1]
+            if start < self.tx_inflight:
+                i += 2
+                continue
+            size = end - start
+            tail = self.tx_len - end
+            if tail:
+                self.tx_buf[start:start + tail] = mv[end:self.tx_len]
+            self.tx_len -= size
+            self.tx_dropped += size
+            need -= size
+            # 删除该记录，后面的帧位置同步前移
+            count = self.tx_span_count * 2
+            for j in range(i + 2, count):
+                spans[j - 2] = spans[j] - size
+            self.tx_span_count -= 1
+
+    # 发送任务：把队列中的数据交给StreamWriter，drain期间新数据继续入队
+    async def tx_writer_task(self):
+        writer = asyncio.StreamWriter(self.uart, {})
+        self.tx_running = True
+        while True:
+            await self.tx_event.wait()
+            self.tx_event.clear()
+            while self.tx_len:
+                n = self.tx_len
+                self.tx_inflight = n
+                writer.write(self.tx_mv[:n])
+                await writer.drain()
+                self.tx_flushed += n
+                # 写出期间追加的数据移到队列开头
+                remaining = self.tx_len - n
+                if remaining:
+                    self.tx_buf[0:remaining] = self.tx_mv[n:self.tx_len]
+                self.tx_len = remaining
+                self.tx_inflight = 0
+                self._shift_spans(n)
+                self.tx_space_event.set()
+
+    # 丢掉已写出的遥测帧记录，其余记录前移n字节
+    def _shift_spans(self, n):
+        spans = self.tx_spans
+        kept = 0
+        for i in range(0, self.tx_span_count * 2, 2):
+            if spans[i] >= n:
+                spans[kept] = spans[i] - n
+                spans[kept + 1] = spans[i + 1] - n
+                kept += 2
+        self.tx_span_count = kept // 2
 
     # 查询缓冲区
     def any(self):
@@ -45,3 +199,14 @@ class UARTUtil:
     # 安全读（适用于异步任务）
     def safe_read(self):
         return self.read()
+
+    # 异步读入分帧器的接收缓冲区，串口空闲时挂起不占用CPU
+    async def readinto_async(self, framer):
+        if self.reader is None:
+            self.reader = asyncio.StreamReader(self.uart)
+        space = framer.space()
+        n = await self.reader.readinto(space)
+        self.rx_wakeups += 1
+        if n and self.recorder.active:
+            self.recorder.uart_rx(space[:n])
+        return framer.advance(n)